@@ -0,0 +1,218 @@
+"""
+asyncio client for the remote FinCompass server API.
+
+The coroutine counterpart of FinCompassClient (fetch providers, fetch an
+exchange's symbols, post schedules), so fan-out and multi-exchange work can
+overlap many requests on one thread instead of holding a thread per request.
+Requests are paced by the same rate limiter buckets and guarded by the same
+circuit breakers as the blocking client.
+
+HTTP goes through aiohttp when it is installed (optional, `pip install
+aiohttp`): one pooled ClientSession per server URL with at most POOL_SIZE
+connections. Without it, each request is sent with the blocking pooled
+session on the loop's default executor; the API is the same, but requests
+then only overlap as far as the executor's threads allow.
+
+Sync code (Flask handlers, worker threads) runs coroutines on one shared
+background event loop, in a copy of the caller's context so tracing and
+profiling follow them:
+
+    providers = run_sync(AsyncFinCompassClient(url, api_key).get_providers()).json()
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Any, Awaitable, Dict, Iterable, List, Optional
+
+from .circuit_breaker import breakers
+from .fincompass_client import DEFAULT_TIMEOUT, MAX_ATTEMPTS, POOL_SIZE, FinCompassClient, session_for
+from .host import requests
+from .rate_limit import limiter, parse_retry_after
+from .tracing import tracer
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncResponse:
+    """The parts of a requests.Response the plugin uses, for a response read by the async client."""
+
+    def __init__(self, status_code: int, headers: Dict[str, str], content: bytes, url: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise requests.exceptions.HTTPError(f'{self.status_code} Error for url: {self.url}')
+
+
+class BackgroundLoop:
+    """An event loop running forever in a daemon thread, started on first use."""
+
+    def __init__(self, name: str = 'fincompass-async'):
+        self._name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name=self._name, daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def submit(self, coro: Awaitable) -> Future:
+        """Schedule `coro` on the loop, in a copy of the caller's context; returns a concurrent Future."""
+        future: Future = Future()
+        context = contextvars.copy_context()
+
+        def start():
+            # The task copies the current context, so it is created inside the caller's (create_task's context= needs 3.11)
+            task = context.run(self.loop.create_task, coro)
+
+            def done(t: asyncio.Task):
+                if t.cancelled():
+                    future.cancel()
+                elif t.exception() is not None:
+                    future.set_exception(t.exception())
+                else:
+                    future.set_result(t.result())
+            task.add_done_callback(done)
+        self.loop.call_soon_threadsafe(start)
+        return future
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Run `coro` on the loop and wait for its result. Must not be called from the loop's own thread."""
+        return self.submit(coro).result(timeout)
+
+
+background = BackgroundLoop()
+
+
+def run_sync(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the shared background loop from sync code and return its result."""
+    return background.run(coro, timeout)
+
+
+# Per event loop: server URL -> aiohttp.ClientSession (sessions are bound to the loop that created them)
+_sessions: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]' = weakref.WeakKeyDictionary()
+
+
+def _aiohttp_session(base_url: str):
+    loop = asyncio.get_running_loop()
+    sessions = _sessions.setdefault(loop, {})
+    session = sessions.get(base_url)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=POOL_SIZE))
+        sessions[base_url] = session
+    return session
+
+
+class AsyncFinCompassClient:
+    def __init__(self, base_url: str, api_key: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT, exchange_id: Optional[str] = None,
+                 wait_timeout: Optional[float] = None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+        self.exchange_id = exchange_id
+        self.wait_timeout = limiter.wait if wait_timeout is None else wait_timeout
+
+    @classmethod
+    def from_client(cls, client: FinCompassClient) -> 'AsyncFinCompassClient':
+        """Async client with the same server, key, timeouts and exchange as a blocking one."""
+        return cls(client.base_url, client.api_key, client.timeout, client.exchange_id, client.wait_timeout)
+
+    def _headers(self) -> Dict[str, str]:
+        return {'X-API-KEY': self.api_key} if self.api_key else {}
+
+    async def _send(self, method: str, url: str, params=None, json_body=None, headers=None, timeout: float = DEFAULT_TIMEOUT) -> AsyncResponse:
+        if aiohttp is not None:
+            async with _aiohttp_session(self.base_url).request(method, url, params=params, json=json_body, headers=headers,
+                                                               timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                return AsyncResponse(resp.status, dict(resp.headers), await resp.read(), url)
+        request = functools.partial(session_for(self.base_url).request, method, url, params=params, json=json_body, headers=headers,
+                                    timeout=timeout)
+        resp = await asyncio.get_running_loop().run_in_executor(None, request)
+        return AsyncResponse(resp.status_code, resp.headers, resp.content, url)
+
+    async def _request(self, method: str, path: str, exchange_id: Optional[str] = None, params=None, json_body=None, headers=None,
+                       timeout: Optional[float] = None) -> AsyncResponse:
+        """
+        Send a rate-limited request; retries 429 answers while the wait deadline allows and returns the last response.
+        Raises RateLimitTimeout or CircuitOpen like FinCompassClient.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        breaker = breakers.get(self.base_url)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            await limiter.acquire_async(self.base_url, exchange_id, deadline)
+            started = breaker.acquire() if breaker else None
+            try:
+                resp = await self._send(method, f"{self.base_url}{path}", params, json_body, headers, timeout or self.timeout)
+            except Exception:
+                if breaker:
+                    breaker.release(started, failed=True)
+                raise
+            if breaker:
+                breaker.release(started, failed=resp.status_code >= 500)
+            if resp.status_code != 429:
+                limiter.succeeded(self.base_url, exchange_id)
+                return resp
+            retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+            limiter.throttled(self.base_url, exchange_id, retry_after)
+            tracer.set(throttled_attempts=attempt)
+        return resp
+
+    async def get_providers(self) -> AsyncResponse:
+        """GET the server's providers; returns the response."""
+        with tracer.span('remote.get_providers', transport='async'):
+            resp = await self._request('GET', '/api/v1/providers/', headers=self._headers())
+            tracer.set(status_code=resp.status_code)
+            return resp
+
+    async def get_symbols(self, exchange_id: str, trading_type: str = 'spot', timeout: float = 20) -> AsyncResponse:
+        """GET the symbols of an exchange; returns the response."""
+        with tracer.span('remote.get_symbols', exchange_id=exchange_id, transport='async'):
+            resp = await self._request('GET', f"/api/v1/symbols/exchange/{exchange_id}", exchange_id, params={'trading_type': trading_type},
+                                       headers={'accept': 'application/json'}, timeout=timeout)
+            tracer.set(status_code=resp.status_code, bytes=len(resp.content))
+            return resp
+
+    async def get_symbols_many(self, exchange_ids: Iterable[str], trading_type: str = 'spot', timeout: float = 20) -> List[Any]:
+        """The symbols responses of several exchanges fetched concurrently, in order; a failed fetch is its exception."""
+        return await asyncio.gather(*(self.get_symbols(exchange_id, trading_type, timeout) for exchange_id in exchange_ids),
+                                    return_exceptions=True)
+
+    async def post_schedule(self, payload: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """POST one schedule; returns the created schedule (including its 'id')."""
+        headers = self._headers()
+        if idempotency_key:
+            headers['Idempotency-Key'] = idempotency_key
+        with tracer.span('remote.post_schedule', side=payload.get('side'), symbol=payload.get('symbol'), transport='async'):
+            resp = await self._request('POST', '/api/v1/schedules/', self.exchange_id, json_body=payload, headers=headers)
+            resp.raise_for_status()
+            data = resp.json()
+            tracer.set(schedule_id=data.get('id'))
+            return data
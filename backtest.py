@@ -0,0 +1,344 @@
+"""
+Offline backtest of the dynamic sell-timing model (timing_analysis.analyze_timing_for_symbol).
+
+Replays the timing formula
+
+    timing_score = value_factor * w_value + gv_factor * w_gv + random_factor * w_random
+    hold_minutes = max_hold - int(timing_score * (max_hold - min_hold))
+
+over the recorded start-magic runs (intention_schedules with their chosen
+symbol, energetic value and GV) for a whole grid of weights and hold ranges,
+and prices every simulated trade from a local price history file. The grid is
+evaluated as NumPy arrays, not per trade in Python.
+
+The random factor comes from a seeded generator and every parameter
+combination sees the same draws, so runs are reproducible and combinations are
+compared on equal terms.
+
+Price history: CSV (or Parquet, with pyarrow installed) with the columns
+`timestamp` (ISO 8601 or epoch seconds), `symbol` and `price`. A trade is
+priced at the last tick at or before its buy and sell time; runs whose symbol
+has no tick before the buy or after the sell are left out.
+
+Usage (from the plugin directory):
+
+    python backtest.py --db fincompass.db --prices prices.csv --seed 42 --step 0.05 --holds 30:1440,60:720
+
+Requires NumPy.
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from .timing_analysis import VALUE_WEIGHT, GV_WEIGHT, RANDOM_WEIGHT
+except ImportError:
+    from timing_analysis import VALUE_WEIGHT, GV_WEIGHT, RANDOM_WEIGHT
+
+DEFAULT_SEED = 42
+DEFAULT_STEP = 0.1
+DEFAULT_DRAWS = 16
+DEFAULT_TOP = 10
+# Hold range used by start-magic when an intention does not set one
+DEFAULT_MIN_HOLD = 30
+DEFAULT_MAX_HOLD = 1440
+DEFAULT_GV = 500
+# Upper bound on simulated trades held in memory at once (combinations x draws x runs)
+MAX_CHUNK_ELEMENTS = 4_000_000
+# Upper bound on the per-(run, hold minute) return table
+MAX_TABLE_ELEMENTS = 8_000_000
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError('backtest.py requires NumPy (pip install numpy).')
+
+
+def _to_epoch(value) -> Optional[int]:
+    """Epoch seconds for an ISO 8601 string (with or without 'Z') or a number."""
+    if value is None or value == '':
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        pass
+    parsed = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        # start-magic stores UTC times
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def load_runs(db_path: str, intention_id: Optional[int] = None, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load the recorded runs (schedules with a chosen symbol and energetic value) from the plugin DB.
+    Returns column arrays: schedule_id, buy_ts, symbol, value_factor, gv_factor, min_hold, max_hold.
+    """
+    _require_numpy()
+    query = '''
+        SELECT s.id, s.buy_datetime, s.symbol, s.energetic_value, s.gv, i.min_hold_minutes, i.max_hold_minutes
+        FROM intention_schedules s
+        JOIN intentions i ON i.id = s.intention_id
+        WHERE s.symbol IS NOT NULL AND s.energetic_value IS NOT NULL AND s.buy_datetime IS NOT NULL
+    '''
+    params: List[Any] = []
+    if intention_id is not None:
+        query += ' AND s.intention_id = ?'
+        params.append(intention_id)
+    if since:
+        query += ' AND s.buy_datetime >= ?'
+        params.append(since)
+    if until:
+        query += ' AND s.buy_datetime < ?'
+        params.append(until)
+    query += ' ORDER BY s.buy_datetime'
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+    energetic_value = np.array([row[3] for row in rows], dtype=np.float64)
+    gv = np.array([DEFAULT_GV if row[4] is None else row[4] for row in rows], dtype=np.float64)
+    min_hold = np.array([DEFAULT_MIN_HOLD if row[5] is None else row[5] for row in rows], dtype=np.int64)
+    max_hold = np.array([DEFAULT_MAX_HOLD if row[6] is None else row[6] for row in rows], dtype=np.int64)
+    return {
+        'schedule_id': np.array([row[0] for row in rows], dtype=np.int64),
+        'buy_ts': np.array([_to_epoch(row[1]) for row in rows], dtype=np.int64),
+        'symbol': np.array([row[2] for row in rows], dtype=object),
+        # Same normalization as analyze_timing_for_symbol
+        'value_factor': np.minimum(energetic_value / 1000.0, 1.0),
+        'gv_factor': 1.0 - np.minimum(gv / 1000.0, 1.0),
+        'min_hold': min_hold,
+        'max_hold': max_hold,
+    }
+
+
+class PriceHistory:
+    """Per-symbol price ticks in one sorted key array, for vectorized as-of lookups."""
+
+    def __init__(self, symbols: Sequence[str], timestamps, prices):
+        _require_numpy()
+        self.symbols, codes = np.unique(np.asarray(symbols, dtype=object).astype(str), return_inverse=True)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        self.ts_min = int(timestamps.min()) if len(timestamps) else 0
+        # Keys are ordered by symbol, then time: code * span + offset
+        self.span = (int(timestamps.max()) - self.ts_min + 1) if len(timestamps) else 1
+        order = np.lexsort((timestamps, codes))
+        self.codes = codes[order].astype(np.int64)
+        self.timestamps = timestamps[order]
+        self.prices = prices[order]
+        self.keys = self.codes * self.span + (self.timestamps - self.ts_min)
+        self.last_ts = np.full(len(self.symbols), np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(self.last_ts, self.codes, self.timestamps)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'PriceHistory':
+        if path.endswith('.parquet'):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError('Reading Parquet price files requires pyarrow.')
+            table = pq.read_table(path, columns=['timestamp', 'symbol', 'price']).to_pydict()
+            return cls(table['symbol'], [_to_epoch(t) for t in table['timestamp']], table['price'])
+        symbols, timestamps, prices = [], [], []
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                symbols.append(row['symbol'])
+                timestamps.append(_to_epoch(row['timestamp']))
+                prices.append(float(row['price']))
+        return cls(symbols, timestamps, prices)
+
+    def codes_for(self, symbols) -> Any:
+        """Symbol codes for `symbols`; -1 for symbols without price history."""
+        symbols = np.asarray(symbols, dtype=object).astype(str)
+        if not len(self.symbols):
+            return np.full(len(symbols), -1, dtype=np.int64)
+        index = np.minimum(np.searchsorted(self.symbols, symbols), len(self.symbols) - 1)
+        return np.where(self.symbols[index] == symbols, index, -1).astype(np.int64)
+
+    def asof(self, codes, timestamps) -> Any:
+        """Price of each (code, timestamp) at the last tick at or before it; NaN when there is none or it lies past the data."""
+        codes, timestamps = np.broadcast_arrays(np.asarray(codes, dtype=np.int64), np.asarray(timestamps, dtype=np.int64))
+        offsets = np.clip(timestamps - self.ts_min, -1, self.span - 1)
+        position = np.searchsorted(self.keys, codes * self.span + offsets, side='right') - 1
+        safe = np.maximum(position, 0)
+        valid = (codes >= 0) & (position >= 0) & (timestamps >= self.ts_min)
+        valid &= self.codes[safe] == codes
+        valid &= timestamps <= self.last_ts[np.maximum(codes, 0)]
+        return np.where(valid, self.prices[safe], np.nan)
+
+
+def weight_grid(step: float) -> Any:
+    """All (w_value, w_gv, w_random) with the given step that sum to 1, plus the current weights."""
+    _require_numpy()
+    n = int(round(1.0 / step))
+    grid = [(a / n, b / n, (n - a - b) / n) for a in range(n + 1) for b in range(n + 1 - a)]
+    current = (VALUE_WEIGHT, GV_WEIGHT, RANDOM_WEIGHT)
+    if not any(np.allclose(w, current) for w in grid):
+        grid.append(current)
+    return np.array(grid, dtype=np.float64)
+
+
+def parse_holds(spec: Optional[str]) -> List[Optional[Tuple[int, int]]]:
+    """'30:1440,60:720' -> [(30, 1440), (60, 720)]; 'intention' (or empty) keeps each run's own range."""
+    holds: List[Optional[Tuple[int, int]]] = []
+    for part in (spec or 'intention').split(','):
+        part = part.strip()
+        if not part or part == 'intention':
+            holds.append(None)
+            continue
+        low, _, high = part.partition(':')
+        low, high = int(low), int(high)
+        if low < 0 or high < low:
+            raise ValueError(f'Invalid hold range: {part}')
+        holds.append((low, high))
+    return holds
+
+
+def _summarize(returns) -> List[Dict[str, Any]]:
+    """Distribution of each combination's realized returns; `returns` is (combinations, trades), NaN = not priced."""
+    priced = ~np.isnan(returns)
+    trades = priced.sum(axis=1)
+    summaries = []
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nanmean(returns, axis=1) if returns.size else np.zeros(len(returns))
+        std = np.nanstd(returns, axis=1) if returns.size else np.zeros(len(returns))
+        wins = (np.nan_to_num(returns, nan=0.0) > 0).sum(axis=1)
+        percentiles = np.nanpercentile(returns, PERCENTILES, axis=1) if trades.any() else None
+    for i, count in enumerate(trades):
+        if not count:
+            summaries.append({'trades': 0})
+            continue
+        summary = {
+            'trades': int(count),
+            'mean': float(mean[i]),
+            'std': float(std[i]),
+            'win_rate': float(wins[i] / count),
+        }
+        summary.update({f'p{p}': float(percentiles[j, i]) for j, p in enumerate(PERCENTILES)})
+        summaries.append(summary)
+    return summaries
+
+
+def _return_table(prices: PriceHistory, codes, buy_ts, buy_price, low: int, high: int):
+    """Realized return of every run for every hold minute in [low, high]: (runs, high - low + 1)."""
+    minutes = np.arange(low, high + 1, dtype=np.int64)
+    sell_price = prices.asof(codes[:, None], buy_ts[:, None] + minutes * 60)
+    return sell_price / buy_price[:, None] - 1.0
+
+
+def run_backtest(runs: Dict[str, Any], prices: PriceHistory, weights, holds: List[Optional[Tuple[int, int]]],
+                 seed: int = DEFAULT_SEED, draws: int = DEFAULT_DRAWS) -> List[Dict[str, Any]]:
+    """Evaluate every (weights, hold range) combination; returns one summary per combination."""
+    _require_numpy()
+    rng = np.random.default_rng(seed)
+    run_count = len(runs['buy_ts'])
+    # Like hotbits.getInt(0, 1000) / 1000; shared by all combinations
+    random_factor = rng.integers(0, 1001, size=(draws, run_count)) / 1000.0
+    codes = prices.codes_for(runs['symbol'])
+    buy_ts = runs['buy_ts']
+    buy_price = prices.asof(codes, buy_ts)
+    run_index = np.arange(run_count)
+
+    chunk = max(1, MAX_CHUNK_ELEMENTS // max(1, draws * run_count))
+    summaries = []
+    for hold in holds:
+        min_hold = runs['min_hold'] if hold is None else np.full(run_count, hold[0], dtype=np.int64)
+        max_hold = runs['max_hold'] if hold is None else np.full(run_count, hold[1], dtype=np.int64)
+        hold_range = max_hold - min_hold
+        low = int(min_hold.min()) if run_count else 0
+        high = int(max_hold.max()) if run_count else 0
+        # Hold minutes are integers in a bounded range: price each (run, minute) once and gather,
+        # instead of one lookup per simulated trade
+        table = _return_table(prices, codes, buy_ts, buy_price, low, high) if run_count * (high - low + 1) <= MAX_TABLE_ELEMENTS else None
+        for start in range(0, len(weights), chunk):
+            w = weights[start:start + chunk]
+            # (combinations, draws, runs)
+            score = (w[:, 0, None, None] * runs['value_factor'] + w[:, 1, None, None] * runs['gv_factor']
+                     + w[:, 2, None, None] * random_factor)
+            hold_minutes = np.clip(max_hold - np.floor(score * hold_range).astype(np.int64), min_hold, max_hold)
+            if table is not None:
+                returns = table[run_index, hold_minutes - low]
+            else:
+                returns = prices.asof(codes, buy_ts + hold_minutes * 60) / buy_price - 1.0
+            mean_hold = hold_minutes.reshape(len(w), -1).mean(axis=1)
+            stats = _summarize(returns.reshape(len(w), -1))
+            for i, (w_value, w_gv, w_random) in enumerate(w):
+                summary = {
+                    'weights': {'value': round(float(w_value), 6), 'gv': round(float(w_gv), 6), 'random': round(float(w_random), 6)},
+                    'hold_range': 'intention' if hold is None else f'{hold[0]}:{hold[1]}',
+                    'mean_hold_minutes': float(mean_hold[i]),
+                }
+                summary.update(stats[i])
+                summaries.append(summary)
+    return summaries
+
+
+def build_report(summaries: List[Dict[str, Any]], runs: Dict[str, Any], seed: int, draws: int, top: int, elapsed: float) -> Dict[str, Any]:
+    current = {'value': VALUE_WEIGHT, 'gv': GV_WEIGHT, 'random': RANDOM_WEIGHT}
+    ranked = sorted((s for s in summaries if s.get('trades')), key=lambda s: s['mean'], reverse=True)
+    baseline = next((s for s in summaries if s['hold_range'] == 'intention' and all(
+        abs(s['weights'][k] - v) < 1e-9 for k, v in current.items())), None)
+    return {
+        'runs': int(len(runs['buy_ts'])),
+        'seed': seed,
+        'draws': draws,
+        'combinations': len(summaries),
+        'elapsed_s': round(elapsed, 3),
+        'current_weights': current,
+        'baseline': baseline,
+        'top': ranked[:top],
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Backtest the dynamic sell-timing model over recorded runs.')
+    parser.add_argument('--db', required=True, help='Plugin database (fincompass.db)')
+    parser.add_argument('--prices', required=True, help='Price history, CSV or Parquet (timestamp, symbol, price)')
+    parser.add_argument('--intention-id', type=int, help='Only runs of this intention')
+    parser.add_argument('--since', help='Only runs bought at or after this ISO time')
+    parser.add_argument('--until', help='Only runs bought before this ISO time')
+    parser.add_argument('--step', type=float, default=DEFAULT_STEP, help=f'Weight grid step (default {DEFAULT_STEP})')
+    parser.add_argument('--holds', default='intention', help="Hold ranges in minutes, e.g. 'intention,30:1440,60:720'")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--draws', type=int, default=DEFAULT_DRAWS, help='Random-factor draws per run')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help='Combinations to report, best mean return first')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    try:
+        _require_numpy()
+        started = time.perf_counter()
+        runs = load_runs(args.db, args.intention_id, args.since, args.until)
+        prices = PriceHistory.from_file(args.prices)
+        summaries = run_backtest(runs, prices, weight_grid(args.step), parse_holds(args.holds), args.seed, args.draws)
+        report = build_report(summaries, runs, args.seed, args.draws, args.top, time.perf_counter() - started)
+    except (RuntimeError, ValueError, OSError, sqlite3.Error) as e:
+        print(f"[FinCompass] Backtest failed: {e}", file=sys.stderr)
+        return 1
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        print(f"Wrote backtest report for {report['runs']} runs and {report['combinations']} combinations to {args.output}")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,5 @@
+"""
+Benchmark harness for the FinCompass plugin.
+Runs the plugin outside of AetherOnePy against local stand-ins for the host
+DAO/services and the remote FinCompass server. See benchmarks/run.py.
+"""
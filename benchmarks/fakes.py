@@ -0,0 +1,241 @@
+"""
+Local stand-ins for the AetherOnePy host modules used by the FinCompass plugin.
+
+routes.py imports domains.aetherOneDomains, services.analyzeService and
+services.hotbitsService from the host application and reads everything else
+through app.case_dao. The classes below mirror the attributes the plugin
+actually touches so the plugin can be benchmarked without the host app.
+"""
+import random
+import sqlite3
+import sys
+import types
+from typing import Any, Dict, List, Optional
+
+
+# --- domains.aetherOneDomains ---
+
+class Catalog:
+    def __init__(self, name: str, description: str = '', author: str = '', id: int = None):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.author = author
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'id': self.id, 'name': self.name, 'description': self.description, 'author': self.author}
+
+
+class Rate:
+    def __init__(self, signature: str, description: str = '', catalogID: int = None, id: int = None):
+        self.id = id
+        self.signature = signature
+        self.description = description
+        self.catalogID = catalogID
+
+
+class Session:
+    def __init__(self, intention: str, description: str = '', caseID: int = None, id: int = None):
+        self.id = id
+        self.intention = intention
+        self.description = description
+        self.caseID = caseID
+
+
+class Analysis:
+    def __init__(self, note: str = '', sessionID: int = None, id: int = None):
+        self.id = id
+        self.note = note
+        self.sessionID = sessionID
+        self.catalogId = None
+
+
+class RateAnalysis:
+    def __init__(self, analysis_id: int, rate: Rate, energetic_value: int, gv: int):
+        self.analysis_id = analysis_id
+        self.rate_id = rate.id
+        self.signature = rate.signature
+        self.description = rate.description
+        self.catalogID = rate.catalogID
+        self.energetic_value = energetic_value
+        self.gv = gv
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'analysis_id': self.analysis_id,
+            'rate_id': self.rate_id,
+            'signature': self.signature,
+            'description': self.description,
+            'catalogID': self.catalogID,
+            'value': self.energetic_value,
+            'energetic_value': self.energetic_value,
+            'gv': self.gv,
+        }
+
+
+# --- services.hotbitsService ---
+
+class HotbitsSource:
+    WEBCAM = 'WEBCAM'
+    RASPBERRY_PI = 'RASPBERRY_PI'
+    TIME_LOOP = 'TIME_LOOP'
+
+
+class HotbitsService:
+    """Seeded pseudo-random stand-in; the real service reads hotbits files from disk."""
+
+    def __init__(self, source=None, folder_path: str = None, db=None, main=None, seed: int = 42):
+        self.source = source
+        self.folder_path = folder_path
+        self._random = random.Random(seed)
+
+    def getInt(self, min_value: int, max_value: int) -> int:
+        return self._random.randint(min_value, max_value)
+
+
+# --- services.analyzeService ---
+
+def analyze(analysis_id: int, rates: list, hotbits, check_gv: bool = True, advanced: bool = False) -> List[RateAnalysis]:
+    """Score every rate once, like the host analyze() does (minus its heavier statistics)."""
+    results = []
+    for rate in rates:
+        energetic_value = hotbits.getInt(0, 1000)
+        gv = hotbits.getInt(300, 1200) if check_gv else 0
+        results.append(RateAnalysis(analysis_id, rate, energetic_value, gv))
+    return results
+
+
+def install_host_stubs() -> None:
+    """Register the stand-in host modules in sys.modules so routes.py can be imported."""
+    domains = types.ModuleType('domains')
+    domains_mod = types.ModuleType('domains.aetherOneDomains')
+    for cls in (Catalog, Rate, Session, Analysis):
+        setattr(domains_mod, cls.__name__, cls)
+    domains.aetherOneDomains = domains_mod
+
+    services = types.ModuleType('services')
+    analyze_mod = types.ModuleType('services.analyzeService')
+    analyze_mod.analyze = analyze
+    hotbits_mod = types.ModuleType('services.hotbitsService')
+    hotbits_mod.HotbitsService = HotbitsService
+    hotbits_mod.HotbitsSource = HotbitsSource
+    services.analyzeService = analyze_mod
+    services.hotbitsService = hotbits_mod
+
+    sys.modules.update({
+        'domains': domains,
+        'domains.aetherOneDomains': domains_mod,
+        'services': services,
+        'services.analyzeService': analyze_mod,
+        'services.hotbitsService': hotbits_mod,
+    })
+
+
+# --- case_dao ---
+
+class FakeCaseDao:
+    """
+    Temporary-SQLite stand-in for AetherOnePy's case_dao.
+    Only the methods called by the FinCompass plugin are implemented.
+    """
+
+    def __init__(self, db_path: str = ':memory:', settings: Optional[Dict[str, Any]] = None):
+        self.db_path = db_path
+        self.settings = settings or {'analysisAlwaysCheckGV': True, 'analysisAdvanced': False}
+        # A single shared connection; Flask's test client runs handlers on the calling thread
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS catalog (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, description TEXT, author TEXT);
+            CREATE TABLE IF NOT EXISTS rate (id INTEGER PRIMARY KEY AUTOINCREMENT, signature TEXT, description TEXT, catalogID INTEGER);
+            CREATE INDEX IF NOT EXISTS idx_rate_catalog ON rate(catalogID);
+            CREATE TABLE IF NOT EXISTS cases (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT);
+            CREATE TABLE IF NOT EXISTS session (id INTEGER PRIMARY KEY AUTOINCREMENT, intention TEXT, description TEXT, caseID INTEGER);
+            CREATE TABLE IF NOT EXISTS analysis (id INTEGER PRIMARY KEY AUTOINCREMENT, note TEXT, sessionID INTEGER, catalogId INTEGER);
+            CREATE TABLE IF NOT EXISTS rateAnalysis (id INTEGER PRIMARY KEY AUTOINCREMENT, analysis_id INTEGER, rate_id INTEGER, energetic_value INTEGER, gv INTEGER);
+        ''')
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get_setting(self, key: str):
+        return self.settings.get(key)
+
+    # Cases / sessions / analyses
+
+    def create_case(self, name: str):
+        cursor = self.conn.execute('INSERT INTO cases (name) VALUES (?)', (name,))
+        self.conn.commit()
+        return types.SimpleNamespace(id=cursor.lastrowid, name=name)
+
+    def create_session(self, case_id: int, intention: str, description: str):
+        session = Session(intention, description, case_id)
+        self.insert_session(session)
+        return session
+
+    def insert_session(self, session: Session) -> None:
+        cursor = self.conn.execute('INSERT INTO session (intention, description, caseID) VALUES (?, ?, ?)',
+                                   (session.intention, session.description, session.caseID))
+        self.conn.commit()
+        session.id = cursor.lastrowid
+
+    def create_analysis(self, session_id: int, catalog_id: int, note: str):
+        analysis = Analysis(note, session_id)
+        analysis.catalogId = catalog_id
+        self.insert_analysis(analysis)
+        return analysis
+
+    def insert_analysis(self, analysis: Analysis) -> None:
+        cursor = self.conn.execute('INSERT INTO analysis (note, sessionID, catalogId) VALUES (?, ?, ?)',
+                                   (analysis.note, analysis.sessionID, analysis.catalogId))
+        self.conn.commit()
+        analysis.id = cursor.lastrowid
+
+    def run_analysis(self, analysis_id: int) -> list:
+        row = self.conn.execute('SELECT catalogId FROM analysis WHERE id = ?', (analysis_id,)).fetchone()
+        rates = self.list_rates_from_catalog(row[0]) if row else []
+        enhanced = analyze(analysis_id, rates, HotbitsService())
+        self.insert_rates_for_analysis(enhanced)
+        return [r.to_dict() for r in enhanced]
+
+    def insert_rates_for_analysis(self, enhanced_rates: list) -> None:
+        self.conn.executemany(
+            'INSERT INTO rateAnalysis (analysis_id, rate_id, energetic_value, gv) VALUES (?, ?, ?, ?)',
+            [(r.analysis_id, r.rate_id, r.energetic_value, r.gv) for r in enhanced_rates])
+        self.conn.commit()
+
+    # Catalogs / rates
+
+    def list_catalogs(self) -> List[Catalog]:
+        rows = self.conn.execute('SELECT id, name, description, author FROM catalog ORDER BY name').fetchall()
+        return [Catalog(name, description, author, id=id) for id, name, description, author in rows]
+
+    def get_catalog_by_name(self, name: str) -> Optional[Catalog]:
+        row = self.conn.execute('SELECT id, name, description, author FROM catalog WHERE name = ?', (name,)).fetchone()
+        return Catalog(row[1], row[2], row[3], id=row[0]) if row else None
+
+    def insert_catalog(self, catalog: Catalog) -> None:
+        cursor = self.conn.execute('INSERT INTO catalog (name, description, author) VALUES (?, ?, ?)',
+                                   (catalog.name, catalog.description, catalog.author))
+        self.conn.commit()
+        catalog.id = cursor.lastrowid
+
+    def list_rates_from_catalog(self, catalog_id: int) -> List[Rate]:
+        rows = self.conn.execute('SELECT id, signature, description, catalogID FROM rate WHERE catalogID = ?',
+                                 (catalog_id,)).fetchall()
+        return [Rate(signature, description, catalogID, id=id) for id, signature, description, catalogID in rows]
+
+    def insert_rate(self, rate: Rate) -> None:
+        # The host DAO commits per rate as well, which is what the sync loop pays for today
+        cursor = self.conn.execute('INSERT INTO rate (signature, description, catalogID) VALUES (?, ?, ?)',
+                                   (rate.signature, rate.description, rate.catalogID))
+        self.conn.commit()
+        rate.id = cursor.lastrowid
+
+    def delete_rate(self, rate_id: int) -> None:
+        self.conn.execute('DELETE FROM rate WHERE id = ?', (rate_id,))
+        self.conn.commit()
+
+    def clear_catalog(self, catalog_id: int) -> None:
+        """Benchmark helper: drop every rate of a catalog."""
+        self.conn.execute('DELETE FROM rate WHERE catalogID = ?', (catalog_id,))
+        self.conn.commit()
@@ -0,0 +1,383 @@
+"""
+FinCompass benchmark runner.
+
+Runs the plugin blueprint inside a bare Flask app, backed by a temporary-SQLite
+fake case_dao and a local stub of the remote FinCompass server, and times:
+
+    sync_rates.*   POST /api/providers/<exchange_id>/sync-rates
+    start_magic*   POST /api/start-magic and /api/start-magic/batch
+    db.*           FinCompassDatabase CRUD paths
+
+at every requested catalog size. Results are written as JSON so two runs can be
+compared:
+
+    python -m benchmarks.run --sizes 100,1000 --output before.json
+    python -m benchmarks.run --sizes 100,1000 --output after.json --compare before.json
+"""
+import argparse
+import contextlib
+import importlib
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .fakes import FakeCaseDao, install_host_stubs
+from .stub_server import StubFinCompassServer, make_symbols
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+PLUGIN_PACKAGE = 'fincompass_plugin'
+URL_PREFIX = '/fincompassplugin'
+EXCHANGE_ID = 'bench'
+DEFAULT_SIZES = [100, 1000, 10000, 50000]
+
+
+def load_plugin():
+    """Import the plugin directory as a package, the way AetherOnePy's plugin loader does."""
+    install_host_stubs()
+    if PLUGIN_PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            PLUGIN_PACKAGE, PLUGIN_DIR / '__init__.py', submodule_search_locations=[str(PLUGIN_DIR)])
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[PLUGIN_PACKAGE] = module
+        spec.loader.exec_module(module)
+    routes = importlib.import_module(f'{PLUGIN_PACKAGE}.routes')
+    database = importlib.import_module(f'{PLUGIN_PACKAGE}.database')
+    # Analysis workers start fresh processes, which need the same stand-ins
+    importlib.import_module(f'{PLUGIN_PACKAGE}.parallel_analysis').worker_setup = install_host_stubs
+    return routes, database
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow the plugin's stdout debug output; it is still formatted, so its cost is measured."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+class BenchEnv:
+    """A Flask app with the FinCompass blueprint wired to the fakes and the stub server."""
+
+    def __init__(self, workdir: str, stub: StubFinCompassServer):
+        from flask import Flask
+        # Background syncs would run against the stub while requests are timed
+        os.environ.setdefault('FINCOMPASS_SYNC_DAEMON', '0')
+        os.environ.setdefault('FINCOMPASS_PNL', '0')
+        routes, database = load_plugin()
+        self.stub = stub
+        self.dao = FakeCaseDao(os.path.join(workdir, 'aetherone.db'))
+        db_path = os.path.join(workdir, 'fincompass.db')
+        self.app = Flask('fincompass-bench')
+        self.app.case_dao = self.dao
+        with quiet():
+            blueprint = routes.create_blueprint(self.app, db_path=db_path)
+        self.app.register_blueprint(blueprint, url_prefix=URL_PREFIX)
+        self.client = self.app.test_client()
+        self.db = database.FinCompassDatabase(db_path)
+        self._seed()
+
+    def _seed(self) -> None:
+        server = self.db.add_server(self.stub.url, 'Benchmark stub', True, 'bench-key')
+        self.server_id = server['id']
+        self.db.store_providers(self.server_id, self.stub.providers)
+        with self.db._get_connection() as conn:
+            conn.execute('UPDATE providers SET exchange_id = ?, selected = 1 WHERE server_id = ?',
+                         (EXCHANGE_ID, self.server_id))
+        self.provider = self.db.get_providers_by_server(self.server_id)[0]
+        self.intention = self.db.create_intention('Bench intention', 'benchmark', True, hold_minutes=60, amount=10)
+        case = self.dao.create_case('Bench case')
+        self.db.sync_cases([{'id': case.id, 'name': case.name}])
+        self.case = next(c for c in self.db.get_cases() if c['aetherone_case_id'] == case.id)
+
+    def set_catalog_symbols(self, symbols: List[str]) -> None:
+        """Make the stub serve `symbols` and ensure the catalog exists in both databases."""
+        self.stub.set_symbols(EXCHANGE_ID, symbols)
+        catalog = self.dao.get_catalog_by_name(EXCHANGE_ID)
+        if catalog is None:
+            from domains.aetherOneDomains import Catalog
+            catalog = Catalog(EXCHANGE_ID, f"Rates for {EXCHANGE_ID}", "FinCompass")
+            self.dao.insert_catalog(catalog)
+        self.catalog = catalog
+        self.db.sync_catalogs([{'id': catalog.id, 'name': catalog.name}])
+        self.plugin_catalog = next(c for c in self.db.get_catalogs() if c['aetherone_catalog_id'] == catalog.id)
+
+    def sync_rates(self) -> Dict[str, Any]:
+        with quiet():
+            resp = self.client.post(f'{URL_PREFIX}/api/providers/{EXCHANGE_ID}/sync-rates')
+        return self._check(resp)
+
+    def start_magic(self) -> Dict[str, Any]:
+        with quiet():
+            resp = self.client.post(f'{URL_PREFIX}/api/start-magic', json={
+                'intention_id': self.intention['id'],
+                'case_id': self.case['id'],
+                'provider_id': self.provider['id'],
+                'catalog_id': self.plugin_catalog['id'],
+            })
+        return self._check(resp)
+
+    def start_magic_batch(self, count: int, max_workers: int = 4) -> Dict[str, Any]:
+        with quiet():
+            resp = self.client.post(f'{URL_PREFIX}/api/start-magic/batch', json={
+                'provider_id': self.provider['id'],
+                'catalog_id': self.plugin_catalog['id'],
+                'max_workers': max_workers,
+                'items': [{'intention_id': self.intention['id'], 'case_id': self.case['id']}] * count,
+            })
+        return self._check(resp)
+
+    @staticmethod
+    def _check(resp) -> Dict[str, Any]:
+        body = resp.get_json(silent=True) or {}
+        if resp.status_code != 200 or body.get('status') != 'success':
+            raise RuntimeError(f"Benchmark request failed: {resp.status_code} {body}")
+        return body
+
+    def close(self) -> None:
+        self.dao.close()
+
+
+def time_call(fn: Callable[[], Any], repeats: int, setup: Optional[Callable[[], Any]] = None) -> List[float]:
+    timings = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(scenario: str, size: int, timings: List[float], **extra) -> Dict[str, Any]:
+    ordered = sorted(timings)
+    return {
+        'scenario': scenario,
+        'size': size,
+        'repeats': len(timings),
+        'timings_s': timings,
+        'min_s': ordered[0],
+        'median_s': statistics.median(ordered),
+        'mean_s': statistics.fmean(ordered),
+        'max_s': ordered[-1],
+        'stdev_s': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        'extra': extra,
+    }
+
+
+# --- Scenarios ---
+
+def bench_endpoints(size: int, repeats: int, stub: StubFinCompassServer, workdir: str) -> List[Dict[str, Any]]:
+    env = BenchEnv(workdir, stub)
+    try:
+        symbols = make_symbols(size)
+        env.set_catalog_symbols(symbols)
+        results = []
+
+        timings = time_call(env.sync_rates, repeats, setup=lambda: env.dao.clear_catalog(env.catalog.id))
+        results.append(summarize('sync_rates.initial', size, timings))
+
+        timings = time_call(env.sync_rates, repeats)
+        results.append(summarize('sync_rates.resync', size, timings))
+
+        # Replace 10% of the symbols so every run deletes and inserts size/10 rates
+        churn = max(1, size // 10)
+        rng = random.Random(size)
+
+        def churn_setup():
+            env.stub.set_symbols(EXCHANGE_ID, symbols)
+            env.sync_rates()
+            changed = list(symbols)
+            for i in rng.sample(range(size), churn):
+                changed[i] = f"NEW{i:06d}/USDT"
+            env.stub.set_symbols(EXCHANGE_ID, changed)
+
+        timings = time_call(env.sync_rates, repeats, setup=churn_setup)
+        results.append(summarize('sync_rates.churn', size, timings, changed=churn))
+
+        env.stub.set_symbols(EXCHANGE_ID, symbols)
+        env.sync_rates()
+        posted_before = env.stub.request_counts.get('schedules', 0)
+        timings = time_call(env.start_magic, repeats)
+        results.append(summarize('start_magic', size, timings,
+                                 remote_posts=env.stub.request_counts.get('schedules', 0) - posted_before))
+
+        batch_items = 10
+        timings = time_call(lambda: env.start_magic_batch(batch_items), repeats)
+        results.append(summarize('start_magic.batch10', size, timings, items=batch_items))
+        return results
+    finally:
+        env.close()
+
+
+def bench_database(size: int, repeats: int, stub: StubFinCompassServer, workdir: str) -> List[Dict[str, Any]]:
+    _, database = load_plugin()
+    results = []
+    providers = [{'id': f'provider-{i}', 'name': f'Provider {i}'} for i in range(size)]
+    catalogs = [{'id': i + 1, 'name': f'Catalog {i}'} for i in range(size)]
+    cases = [{'id': i + 1, 'name': f'Case {i}'} for i in range(size)]
+
+    def fresh_db():
+        path = os.path.join(workdir, f'crud-{size}.db')
+        if os.path.exists(path):
+            os.remove(path)
+        return database.FinCompassDatabase(path)
+
+    state = {}
+
+    def reset():
+        state['db'] = fresh_db()
+
+    def filled():
+        reset()
+        state['db'].store_providers(1, providers)
+        state['db'].sync_catalogs(catalogs)
+        state['db'].sync_cases(cases)
+
+    results.append(summarize('db.create_tables', size, time_call(
+        lambda: database.FinCompassDatabase(os.path.join(workdir, f'crud-{size}.db')), repeats, setup=reset)))
+    results.append(summarize('db.store_providers', size, time_call(
+        lambda: state['db'].store_providers(1, providers), repeats, setup=reset)))
+    results.append(summarize('db.sync_catalogs', size, time_call(
+        lambda: state['db'].sync_catalogs(catalogs), repeats, setup=reset)))
+    results.append(summarize('db.sync_cases', size, time_call(
+        lambda: state['db'].sync_cases(cases), repeats, setup=reset)))
+
+    filled()
+    results.append(summarize('db.get_providers', size, time_call(lambda: state['db'].get_providers(), repeats)))
+    results.append(summarize('db.get_catalogs', size, time_call(lambda: state['db'].get_catalogs(), repeats)))
+    results.append(summarize('db.get_cases', size, time_call(lambda: state['db'].get_cases(), repeats)))
+    results.append(summarize('db.set_selected_case', size, time_call(
+        lambda: state['db'].set_selected_case(size // 2 or 1), repeats)))
+
+    intention = state['db'].create_intention('Bench intention')
+
+    def create_schedules():
+        for i in range(size):
+            state['db'].create_intention_schedule(intention['id'], '2025-01-01T00:00:00Z', '2025-01-01T01:00:00Z',
+                                                  status='scheduled', server_schedule_buy_id=str(i),
+                                                  server_schedule_sell_id=str(i))
+
+    results.append(summarize('db.create_intention_schedule', size, time_call(create_schedules, 1)))
+    results.append(summarize('db.get_schedules_for_intention', size, time_call(
+        lambda: state['db'].get_schedules_for_intention(intention['id']), repeats)))
+    return results
+
+
+SCENARIO_GROUPS = {
+    'endpoints': bench_endpoints,
+    'db': bench_database,
+}
+
+
+# --- Reporting ---
+
+def run_metadata(args) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=PLUGIN_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        'created': datetime.now().isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sizes': args.sizes,
+        'repeats': args.repeats,
+        'latency_ms': args.latency_ms,
+        'analysis_workers': args.analysis_workers,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Return one row per scenario/size present in both runs, flagging median regressions above `threshold`."""
+    old = {(r['scenario'], r['size']): r for r in baseline.get('results', [])}
+    rows = []
+    for result in current['results']:
+        before = old.get((result['scenario'], result['size']))
+        if not before or not before['median_s']:
+            continue
+        change = (result['median_s'] - before['median_s']) / before['median_s']
+        rows.append({
+            'scenario': result['scenario'],
+            'size': result['size'],
+            'before_s': before['median_s'],
+            'after_s': result['median_s'],
+            'change': change,
+            'regression': change > threshold,
+        })
+    return rows
+
+
+def print_table(results: List[Dict[str, Any]], out=sys.stderr) -> None:
+    print(f"{'scenario':<32}{'size':>8}{'median ms':>12}{'min ms':>12}{'max ms':>12}", file=out)
+    for r in results:
+        print(f"{r['scenario']:<32}{r['size']:>8}{r['median_s'] * 1000:>12.2f}"
+              f"{r['min_s'] * 1000:>12.2f}{r['max_s'] * 1000:>12.2f}", file=out)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the FinCompass plugin against local stand-ins.')
+    parser.add_argument('--sizes', type=lambda s: [int(x) for x in s.split(',') if x], default=DEFAULT_SIZES,
+                        help='Comma-separated catalog sizes (default: 100,1000,10000,50000)')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed repetitions per scenario')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Latency added by the stub server per request')
+    parser.add_argument('--analysis-workers', type=int, default=0,
+                        help='Sets FINCOMPASS_ANALYSIS_WORKERS for the plugin (0 keeps analysis serial)')
+    parser.add_argument('--groups', default=','.join(SCENARIO_GROUPS), help='Scenario groups to run: endpoints,db')
+    parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='Previous JSON results to compare medians against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative median slowdown that counts as a regression (default: 0.10)')
+    args = parser.parse_args(argv)
+    # Read by the plugin at import time
+    os.environ['FINCOMPASS_ANALYSIS_WORKERS'] = str(args.analysis_workers)
+    # Outbound pacing would measure the limiter, not the plugin; set these to benchmark with limits
+    os.environ.setdefault('FINCOMPASS_SERVER_RATE_LIMIT', '0')
+    os.environ.setdefault('FINCOMPASS_EXCHANGE_RATE_LIMIT', '0')
+
+    groups = [g for g in args.groups.split(',') if g]
+    results = []
+    with tempfile.TemporaryDirectory(prefix='fincompass-bench-') as workdir, \
+            StubFinCompassServer(latency_ms=args.latency_ms) as stub:
+        for size in args.sizes:
+            for group in groups:
+                size_dir = os.path.join(workdir, f'{group}-{size}')
+                os.makedirs(size_dir)
+                results.extend(SCENARIO_GROUPS[group](size, args.repeats, stub, size_dir))
+                print(f"[bench] {group} @ {size} done", file=sys.stderr)
+
+    report = {'meta': run_metadata(args), 'results': results}
+    print_table(results)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(report, json.load(f), args.threshold)
+        report['comparison'] = rows
+        for row in rows:
+            flag = '  REGRESSION' if row['regression'] else ''
+            print(f"{row['scenario']:<32}{row['size']:>8}{row['change'] * 100:>+10.1f}%{flag}", file=sys.stderr)
+        if any(row['regression'] for row in rows):
+            exit_code = 1
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
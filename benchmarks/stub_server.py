@@ -0,0 +1,139 @@
+"""
+Local HTTP stub of the remote FinCompass server API used by the plugin:
+
+    GET  /api/v1/providers/
+    GET  /api/v1/symbols/exchange/<exchange_id>
+    GET  /api/v1/markets/exchange/<exchange_id>   (404 unless markets are set)
+    POST /api/v1/schedules/
+    GET  /api/v1/schedules/<id>   (the posted schedule, plus its fill once one is set)
+
+Every request sleeps for `latency_ms` before answering so network cost can be
+simulated. Runs in a background thread on 127.0.0.1 and a free port.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+
+def make_symbols(count: int, quotes=('USDT', 'USD')) -> List[str]:
+    """Generate `count` distinct BASE/QUOTE symbols, spread over the given quotes."""
+    return [f"SYM{i:06d}/{quotes[i % len(quotes)]}" for i in range(count)]
+
+
+class StubFinCompassServer:
+    def __init__(self, latency_ms: float = 0.0, providers: List[Dict] = None):
+        self.latency_ms = latency_ms
+        self.providers = providers or [{'id': 'bench-provider', 'name': 'Bench Provider'}]
+        # exchange_id -> list of symbols returned by /api/v1/symbols/exchange/<id>
+        self.symbols: Dict[str, List[str]] = {}
+        # exchange_id -> list of markets (trading constraints) returned by /api/v1/markets/exchange/<id>
+        self.markets: Dict[str, List[Dict]] = {}
+        self.request_counts: Dict[str, int] = {}
+        # schedule id -> posted payload, and the execution fields reported for it (e.g. executed_price)
+        self.schedules: Dict[int, Dict] = {}
+        self.fills: Dict[int, Dict] = {}
+        # Schedule posts of these sides ('buy', 'sell') are answered with a 500
+        self.fail_sides: set = set()
+        self._schedule_id = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_symbols(self, exchange_id: str, symbols: List[str]) -> None:
+        self.symbols[exchange_id] = list(symbols)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+    def _next_schedule_id(self) -> int:
+        with self._lock:
+            self._schedule_id += 1
+            return self._schedule_id
+
+    def start(self) -> 'StubFinCompassServer':
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately; avoid Nagle/delayed-ACK stalls on keep-alive
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body) -> None:
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _delay(self) -> None:
+                if stub.latency_ms:
+                    time.sleep(stub.latency_ms / 1000.0)
+
+            def do_GET(self):
+                self._delay()
+                path = self.path.split('?', 1)[0]
+                if path.rstrip('/') == '/api/v1/providers':
+                    stub._count('providers')
+                    return self._send_json(200, stub.providers)
+                prefix = '/api/v1/symbols/exchange/'
+                if path.startswith(prefix):
+                    stub._count('symbols')
+                    exchange_id = path[len(prefix):]
+                    # The real server quotes every symbol; the plugin strips them again
+                    symbols = [f'"{s}"' for s in stub.symbols.get(exchange_id, [])]
+                    return self._send_json(200, {'exchange_id': exchange_id, 'symbols': symbols})
+                prefix = '/api/v1/markets/exchange/'
+                if path.startswith(prefix) and path[len(prefix):] in stub.markets:
+                    stub._count('markets')
+                    return self._send_json(200, stub.markets[path[len(prefix):]])
+                prefix = '/api/v1/schedules/'
+                if path.startswith(prefix) and path[len(prefix):].strip('/').isdigit():
+                    stub._count('get_schedule')
+                    schedule_id = int(path[len(prefix):].strip('/'))
+                    if schedule_id not in stub.schedules:
+                        return self._send_json(404, {'detail': 'Not found'})
+                    return self._send_json(200, dict(stub.schedules[schedule_id], **stub.fills.get(schedule_id, {})))
+                self._send_json(404, {'detail': 'Not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                self._delay()
+                if self.path.split('?', 1)[0].rstrip('/') == '/api/v1/schedules':
+                    stub._count('schedules')
+                    if payload.get('side') in stub.fail_sides:
+                        return self._send_json(500, {'detail': f"{payload['side']} schedules are failing"})
+                    schedule = dict(payload, id=stub._next_schedule_id())
+                    stub.schedules[schedule['id']] = schedule
+                    return self._send_json(201, schedule)
+                self._send_json(404, {'detail': 'Not found'})
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fincompass-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
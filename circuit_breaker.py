@@ -0,0 +1,253 @@
+"""
+Per-server circuit breakers for outbound calls to FinCompass servers.
+
+A slow or failing server would otherwise hold a worker for the full request
+timeout (15-20 s) on every call. FinCompassClient asks the server's breaker
+before each request and reports the outcome afterwards:
+
+    closed     calls go through; the outcomes of the last WINDOW seconds are
+               kept, and once at least MIN_CALLS were made the breaker opens
+               when the share of errors (transport errors, 5xx) or of slow
+               calls (slower than SLOW_CALL) reaches its threshold
+    open       calls fail at once with CircuitOpen, for OPEN seconds (doubled
+               after every failed probe, up to MAX_OPEN)
+    half_open  HALF_OPEN_PROBES calls are let through as probes; a fast
+               success closes the breaker, anything else opens it again
+
+Independent of the state, at most MAX_CONCURRENT calls to one server are in
+flight; more fail at once as well, so one slow server cannot take every
+worker thread. The default of 8 leaves most of a typical 16-32 thread server
+free while one FinCompass server hangs, and still covers the default batch
+(4 workers, one post at a time each); raise it when batches run with more
+workers against a single server.
+
+Callers decide what a fast failure means: reads fall back to local data
+(providers), schedule posts fail with 503 or are queued in the outbox
+(outbox.py).
+
+Configuration (environment):
+
+    FINCOMPASS_BREAKER                 0 disables the breakers (calls are never refused)
+    FINCOMPASS_BREAKER_ERROR_RATE      error share that opens the breaker (default 0.5)
+    FINCOMPASS_BREAKER_SLOW_CALL_MS    a call slower than this is slow (default 5000)
+    FINCOMPASS_BREAKER_SLOW_RATE       slow-call share that opens the breaker (default 0.5)
+    FINCOMPASS_BREAKER_MIN_CALLS       calls in the window before it can open (default 5)
+    FINCOMPASS_BREAKER_WINDOW          seconds of outcomes considered (default 60)
+    FINCOMPASS_BREAKER_OPEN_SECONDS    first open period (default 30)
+    FINCOMPASS_BREAKER_MAX_CONCURRENT  in-flight calls per server (default 8)
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from .tracing import tracer
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_ERROR_RATE = 0.5
+DEFAULT_SLOW_CALL = 5.0
+DEFAULT_SLOW_RATE = 0.5
+DEFAULT_MIN_CALLS = 5
+DEFAULT_WINDOW = 60.0
+DEFAULT_OPEN = 30.0
+MAX_OPEN = 300.0
+HALF_OPEN_PROBES = 1
+DEFAULT_MAX_CONCURRENT = 8
+
+
+class CircuitOpen(Exception):
+    """The server's breaker refused the call (open, probing, or too many calls in flight)."""
+
+    def __init__(self, server: str, retry_after: float, reason: str = 'circuit open'):
+        super().__init__(f"Server {server} unavailable ({reason}); retry in {retry_after:.0f}s.")
+        self.server = server
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, error_rate: float = DEFAULT_ERROR_RATE, slow_call: float = DEFAULT_SLOW_CALL,
+                 slow_rate: float = DEFAULT_SLOW_RATE, min_calls: int = DEFAULT_MIN_CALLS, window: float = DEFAULT_WINDOW,
+                 open_seconds: float = DEFAULT_OPEN, max_concurrent: int = DEFAULT_MAX_CONCURRENT):
+        self.name = name
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.min_calls = max(1, min_calls)
+        self.window = window
+        self.open_seconds = open_seconds
+        self.max_concurrent = max(1, max_concurrent)
+        self._lock = threading.Lock()
+        # (finished at, failed, slow) per call in the window
+        self._calls: deque = deque()
+        self._state = CLOSED
+        self._opened_until = 0.0
+        self._open_for = open_seconds
+        self._probes = 0
+        self._in_flight = 0
+        self.opened = 0
+        self.rejected = 0
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now >= self._opened_until:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def acquire(self) -> float:
+        """Take a call slot; returns the start time to pass to release(). Raises CircuitOpen."""
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == OPEN:
+                self.rejected += 1
+                raise CircuitOpen(self.name, self._opened_until - now)
+            if state == HALF_OPEN:
+                if self._probes >= HALF_OPEN_PROBES:
+                    self.rejected += 1
+                    raise CircuitOpen(self.name, self.slow_call, 'probing')
+                self._probes += 1
+            elif self._in_flight >= self.max_concurrent:
+                self.rejected += 1
+                raise CircuitOpen(self.name, 1.0, f'{self._in_flight} calls in flight')
+            self._in_flight += 1
+            return now
+
+    def release(self, started: float, failed: bool) -> None:
+        """Report the outcome of a call made after acquire()."""
+        with self._lock:
+            now = time.monotonic()
+            slow = now - started >= self.slow_call
+            self._in_flight -= 1
+            self.calls += 1
+            self.failures += failed
+            self.slow_calls += slow
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed or slow:
+                    self._open(now, self._open_for * 2)
+                else:
+                    self._state = CLOSED
+                    self._open_for = self.open_seconds
+                    self._calls.clear()
+                return
+            if self._state == OPEN:
+                # A call let through before the breaker opened
+                return
+            self._calls.append((now, failed, slow))
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._calls.popleft()
+            if len(self._calls) >= self.min_calls:
+                errors = sum(1 for _, f, _ in self._calls if f)
+                slows = sum(1 for _, _, s in self._calls if s)
+                if errors >= self.error_rate * len(self._calls) or slows >= self.slow_rate * len(self._calls):
+                    self._open(now, self.open_seconds)
+
+    def _open(self, now: float, open_for: float) -> None:
+        self._state = OPEN
+        self._open_for = min(MAX_OPEN, open_for)
+        self._opened_until = now + self._open_for
+        self._calls.clear()
+        self.opened += 1
+        tracer.event('warning', 'circuit opened', server=lambda: self.name, open_for=lambda: self._open_for)
+        print(f"[FinCompass] Circuit for {self.name} opened for {self._open_for:.0f}s")
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a call through again (0 unless open)."""
+        with self._lock:
+            now = time.monotonic()
+            return max(0.0, self._opened_until - now) if self._current_state(now) == OPEN else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            recent = len(self._calls)
+            return {
+                'server': self.name,
+                'state': state,
+                'open_for_s': round(max(0.0, self._opened_until - now), 3) if state == OPEN else 0.0,
+                'in_flight': self._in_flight,
+                'window_calls': recent,
+                'window_error_rate': round(sum(1 for _, f, _ in self._calls if f) / recent, 3) if recent else 0.0,
+                'window_slow_rate': round(sum(1 for _, _, s in self._calls if s) / recent, 3) if recent else 0.0,
+                'calls': self.calls,
+                'failures': self.failures,
+                'slow_calls': self.slow_calls,
+                'rejected': self.rejected,
+                'opened': self.opened,
+            }
+
+
+class BreakerRegistry:
+    """One CircuitBreaker per server URL, created on first use."""
+
+    def __init__(self, enabled: bool = True, **settings):
+        self.enabled = enabled
+        self.settings = settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'BreakerRegistry':
+        try:
+            min_calls = int(os.environ.get('FINCOMPASS_BREAKER_MIN_CALLS', DEFAULT_MIN_CALLS))
+            max_concurrent = int(os.environ.get('FINCOMPASS_BREAKER_MAX_CONCURRENT', DEFAULT_MAX_CONCURRENT))
+        except ValueError:
+            min_calls, max_concurrent = DEFAULT_MIN_CALLS, DEFAULT_MAX_CONCURRENT
+        return cls(
+            enabled=os.environ.get('FINCOMPASS_BREAKER', '1').strip().lower() not in ('0', 'false', 'no', 'off'),
+            error_rate=_env_float('FINCOMPASS_BREAKER_ERROR_RATE', DEFAULT_ERROR_RATE),
+            slow_call=_env_float('FINCOMPASS_BREAKER_SLOW_CALL_MS', DEFAULT_SLOW_CALL * 1000) / 1000,
+            slow_rate=_env_float('FINCOMPASS_BREAKER_SLOW_RATE', DEFAULT_SLOW_RATE),
+            min_calls=min_calls,
+            window=_env_float('FINCOMPASS_BREAKER_WINDOW', DEFAULT_WINDOW),
+            open_seconds=_env_float('FINCOMPASS_BREAKER_OPEN_SECONDS', DEFAULT_OPEN),
+            max_concurrent=max_concurrent,
+        )
+
+    def configure(self, enabled: Optional[bool] = None, **settings) -> None:
+        """Change settings at runtime; existing breakers are dropped along with their state and metrics."""
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            self.settings.update(settings)
+            self._breakers = {}
+
+    def get(self, server_url: str) -> Optional[CircuitBreaker]:
+        """The breaker of a server URL; None while breakers are disabled."""
+        if not self.enabled:
+            return None
+        key = server_url.rstrip('/')
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(key, CircuitBreaker(key, **self.settings))
+        return breaker
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [breaker.to_dict() for breaker in breakers]
+
+
+breakers = BreakerRegistry.from_env()
@@ -2,18 +2,48 @@ import sqlite3
 import os
 import json
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Optional
+from .db_profiler import profiler
+from .db_writer import enabled as writer_enabled, writer_for
+from .events import bus
+
+# A fill from a better source replaces an estimate (price_file < manual < server), never the other way round
+FILL_SOURCE_RANK = {'price_file': 0, 'manual': 1, 'server': 2}
+PNL_SCOPES = ('total', 'intention', 'symbol', 'day')
+# Items resolved per query by resolve_magic_items (three bound parameters each)
+RESOLVE_CHUNK_SIZE = 300
 
 class FinCompassDatabase:
     def __init__(self, db_path: str):
         """Initialize the database connection and create tables if they don't exist."""
         self.db_path = db_path
+        # UI change events (see events.py) are published after the write commits
+        self.events = bus
         self._create_tables()
+        # Writes go through one writer thread per DB file (see db_writer.py)
+        self.writer = writer_for(db_path) if writer_enabled() else None
+
+    def publish(self, event: str, **data) -> None:
+        """Publish a change event for the UI (GET /api/events)."""
+        self.events.publish(event, data)
 
     def _get_connection(self) -> sqlite3.Connection:
-        """Get a database connection."""
+        """Get a database connection (a profiling one while the current request is being profiled)."""
+        profile = profiler.current()
+        if profile is not None:
+            return profiler.connect(self.db_path, profile)
         return sqlite3.connect(self.db_path)
 
+    def _write(self, fn: Callable[[sqlite3.Cursor], Any], name: str = 'write') -> Any:
+        """Run fn(cursor) in a write transaction and return its result once committed."""
+        if self.writer is None:
+            with self._get_connection() as conn:
+                result = fn(conn.cursor())
+                conn.commit()
+                return result
+        # A profiled request gets the queue wait, the operation and its share of the commit recorded by the writer
+        return self.writer.execute(fn, name)
+
     def _create_tables(self):
         """Create necessary database tables if they don't exist."""
         with self._get_connection() as conn:
@@ -43,11 +73,11 @@ class FinCompassDatabase:
                     selected BOOLEAN DEFAULT 0
                 )
             ''')
-            # Insert default server if none exist
+            # Insert default server if none exist (OR IGNORE: another instance may be creating the same file)
             cursor.execute('SELECT COUNT(*) FROM servers')
             if cursor.fetchone()[0] == 0:
                 cursor.execute('''
-                    INSERT INTO servers (url, description, selected)
+                    INSERT OR IGNORE INTO servers (url, description, selected)
                     VALUES (?, ?, 1)
                 ''', ('https://fincompass.emolio.nl', 'Default FinCompass server',))
             
@@ -77,6 +107,24 @@ class FinCompassDatabase:
                 cursor.execute('ALTER TABLE intentions ADD COLUMN min_hold_minutes INTEGER DEFAULT 0')
             if 'max_hold_minutes' not in columns:
                 cursor.execute('ALTER TABLE intentions ADD COLUMN max_hold_minutes INTEGER DEFAULT 0')
+            # Universe filters applied before analysis (see symbol_index.py)
+            if 'allowed_quotes' not in columns:
+                cursor.execute('ALTER TABLE intentions ADD COLUMN allowed_quotes TEXT')
+            if 'include_symbols' not in columns:
+                cursor.execute('ALTER TABLE intentions ADD COLUMN include_symbols TEXT')
+            if 'exclude_symbols' not in columns:
+                cursor.execute('ALTER TABLE intentions ADD COLUMN exclude_symbols TEXT')
+            if 'max_universe_size' not in columns:
+                cursor.execute('ALTER TABLE intentions ADD COLUMN max_universe_size INTEGER DEFAULT 0')
+            # Sizes stored before the API validated them: anything but a non-negative integer means no limit
+            cursor.execute('''UPDATE intentions SET max_universe_size = 0
+                              WHERE typeof(max_universe_size) != 'integer' OR max_universe_size < 0''')
+            # Server ids a run posts to ("1,3"); empty = the selected server
+            if 'target_servers' not in columns:
+                cursor.execute('ALTER TABLE intentions ADD COLUMN target_servers TEXT')
+            # Post only the buy and time the sell locally (see sell_scheduler.py); needs dynamic_sell_timing
+            if 'local_sell_timing' not in columns:
+                cursor.execute('ALTER TABLE intentions ADD COLUMN local_sell_timing BOOLEAN DEFAULT 0')
 
             # Create intention_schedules table
             cursor.execute('''
@@ -90,6 +138,135 @@ class FinCompassDatabase:
                     FOREIGN KEY (intention_id) REFERENCES intentions(id)
                 )
             ''')
+            # Chosen symbol and the analysis/timing factors behind each schedule (used by backtest.py)
+            cursor.execute("PRAGMA table_info(intention_schedules)")
+            columns = [row[1] for row in cursor.fetchall()]
+            if 'symbol' not in columns:
+                cursor.execute('ALTER TABLE intention_schedules ADD COLUMN symbol TEXT')
+            if 'energetic_value' not in columns:
+                cursor.execute('ALTER TABLE intention_schedules ADD COLUMN energetic_value FLOAT')
+            if 'gv' not in columns:
+                cursor.execute('ALTER TABLE intention_schedules ADD COLUMN gv FLOAT')
+            if 'hold_minutes' not in columns:
+                cursor.execute('ALTER TABLE intention_schedules ADD COLUMN hold_minutes INTEGER')
+            if 'timing_score' not in columns:
+                cursor.execute('ALTER TABLE intention_schedules ADD COLUMN timing_score FLOAT')
+            # AetherOnePy session/analysis of the run, so retention can purge them with the schedule
+            if 'session_id' not in columns:
+                cursor.execute('ALTER TABLE intention_schedules ADD COLUMN session_id INTEGER')
+            if 'analysis_id' not in columns:
+                cursor.execute('ALTER TABLE intention_schedules ADD COLUMN analysis_id INTEGER')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_intention_schedules_intention_created ON intention_schedules(intention_id, created_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_intention_schedules_created ON intention_schedules(created_at)')
+
+            # Create schedule_targets table (outcome of a schedule's posts on each target server)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schedule_targets (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    schedule_id INTEGER NOT NULL,
+                    server_id INTEGER,
+                    server_url TEXT,
+                    status TEXT NOT NULL,
+                    server_schedule_buy_id TEXT,
+                    server_schedule_sell_id TEXT,
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (schedule_id) REFERENCES intention_schedules(id)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_schedule_targets_schedule ON schedule_targets(schedule_id)')
+            # When the P&L recorder looks for the target's fills again after a pass found none (epoch seconds, see pnl.py)
+            cursor.execute("PRAGMA table_info(schedule_targets)")
+            if 'pnl_next_check_at' not in [row[1] for row in cursor.fetchall()]:
+                cursor.execute('ALTER TABLE schedule_targets ADD COLUMN pnl_next_check_at FLOAT')
+
+            # Create sell_timers table (locally timed sells of open positions, times are epoch seconds)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sell_timers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    schedule_id INTEGER NOT NULL UNIQUE,
+                    intention_id INTEGER NOT NULL,
+                    symbol TEXT NOT NULL,
+                    energetic_value FLOAT,
+                    gv FLOAT,
+                    buy_at REAL NOT NULL,
+                    min_hold_minutes INTEGER NOT NULL,
+                    max_hold_minutes INTEGER NOT NULL,
+                    due_at REAL NOT NULL,
+                    next_check_at REAL NOT NULL,
+                    timing_score FLOAT,
+                    checkpoints INTEGER NOT NULL DEFAULT 0,
+                    targets TEXT NOT NULL,
+                    idempotency_key TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (schedule_id) REFERENCES intention_schedules(id)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_sell_timers_status_next_check ON sell_timers(status, next_check_at)')
+            # When the sell first came due; every (re)tried post sends this sell time (epoch seconds, see sell_scheduler.py)
+            cursor.execute("PRAGMA table_info(sell_timers)")
+            if 'sell_at' not in [row[1] for row in cursor.fetchall()]:
+                cursor.execute('ALTER TABLE sell_timers ADD COLUMN sell_at REAL')
+
+            # Create outbox table (schedule posts queued while a server's circuit breaker was open, see outbox.py)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    schedule_id INTEGER NOT NULL,
+                    server_id INTEGER,
+                    server_url TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    idempotency_key TEXT,
+                    is_primary BOOLEAN DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (schedule_id) REFERENCES intention_schedules(id)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_status_next_attempt ON outbox(status, next_attempt_at)')
+
+            # Create sync_status table (freshness of every dataset kept in sync by the sync daemon, see sync_daemon.py)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sync_status (
+                    dataset TEXT NOT NULL,
+                    dataset_key TEXT NOT NULL DEFAULT '',
+                    status TEXT NOT NULL,
+                    items INTEGER,
+                    duration_ms REAL,
+                    failures INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    last_attempt_at REAL,
+                    last_success_at REAL,
+                    next_due_at REAL,
+                    PRIMARY KEY (dataset, dataset_key)
+                )
+            ''')
+
+            # Create schedule_rollups table (compact summary of schedules removed by retention)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schedule_rollups (
+                    intention_id INTEGER NOT NULL,
+                    day TEXT NOT NULL,
+                    symbol TEXT NOT NULL DEFAULT '',
+                    runs INTEGER NOT NULL DEFAULT 0,
+                    total_energetic_value FLOAT NOT NULL DEFAULT 0,
+                    max_energetic_value FLOAT,
+                    total_hold_minutes INTEGER NOT NULL DEFAULT 0,
+                    status_counts TEXT NOT NULL DEFAULT '{}',
+                    first_created_at TEXT,
+                    last_created_at TEXT,
+                    PRIMARY KEY (intention_id, day, symbol)
+                )
+            ''')
 
             # Create providers table
             cursor.execute('''
@@ -116,13 +293,110 @@ class FinCompassDatabase:
                     selected BOOLEAN DEFAULT 0
                 )
             ''')
+
+            # Create idempotency_keys table (stored responses of requests sent with an Idempotency-Key)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    scope TEXT NOT NULL,
+                    idempotency_key TEXT NOT NULL,
+                    request_hash TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'in_flight',
+                    status_code INTEGER,
+                    response TEXT,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (scope, idempotency_key)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys(expires_at)')
+
+            # Create symbol_index table (base/quote split of every synced catalog symbol)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS symbol_index (
+                    aetherone_catalog_id INTEGER NOT NULL,
+                    symbol TEXT NOT NULL,
+                    base TEXT NOT NULL,
+                    quote TEXT NOT NULL,
+                    exchange_id TEXT,
+                    PRIMARY KEY (aetherone_catalog_id, symbol)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_symbol_index_quote ON symbol_index(aetherone_catalog_id, quote, symbol)')
+
+            # Create exchange_constraints table (per-symbol trading limits of each synced exchange, see exchange_constraints.py)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS exchange_constraints (
+                    exchange_id TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    active BOOLEAN NOT NULL DEFAULT 1,
+                    min_notional FLOAT,
+                    min_quantity FLOAT,
+                    quantity_step FLOAT,
+                    price_step FLOAT,
+                    quote_step FLOAT,
+                    updated_at FLOAT,
+                    PRIMARY KEY (exchange_id, symbol)
+                )
+            ''')
+
+            # Create pnl_fills table (executed buy/sell of each schedule target, see pnl.py)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pnl_fills (
+                    target_id INTEGER NOT NULL,
+                    side TEXT NOT NULL,
+                    schedule_id INTEGER,
+                    server_id INTEGER,
+                    symbol TEXT,
+                    price FLOAT NOT NULL,
+                    quantity FLOAT,
+                    filled_at TEXT,
+                    source TEXT NOT NULL,
+                    recorded_at FLOAT,
+                    PRIMARY KEY (target_id, side)
+                )
+            ''')
+            # Create pnl_trades table (one closed round trip per schedule target)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pnl_trades (
+                    target_id INTEGER PRIMARY KEY,
+                    schedule_id INTEGER,
+                    intention_id INTEGER,
+                    server_id INTEGER,
+                    symbol TEXT,
+                    day TEXT,
+                    buy_price FLOAT,
+                    sell_price FLOAT,
+                    quantity FLOAT,
+                    notional FLOAT,
+                    pnl FLOAT,
+                    trade_return FLOAT,
+                    opened_at TEXT,
+                    closed_at TEXT,
+                    source TEXT
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_pnl_trades_closed ON pnl_trades(closed_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_pnl_trades_intention_closed ON pnl_trades(intention_id, closed_at)')
+            # Create pnl_aggregates table (running totals per scope: total, intention, symbol, day)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pnl_aggregates (
+                    scope TEXT NOT NULL,
+                    scope_key TEXT NOT NULL,
+                    trades INTEGER NOT NULL DEFAULT 0,
+                    wins INTEGER NOT NULL DEFAULT 0,
+                    losses INTEGER NOT NULL DEFAULT 0,
+                    realized_pnl FLOAT NOT NULL DEFAULT 0,
+                    return_sum FLOAT NOT NULL DEFAULT 0,
+                    notional FLOAT NOT NULL DEFAULT 0,
+                    updated_at FLOAT,
+                    PRIMARY KEY (scope, scope_key)
+                )
+            ''')
             conn.commit()
 
     def get_or_create_case(self, aetherone_case_id: int, name: str, catalog_id: int) -> Dict[str, Any]:
         """Get existing case or create new one with catalog selection."""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            
+        def write(cursor):
             # Check if case exists
             cursor.execute('SELECT * FROM cases WHERE aetherone_case_id = ?', (aetherone_case_id,))
             existing_case = cursor.fetchone()
@@ -141,13 +415,13 @@ class FinCompassDatabase:
                 name,
                 catalog_id
             ))
-            conn.commit()
             
             # Return the newly created case
             new_id = cursor.lastrowid
             cursor.execute('SELECT * FROM cases WHERE id = ?', (new_id,))
             columns = [description[0] for description in cursor.description]
             return dict(zip(columns, cursor.fetchone()))
+        return self._write(write, 'get_or_create_case')
 
     def get_cases(self) -> List[Dict[str, Any]]:
         """Get all cases created through FinCompass."""
@@ -159,8 +433,7 @@ class FinCompassDatabase:
 
     def add_server(self, url: str, description: str = None, selected: bool = False, api_key: str = None, exchange_id: str = None) -> dict:
         """Add a new server/provider. If selected is True, unselect all others."""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
+        def write(cursor):
             if selected:
                 cursor.execute('UPDATE servers SET selected = 0')
             cursor.execute('''
@@ -173,17 +446,16 @@ class FinCompassDatabase:
                     INSERT OR IGNORE INTO providers (url, server_id, exchange_id)
                     VALUES (?, (SELECT id FROM servers WHERE url = ?), ?)
                 ''', (url, url, exchange_id))
-            conn.commit()
             cursor.execute('SELECT * FROM servers WHERE url = ?', (url,))
             columns = [description[0] for description in cursor.description]
             return dict(zip(columns, cursor.fetchone()))
+        server = self._write(write, 'add_server')
+        self.publish('server.added', server={k: v for k, v in server.items() if k != 'api_key'})
+        return server
 
     def update_server_api_key(self, url: str, api_key: str) -> None:
         """Update the API key for a given server URL."""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('UPDATE servers SET api_key = ? WHERE url = ?', (api_key, url))
-            conn.commit()
+        self._write(lambda cursor: cursor.execute('UPDATE servers SET api_key = ? WHERE url = ?', (api_key, url)), 'update_server_api_key')
 
     def get_servers(self) -> List[Dict[str, Any]]:
         """Get all servers."""
@@ -195,11 +467,11 @@ class FinCompassDatabase:
 
     def set_selected_server(self, url: str) -> None:
         """Set the selected server by URL, unselect all others."""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
+        def write(cursor):
             cursor.execute('UPDATE servers SET selected = 0')
             cursor.execute('UPDATE servers SET selected = 1 WHERE url = ?', (url,))
-            conn.commit()
+        self._write(write, 'set_selected_server')
+        self.publish('server.selected', url=url)
 
     def get_selected_server(self) -> Optional[Dict[str, Any]]:
         """Get the currently selected server, if any."""
@@ -212,20 +484,25 @@ class FinCompassDatabase:
                 return dict(zip(columns, row))
             return None
 
-    def create_intention(self, intention: str, description: str = None, selected: bool = False, hold_minutes: int = 0, amount: float = 0, stop_loss_percentage: float = 0, take_profit_percentage: float = 0, dynamic_sell_timing: bool = False, min_hold_minutes: int = 0, max_hold_minutes: int = 0) -> Dict[str, Any]:
+    def create_intention(self, intention: str, description: str = None, selected: bool = False, hold_minutes: int = 0, amount: float = 0, stop_loss_percentage: float = 0, take_profit_percentage: float = 0, dynamic_sell_timing: bool = False, min_hold_minutes: int = 0, max_hold_minutes: int = 0,
+                         allowed_quotes: str = None, include_symbols: str = None, exclude_symbols: str = None, max_universe_size: int = 0,
+                         target_servers: str = None, local_sell_timing: bool = False) -> Dict[str, Any]:
         """Create a new intention."""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
+        def write(cursor):
             if selected:
                 cursor.execute('UPDATE intentions SET selected = 0')
             cursor.execute('''
-                INSERT INTO intentions (intention, description, selected, hold_minutes, amount, stop_loss_percentage, take_profit_percentage, dynamic_sell_timing, min_hold_minutes, max_hold_minutes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (intention, description, int(selected), hold_minutes, amount, stop_loss_percentage, take_profit_percentage, int(dynamic_sell_timing), min_hold_minutes, max_hold_minutes))
-            conn.commit()
+                INSERT INTO intentions (intention, description, selected, hold_minutes, amount, stop_loss_percentage, take_profit_percentage, dynamic_sell_timing, min_hold_minutes, max_hold_minutes,
+                                        allowed_quotes, include_symbols, exclude_symbols, max_universe_size, target_servers, local_sell_timing)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (intention, description, int(selected), hold_minutes, amount, stop_loss_percentage, take_profit_percentage, int(dynamic_sell_timing), min_hold_minutes, max_hold_minutes,
+                  allowed_quotes, include_symbols, exclude_symbols, max_universe_size or 0, target_servers, int(bool(local_sell_timing))))
             cursor.execute('SELECT * FROM intentions WHERE id = ?', (cursor.lastrowid,))
             columns = [description[0] for description in cursor.description]
             return dict(zip(columns, cursor.fetchone()))
+        created = self._write(write, 'create_intention')
+        self.publish('intention.created', intention=created)
+        return created
 
     def get_intentions(self) -> List[Dict[str, Any]]:
         """Get all intentions."""
@@ -235,10 +512,11 @@ class FinCompassDatabase:
             columns = [description[0] for description in cursor.description]
             return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
-    def update_intention(self, intention_id: int, intention: str = None, description: str = None, selected: bool = None, hold_minutes: int = None, amount: float = None, stop_loss_percentage: float = None, take_profit_percentage: float = None, dynamic_sell_timing: bool = None, min_hold_minutes: int = None, max_hold_minutes: int = None) -> None:
+    def update_intention(self, intention_id: int, intention: str = None, description: str = None, selected: bool = None, hold_minutes: int = None, amount: float = None, stop_loss_percentage: float = None, take_profit_percentage: float = None, dynamic_sell_timing: bool = None, min_hold_minutes: int = None, max_hold_minutes: int = None,
+                         allowed_quotes: str = None, include_symbols: str = None, exclude_symbols: str = None, max_universe_size: int = None,
+                         target_servers: str = None, local_sell_timing: bool = None) -> None:
         """Update an intention."""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
+        def write(cursor):
             if selected is not None:
                 if selected:
                     cursor.execute('UPDATE intentions SET selected = 0')
@@ -261,26 +539,40 @@ class FinCompassDatabase:
                 cursor.execute('UPDATE intentions SET min_hold_minutes = ? WHERE id = ?', (min_hold_minutes, intention_id))
             if max_hold_minutes is not None:
                 cursor.execute('UPDATE intentions SET max_hold_minutes = ? WHERE id = ?', (max_hold_minutes, intention_id))
-            conn.commit()
+            if allowed_quotes is not None:
+                cursor.execute('UPDATE intentions SET allowed_quotes = ? WHERE id = ?', (allowed_quotes, intention_id))
+            if include_symbols is not None:
+                cursor.execute('UPDATE intentions SET include_symbols = ? WHERE id = ?', (include_symbols, intention_id))
+            if exclude_symbols is not None:
+                cursor.execute('UPDATE intentions SET exclude_symbols = ? WHERE id = ?', (exclude_symbols, intention_id))
+            if max_universe_size is not None:
+                cursor.execute('UPDATE intentions SET max_universe_size = ? WHERE id = ?', (max_universe_size, intention_id))
+            if target_servers is not None:
+                cursor.execute('UPDATE intentions SET target_servers = ? WHERE id = ?', (target_servers, intention_id))
+            if local_sell_timing is not None:
+                cursor.execute('UPDATE intentions SET local_sell_timing = ? WHERE id = ?', (int(local_sell_timing), intention_id))
+        self._write(write, 'update_intention')
+        changes = {field: value for field, value in (
+            ('intention', intention), ('description', description), ('selected', selected), ('hold_minutes', hold_minutes), ('amount', amount),
+            ('stop_loss_percentage', stop_loss_percentage), ('take_profit_percentage', take_profit_percentage),
+            ('dynamic_sell_timing', dynamic_sell_timing), ('min_hold_minutes', min_hold_minutes), ('max_hold_minutes', max_hold_minutes),
+            ('allowed_quotes', allowed_quotes), ('include_symbols', include_symbols), ('exclude_symbols', exclude_symbols),
+            ('max_universe_size', max_universe_size), ('target_servers', target_servers), ('local_sell_timing', local_sell_timing)) if value is not None}
+        self.publish('intention.updated', intention_id=intention_id, changes=changes)
 
     def delete_intention(self, intention_id: int) -> None:
         """Delete an intention."""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM intentions WHERE id = ?', (intention_id,))
-            conn.commit()
+        self._write(lambda cursor: cursor.execute('DELETE FROM intentions WHERE id = ?', (intention_id,)), 'delete_intention')
+        self.publish('intention.deleted', intention_id=intention_id)
 
     def store_providers(self, server_id: int, providers: List[Dict[str, Any]]) -> None:
         """Store or update providers for a specific server."""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            for provider in providers:
-                cursor.execute('''
-                    INSERT INTO providers (name, server_provider_id, server_id)
-                    VALUES (?, ?, ?)
-                    ON CONFLICT(server_provider_id, server_id) DO NOTHING
-                ''', (provider['name'], provider['id'], server_id))
-            conn.commit()
+        self._write(lambda cursor: cursor.executemany('''
+            INSERT INTO providers (name, server_provider_id, server_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT(server_provider_id, server_id) DO NOTHING
+        ''', [(provider['name'], provider['id'], server_id) for provider in providers]), 'store_providers')
+        self.publish('providers.synced', server_id=server_id, count=len(providers))
 
     def get_providers_by_server(self, server_id: int) -> list:
         """Get all providers for a specific server, including exchange_id."""
@@ -292,25 +584,27 @@ class FinCompassDatabase:
 
     def set_selected_provider(self, server_id: int, provider_id: int) -> None:
         """Set a provider as selected for a given server, unselecting others."""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
+        def write(cursor):
             # Unselect all providers for this server first
             cursor.execute('UPDATE providers SET selected = 0 WHERE server_id = ?', (server_id,))
             # Select the new provider
             cursor.execute('UPDATE providers SET selected = 1 WHERE id = ? AND server_id = ?', (provider_id, server_id))
-            conn.commit()
+        self._write(write, 'set_selected_provider')
+        self.publish('provider.selected', server_id=server_id, provider_id=provider_id)
 
-    def sync_catalogs(self, catalogs_data: List[Dict[str, Any]]) -> None:
-        """Insert or ignore catalogs from AetherOnePy."""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            for catalog in catalogs_data:
-                cursor.execute('''
-                    INSERT INTO catalogs (name, aetherone_catalog_id)
-                    VALUES (?, ?)
-                    ON CONFLICT(aetherone_catalog_id) DO NOTHING
-                ''', (catalog['name'], catalog['id']))
-            conn.commit()
+    def sync_catalogs(self, catalogs_data: List[Dict[str, Any]]) -> int:
+        """Insert or ignore catalogs from AetherOnePy; returns how many were new."""
+        def write(cursor):
+            cursor.executemany('''
+                INSERT INTO catalogs (name, aetherone_catalog_id)
+                VALUES (?, ?)
+                ON CONFLICT(aetherone_catalog_id) DO NOTHING
+            ''', [(catalog['name'], catalog['id']) for catalog in catalogs_data])
+            return max(cursor.rowcount, 0)
+        inserted = self._write(write, 'sync_catalogs')
+        if inserted:
+            self.publish('catalogs.synced', inserted=inserted)
+        return inserted
 
     def get_catalogs(self) -> List[Dict[str, Any]]:
         """Get all catalogs stored in the plugin's database."""
@@ -322,12 +616,12 @@ class FinCompassDatabase:
 
     def set_selected_catalog(self, catalog_id: int) -> None:
         """Set a catalog as selected, unselecting all others. If catalog_id is None, deselect all."""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
+        def write(cursor):
             cursor.execute('UPDATE catalogs SET selected = 0')
             if catalog_id is not None:
                 cursor.execute('UPDATE catalogs SET selected = 1 WHERE id = ?', (catalog_id,))
-            conn.commit()
+        self._write(write, 'set_selected_catalog')
+        self.publish('catalog.selected', catalog_id=catalog_id)
 
     def get_catalogs_from_aetheronepy(self) -> list:
         """Read catalogs from the main AetherOnePy database (data/aetherone.db)."""
@@ -385,12 +679,12 @@ class FinCompassDatabase:
             return dict(row) if row else None
 
     def set_selected_case(self, case_id: Optional[int]):
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
+        def write(cursor):
             cursor.execute('UPDATE cases SET selected = 0')
             if case_id is not None:
                 cursor.execute('UPDATE cases SET selected = 1 WHERE id = ?', (case_id,))
-            conn.commit()
+        self._write(write, 'set_selected_case')
+        self.publish('case.selected', case_id=case_id)
 
     def get_selected_case(self) -> Optional[Dict[str, Any]]:
         with self._get_connection() as conn:
@@ -421,20 +715,29 @@ class FinCompassDatabase:
             print(f"[FinCompass] Could not read cases from {db_path}: {e}")
         return cases
 
-    def sync_cases(self, cases_data: list) -> None:
-        """Insert or ignore cases from AetherOnePy."""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            for case in cases_data:
-                cursor.execute('''
-                    INSERT OR IGNORE INTO cases (aetherone_case_id, name)
-                    VALUES (?, ?)
-                ''', (case['id'], case['name']))
-            conn.commit()
+    def sync_cases(self, cases_data: list) -> int:
+        """Insert or ignore cases from AetherOnePy; returns how many were new."""
+        def write(cursor):
+            cursor.executemany('''
+                INSERT OR IGNORE INTO cases (aetherone_case_id, name)
+                VALUES (?, ?)
+            ''', [(case['id'], case['name']) for case in cases_data])
+            return max(cursor.rowcount, 0)
+        inserted = self._write(write, 'sync_cases')
+        if inserted:
+            self.publish('cases.synced', inserted=inserted)
+        return inserted
 
-    def create_intention_schedule(self, intention_id: int, buy_datetime: str, sell_datetime: str, status: str = 'pending', server_schedule_buy_id: str = None, server_schedule_sell_id: str = None) -> dict:
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
+    def create_intention_schedule(self, intention_id: int, buy_datetime: str, sell_datetime: str, status: str = 'pending', server_schedule_buy_id: str = None, server_schedule_sell_id: str = None,
+                                  symbol: str = None, energetic_value: float = None, gv: float = None, hold_minutes: int = None, timing_score: float = None,
+                                  session_id: int = None, analysis_id: int = None, targets: Optional[List[Dict[str, Any]]] = None,
+                                  sell_timer: Optional[Dict[str, Any]] = None, outbox: Optional[List[Dict[str, Any]]] = None) -> dict:
+        """
+        Insert a schedule and, with `targets`, its per-server post outcomes (schedule_targets) in the same transaction.
+        With `sell_timer` (a sell_timers row without schedule_id) the locally timed sell is stored too; its id is
+        returned as 'sell_timer_id'. `outbox` rows (without schedule_id) are the posts queued for later delivery.
+        """
+        def write(cursor):
             # Add columns if they do not exist
             cursor.execute("PRAGMA table_info(intention_schedules)")
             columns = [row[1] for row in cursor.fetchall()]
@@ -444,13 +747,69 @@ class FinCompassDatabase:
                 cursor.execute('ALTER TABLE intention_schedules ADD COLUMN server_schedule_sell_id TEXT')
             # Insert with new columns
             cursor.execute('''
-                INSERT INTO intention_schedules (intention_id, buy_datetime, sell_datetime, status, server_schedule_buy_id, server_schedule_sell_id)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (intention_id, buy_datetime, sell_datetime, status, server_schedule_buy_id, server_schedule_sell_id))
-            conn.commit()
-            cursor.execute('SELECT * FROM intention_schedules WHERE id = ?', (cursor.lastrowid,))
+                INSERT INTO intention_schedules (intention_id, buy_datetime, sell_datetime, status, server_schedule_buy_id, server_schedule_sell_id,
+                                                 symbol, energetic_value, gv, hold_minutes, timing_score, session_id, analysis_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (intention_id, buy_datetime, sell_datetime, status, server_schedule_buy_id, server_schedule_sell_id,
+                  symbol, energetic_value, gv, hold_minutes, timing_score, session_id, analysis_id))
+            schedule_id = cursor.lastrowid
+            if targets:
+                cursor.executemany('''
+                    INSERT INTO schedule_targets (schedule_id, server_id, server_url, status, server_schedule_buy_id, server_schedule_sell_id, error)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', [(schedule_id, t.get('server_id'), t.get('server_url'), t['status'], t.get('buy_schedule_id'), t.get('sell_schedule_id'),
+                       t.get('error')) for t in targets])
+            sell_timer_id = None
+            if sell_timer:
+                row = dict(sell_timer, schedule_id=schedule_id)
+                cursor.execute(f'''
+                    INSERT INTO sell_timers ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})
+                ''', list(row.values()))
+                sell_timer_id = cursor.lastrowid
+            for entry in outbox or ():
+                row = dict(entry, schedule_id=schedule_id)
+                cursor.execute(f'''
+                    INSERT INTO outbox ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})
+                ''', list(row.values()))
+            cursor.execute('SELECT * FROM intention_schedules WHERE id = ?', (schedule_id,))
             columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, cursor.fetchone()))
+            return dict(zip(columns, cursor.fetchone())), sell_timer_id
+        schedule, sell_timer_id = self._write(write, 'create_intention_schedule')
+        if sell_timer_id is not None:
+            schedule['sell_timer_id'] = sell_timer_id
+        self.publish('schedule.created', schedule=schedule)
+        return schedule
+
+    def get_schedule_targets(self, schedule_id: int) -> List[Dict[str, Any]]:
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM schedule_targets WHERE schedule_id = ? ORDER BY id', (schedule_id,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_server_targets(self, server_ids: List[int], exchange_id: Optional[str]) -> Dict[int, Dict[str, Any]]:
+        """
+        server_id -> {server_id, server_url, api_key, server_provider_id, exchange_id} for the given servers, with the
+        server's provider for `exchange_id`; provider fields are None if it has none (or exchange_id is None).
+        """
+        if not server_ids:
+            return {}
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            placeholders = ', '.join('?' * len(server_ids))
+            # Matched on the exchange only: the same server_provider_id may be another exchange on another server
+            cursor.execute(f'''
+                SELECT s.id AS server_id, s.url AS server_url, s.api_key, p.server_provider_id, p.exchange_id
+                FROM servers s
+                LEFT JOIN providers p ON p.server_id = s.id AND p.server_provider_id IS NOT NULL AND p.exchange_id = ?
+                WHERE s.id IN ({placeholders})
+                ORDER BY s.id, p.id
+            ''', [exchange_id, *server_ids])
+            targets: Dict[int, Dict[str, Any]] = {}
+            for row in cursor.fetchall():
+                targets.setdefault(row['server_id'], dict(row))
+            return targets
 
     def get_schedules_for_intention(self, intention_id: int) -> list:
         with self._get_connection() as conn:
@@ -459,23 +818,364 @@ class FinCompassDatabase:
             columns = [description[0] for description in cursor.description]
             return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
-    def update_intention_schedule(self, schedule_id: int, buy_datetime: str = None, sell_datetime: str = None, status: str = None) -> None:
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
+    def update_intention_schedule(self, schedule_id: int, buy_datetime: str = None, sell_datetime: str = None, status: str = None,
+                                  server_schedule_sell_id: str = None, hold_minutes: int = None, timing_score: float = None,
+                                  server_schedule_buy_id: str = None) -> None:
+        def write(cursor):
             if buy_datetime is not None:
                 cursor.execute('UPDATE intention_schedules SET buy_datetime = ? WHERE id = ?', (buy_datetime, schedule_id))
             if sell_datetime is not None:
                 cursor.execute('UPDATE intention_schedules SET sell_datetime = ? WHERE id = ?', (sell_datetime, schedule_id))
             if status is not None:
                 cursor.execute('UPDATE intention_schedules SET status = ? WHERE id = ?', (status, schedule_id))
-            conn.commit()
+            if server_schedule_buy_id is not None:
+                cursor.execute('UPDATE intention_schedules SET server_schedule_buy_id = ? WHERE id = ?', (server_schedule_buy_id, schedule_id))
+            if server_schedule_sell_id is not None:
+                cursor.execute('UPDATE intention_schedules SET server_schedule_sell_id = ? WHERE id = ?', (server_schedule_sell_id, schedule_id))
+            if hold_minutes is not None:
+                cursor.execute('UPDATE intention_schedules SET hold_minutes = ? WHERE id = ?', (hold_minutes, schedule_id))
+            if timing_score is not None:
+                cursor.execute('UPDATE intention_schedules SET timing_score = ? WHERE id = ?', (timing_score, schedule_id))
+        self._write(write, 'update_intention_schedule')
+        changes = {field: value for field, value in (('buy_datetime', buy_datetime), ('sell_datetime', sell_datetime), ('status', status),
+                                                     ('server_schedule_buy_id', server_schedule_buy_id),
+                                                     ('server_schedule_sell_id', server_schedule_sell_id), ('hold_minutes', hold_minutes),
+                                                     ('timing_score', timing_score))
+                   if value is not None}
+        self.publish('schedule.updated', schedule_id=schedule_id, changes=changes)
 
-    def deselect_provider(self, server_id: int, provider_id: int) -> None:
-        """Deselect a single provider for a given server (set selected=0 for that provider only)."""
+    def update_schedule_target(self, schedule_id: int, server_id: int, status: str, server_schedule_sell_id: str = None, error: str = None,
+                               server_schedule_buy_id: str = None) -> None:
+        self._write(lambda cursor: cursor.execute('''
+            UPDATE schedule_targets SET status = ?, server_schedule_buy_id = COALESCE(?, server_schedule_buy_id),
+                                        server_schedule_sell_id = COALESCE(?, server_schedule_sell_id), error = ?
+            WHERE schedule_id = ? AND server_id = ?
+        ''', (status, server_schedule_buy_id, server_schedule_sell_id, error, schedule_id, server_id)), 'update_schedule_target')
+
+    def get_due_outbox(self, now: float, limit: int = 100) -> List[Dict[str, Any]]:
+        """Queued posts whose next attempt is due, oldest first (including ones claimed by a process that may have died)."""
         with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
-            cursor.execute('UPDATE providers SET selected = 0 WHERE id = ? AND server_id = ?', (provider_id, server_id))
-            conn.commit()
+            cursor.execute('''
+                SELECT * FROM outbox WHERE status IN ('pending', 'sending') AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT ?
+            ''', (now, limit))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_outbox(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            if status:
+                cursor.execute('SELECT * FROM outbox WHERE status = ? ORDER BY id DESC LIMIT ?', (status, limit))
+            else:
+                cursor.execute('SELECT * FROM outbox ORDER BY id DESC LIMIT ?', (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def count_outbox(self) -> Dict[str, int]:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status')
+            return dict(cursor.fetchall())
+
+    def claim_outbox(self, entry_id: int, now: float, lease_until: float) -> bool:
+        """Take a due queued post for delivery (status 'sending' until `lease_until`); False if someone else has it or it is done."""
+        return self._write(lambda cursor: cursor.execute('''
+            UPDATE outbox SET status = 'sending', next_attempt_at = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status IN ('pending', 'sending') AND next_attempt_at <= ?
+        ''', (lease_until, entry_id, now)).rowcount == 1, 'claim_outbox')
+
+    def update_outbox(self, entry_id: int, status: str, next_attempt_at: float = None, attempts: int = None, payload: str = None,
+                      error: str = None) -> None:
+        """Set a queued post's status and any of the other given fields; `error` is always written (None clears it)."""
+        fields = {'status': status, 'error': error}
+        for field, value in (('next_attempt_at', next_attempt_at), ('attempts', attempts), ('payload', payload)):
+            if value is not None:
+                fields[field] = value
+        self._write(lambda cursor: cursor.execute(f'''
+            UPDATE outbox SET {', '.join(f'{field} = ?' for field in fields)}, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+        ''', [*fields.values(), entry_id]), 'update_outbox')
+
+    def get_sync_status(self, dataset: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Sync status rows (of one dataset, or all), by dataset and key."""
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            if dataset:
+                cursor.execute('SELECT * FROM sync_status WHERE dataset = ? ORDER BY dataset_key', (dataset,))
+            else:
+                cursor.execute('SELECT * FROM sync_status ORDER BY dataset, dataset_key')
+            return [dict(row) for row in cursor.fetchall()]
+
+    def record_sync(self, dataset: str, dataset_key: str, ok: bool, at: float, next_due_at: float, duration_ms: float = None,
+                    items: int = None, error: str = None) -> None:
+        """Store the outcome of one refresh of a dataset; failures are counted until the next success."""
+        def write(cursor):
+            if ok:
+                cursor.execute('''
+                    INSERT INTO sync_status (dataset, dataset_key, status, items, duration_ms, failures, error, last_attempt_at, last_success_at, next_due_at)
+                    VALUES (?, ?, 'ok', ?, ?, 0, NULL, ?, ?, ?)
+                    ON CONFLICT(dataset, dataset_key) DO UPDATE SET status = 'ok', items = excluded.items, duration_ms = excluded.duration_ms,
+                        failures = 0, error = NULL, last_attempt_at = excluded.last_attempt_at, last_success_at = excluded.last_success_at,
+                        next_due_at = excluded.next_due_at
+                ''', (dataset, dataset_key, items, duration_ms, at, at, next_due_at))
+            else:
+                cursor.execute('''
+                    INSERT INTO sync_status (dataset, dataset_key, status, duration_ms, failures, error, last_attempt_at, next_due_at)
+                    VALUES (?, ?, 'failed', ?, 1, ?, ?, ?)
+                    ON CONFLICT(dataset, dataset_key) DO UPDATE SET status = 'failed', duration_ms = excluded.duration_ms,
+                        failures = failures + 1, error = excluded.error, last_attempt_at = excluded.last_attempt_at,
+                        next_due_at = excluded.next_due_at
+                ''', (dataset, dataset_key, duration_ms, error, at, next_due_at))
+        self._write(write, 'record_sync')
+
+    def delete_sync_status(self, dataset: str, dataset_key: str) -> None:
+        self._write(lambda cursor: cursor.execute('DELETE FROM sync_status WHERE dataset = ? AND dataset_key = ?', (dataset, dataset_key)),
+                    'delete_sync_status')
+
+    def store_exchange_constraints(self, exchange_id: str, rows: List[Dict[str, Any]], at: float, keep_limits: bool = False) -> int:
+        """
+        Replace an exchange's constraints with `rows` (one per listed symbol), in one transaction. With keep_limits, rows
+        without limits take the limits already stored for their symbol (the markets could not be fetched). Returns the row count.
+        """
+        fields = ('active', 'min_notional', 'min_quantity', 'quantity_step', 'price_step', 'quote_step')
+
+        def write(cursor):
+            stored = {}
+            if keep_limits:
+                cursor.execute(f"SELECT symbol, {', '.join(fields)} FROM exchange_constraints WHERE exchange_id = ?", (exchange_id,))
+                stored = {row[0]: row[1:] for row in cursor.fetchall()}
+            cursor.execute('DELETE FROM exchange_constraints WHERE exchange_id = ?', (exchange_id,))
+            cursor.executemany(f'''
+                INSERT INTO exchange_constraints (exchange_id, symbol, {', '.join(fields)}, updated_at)
+                VALUES (?, ?, {', '.join('?' * len(fields))}, ?)
+            ''', ((exchange_id, row['symbol'], *stored.get(row['symbol'], [row[field] for field in fields]), at) for row in rows))
+            return len(rows)
+        return self._write(write, 'store_exchange_constraints')
+
+    def get_symbol_constraints(self, exchange_ids: List[str], symbol: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Constraints of `symbol` per exchange_id, by primary key. An exchange whose listing is stored but lacks the
+        symbol gets {'listed': False}; exchanges never synced are left out.
+        """
+        constraints = {}
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            for exchange_id in dict.fromkeys(e for e in exchange_ids if e):
+                row = conn.execute('SELECT * FROM exchange_constraints WHERE exchange_id = ? AND symbol = ?', (exchange_id, symbol)).fetchone()
+                if row is not None:
+                    constraints[exchange_id] = dict(row, listed=True)
+                elif conn.execute('SELECT 1 FROM exchange_constraints WHERE exchange_id = ? LIMIT 1', (exchange_id,)).fetchone():
+                    constraints[exchange_id] = {'exchange_id': exchange_id, 'symbol': symbol, 'listed': False}
+        return constraints
+
+    def get_exchange_constraints(self, exchange_id: str, limit: int = 1000, offset: int = 0) -> List[Dict[str, Any]]:
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute('SELECT * FROM exchange_constraints WHERE exchange_id = ? ORDER BY symbol LIMIT ? OFFSET ?',
+                                  (exchange_id, limit, offset))
+            return [dict(row) for row in cursor.fetchall()]
+
+    _PNL_TARGET_QUERY = '''
+        SELECT t.id AS target_id, t.schedule_id, t.server_id, t.server_url, t.server_schedule_buy_id, t.server_schedule_sell_id,
+               s.intention_id, s.symbol, s.buy_datetime, s.sell_datetime, i.amount, srv.api_key,
+               buy.source AS buy_source, sell.source AS sell_source
+        FROM schedule_targets t
+        JOIN intention_schedules s ON s.id = t.schedule_id
+        LEFT JOIN intentions i ON i.id = s.intention_id
+        LEFT JOIN servers srv ON srv.id = t.server_id
+        LEFT JOIN pnl_fills buy ON buy.target_id = t.id AND buy.side = 'buy'
+        LEFT JOIN pnl_fills sell ON sell.target_id = t.id AND sell.side = 'sell'
+    '''
+
+    def get_pnl_target(self, target_id: int) -> Optional[Dict[str, Any]]:
+        """A schedule target with what P&L needs to record its fills (schedule, intention amount, server key, fills so far)."""
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(self._PNL_TARGET_QUERY + ' WHERE t.id = ?', (target_id,)).fetchone()
+            return dict(row) if row else None
+
+    def get_unfilled_pnl_targets(self, now: str, since: str, limit: int = 100, checked_before: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Posted targets of schedules created since `since` whose buy (or posted sell) time is at or before `now`
+        (ISO 8601 UTC) but has no fill recorded yet, oldest first. With `checked_before` (epoch seconds), targets
+        deferred past it (defer_pnl_targets) are left out, so they never crowd out the ones that are due.
+        """
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(self._PNL_TARGET_QUERY + '''
+                WHERE s.created_at >= ? AND t.server_schedule_buy_id IS NOT NULL AND s.buy_datetime <= ?
+                  AND (buy.target_id IS NULL
+                       OR (sell.target_id IS NULL AND t.server_schedule_sell_id IS NOT NULL AND s.sell_datetime <= ?))
+                  AND (? IS NULL OR t.pnl_next_check_at IS NULL OR t.pnl_next_check_at <= ?)
+                ORDER BY s.created_at LIMIT ?
+            ''', (since, now, now, checked_before, checked_before, limit))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def defer_pnl_targets(self, target_ids: List[int], next_check_at: float) -> None:
+        """Have the P&L recorder look at these targets again at `next_check_at` (epoch seconds)."""
+        if target_ids:
+            self._write(lambda cursor: cursor.executemany('UPDATE schedule_targets SET pnl_next_check_at = ? WHERE id = ?',
+                                                          [(next_check_at, target_id) for target_id in target_ids]),
+                        'defer_pnl_targets')
+
+    def count_deferred_pnl_targets(self, now: float) -> int:
+        """Targets the P&L recorder is waiting to look at again."""
+        with self._get_connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM schedule_targets WHERE pnl_next_check_at > ?', (now,)).fetchone()[0]
+
+    def record_fill(self, target: Dict[str, Any], side: str, price: float, quantity: Optional[float], filled_at: str, source: str,
+                    at: float) -> Optional[Dict[str, Any]]:
+        """
+        Store the buy or sell fill of a schedule target (see get_pnl_target). Once both sides are filled, the round trip is
+        stored in pnl_trades and added to the running pnl_aggregates in the same transaction; a trade that is re-priced
+        (a better fill source) first has its old contribution taken out. Returns the trade when it changed, else None.
+        """
+        def write(cursor):
+            cursor.row_factory = sqlite3.Row
+            try:
+                cursor.execute('SELECT * FROM pnl_fills WHERE target_id = ? AND side = ?', (target['target_id'], side))
+                existing = cursor.fetchone()
+                if existing and (FILL_SOURCE_RANK[existing['source']] > FILL_SOURCE_RANK[source]
+                                 or (existing['source'] == source and existing['price'] == price and existing['quantity'] == quantity)):
+                    return None
+                cursor.execute('''
+                    INSERT OR REPLACE INTO pnl_fills (target_id, side, schedule_id, server_id, symbol, price, quantity, filled_at, source, recorded_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (target['target_id'], side, target['schedule_id'], target['server_id'], target['symbol'], price, quantity, filled_at,
+                      source, at))
+                cursor.execute('SELECT * FROM pnl_fills WHERE target_id = ?', (target['target_id'],))
+                fills = {row['side']: dict(row) for row in cursor.fetchall()}
+                if 'buy' not in fills or 'sell' not in fills:
+                    return None
+                buy, sell = fills['buy'], fills['sell']
+                if not buy['price'] or buy['price'] <= 0:
+                    return None
+                # The position is the bought quantity; without one from the server it is the intention's amount at the buy price
+                amount = float(target.get('amount') or 0)
+                position = buy['quantity'] or (amount / buy['price'] if amount > 0 else None)
+                if position is None:
+                    # Any size made up here would be wrong; the fills are kept and a buy fill with a quantity closes the trade
+                    print(f"[FinCompass] P&L trade of target {target['target_id']} skipped: no filled quantity and no intention amount")
+                    return None
+                trade = {
+                    'target_id': target['target_id'], 'schedule_id': target['schedule_id'], 'intention_id': target['intention_id'],
+                    'server_id': target['server_id'], 'symbol': target['symbol'], 'day': (sell['filled_at'] or '')[:10] or None,
+                    'buy_price': buy['price'], 'sell_price': sell['price'], 'quantity': position, 'notional': buy['price'] * position,
+                    'pnl': (sell['price'] - buy['price']) * position, 'trade_return': sell['price'] / buy['price'] - 1.0,
+                    'opened_at': buy['filled_at'], 'closed_at': sell['filled_at'],
+                    'source': min(buy['source'], sell['source'], key=FILL_SOURCE_RANK.get),
+                }
+                cursor.execute('SELECT * FROM pnl_trades WHERE target_id = ?', (target['target_id'],))
+                previous = cursor.fetchone()
+                if previous:
+                    self._add_to_pnl_aggregates(cursor, dict(previous), -1, at)
+                cursor.execute(f'''
+                    INSERT OR REPLACE INTO pnl_trades ({', '.join(trade)}) VALUES ({', '.join('?' * len(trade))})
+                ''', list(trade.values()))
+                self._add_to_pnl_aggregates(cursor, trade, 1, at)
+                return trade
+            finally:
+                cursor.row_factory = None
+        trade = self._write(write, 'record_fill')
+        if trade:
+            self.publish('pnl.updated', trade=trade)
+        return trade
+
+    @staticmethod
+    def _add_to_pnl_aggregates(cursor: sqlite3.Cursor, trade: Dict[str, Any], sign: int, at: float) -> None:
+        """Add (sign 1) or take out (sign -1) one trade in its total, intention, symbol and day aggregate rows."""
+        keys = [('total', ''), ('intention', str(trade['intention_id'])), ('symbol', trade['symbol'] or ''), ('day', trade['day'] or '')]
+        win, loss = int(trade['pnl'] > 0), int(trade['pnl'] < 0)
+        cursor.executemany('''
+            INSERT INTO pnl_aggregates (scope, scope_key, trades, wins, losses, realized_pnl, return_sum, notional, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(scope, scope_key) DO UPDATE SET trades = trades + excluded.trades, wins = wins + excluded.wins,
+                losses = losses + excluded.losses, realized_pnl = realized_pnl + excluded.realized_pnl,
+                return_sum = return_sum + excluded.return_sum, notional = notional + excluded.notional, updated_at = excluded.updated_at
+        ''', [(scope, key, sign, sign * win, sign * loss, sign * trade['pnl'], sign * trade['trade_return'], sign * trade['notional'], at)
+              for scope, key in keys])
+
+    def get_pnl_aggregate(self, scope: str, scope_key: str = '') -> Optional[Dict[str, Any]]:
+        """The running P&L aggregate of one intention, symbol or day (or the total), by primary key."""
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute('SELECT * FROM pnl_aggregates WHERE scope = ? AND scope_key = ?', (scope, scope_key)).fetchone()
+            return dict(row) if row else None
+
+    def get_pnl_aggregates(self, scope: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """The running P&L aggregates of one scope (days newest first, otherwise by realized P&L)."""
+        order = 'scope_key DESC' if scope == 'day' else 'realized_pnl DESC'
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(f'SELECT * FROM pnl_aggregates WHERE scope = ? AND trades != 0 ORDER BY {order} LIMIT ?', (scope, limit))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_pnl_trades(self, intention_id: Optional[int] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Closed trades, newest first."""
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            if intention_id is not None:
+                cursor = conn.execute('SELECT * FROM pnl_trades WHERE intention_id = ? ORDER BY closed_at DESC LIMIT ?', (intention_id, limit))
+            else:
+                cursor = conn.execute('SELECT * FROM pnl_trades ORDER BY closed_at DESC LIMIT ?', (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_active_sell_timers(self) -> List[tuple]:
+        """(id, next_check_at) of every timer still to be handled, including ones claimed by a process that may have died."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, next_check_at FROM sell_timers WHERE status IN ('pending', 'posting') ORDER BY next_check_at")
+            return cursor.fetchall()
+
+    def get_sell_timer(self, timer_id: int) -> Optional[Dict[str, Any]]:
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM sell_timers WHERE id = ?', (timer_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def get_sell_timers(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            if status:
+                cursor.execute('SELECT * FROM sell_timers WHERE status = ? ORDER BY next_check_at LIMIT ?', (status, limit))
+            else:
+                cursor.execute('SELECT * FROM sell_timers ORDER BY id DESC LIMIT ?', (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def claim_sell_timer(self, timer_id: int, now: float, lease_until: float) -> bool:
+        """Take a due timer for handling (status 'posting' until `lease_until`); False if it is not due, done or held by someone else."""
+        return self._write(lambda cursor: cursor.execute('''
+            UPDATE sell_timers SET status = 'posting', next_check_at = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status IN ('pending', 'posting') AND next_check_at <= ?
+        ''', (lease_until, timer_id, now)).rowcount == 1, 'claim_sell_timer')
+
+    def update_sell_timer(self, timer_id: int, status: str, next_check_at: float = None, due_at: float = None, timing_score: float = None,
+                          checkpoints: int = None, attempts: int = None, targets: str = None, error: str = None, sell_at: float = None) -> None:
+        """Set a timer's status and any of the other given fields; `error` is always written (None clears it)."""
+        fields = {'status': status, 'error': error}
+        for field, value in (('next_check_at', next_check_at), ('due_at', due_at), ('timing_score', timing_score),
+                             ('checkpoints', checkpoints), ('attempts', attempts), ('targets', targets), ('sell_at', sell_at)):
+            if value is not None:
+                fields[field] = value
+        self._write(lambda cursor: cursor.execute(f'''
+            UPDATE sell_timers SET {', '.join(f'{field} = ?' for field in fields)}, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+        ''', [*fields.values(), timer_id]), 'update_sell_timer')
+
+    def cancel_sell_timer(self, timer_id: int) -> bool:
+        """Cancel a pending timer; False if it was already posted, failed, cancelled or is being posted right now."""
+        return self._write(lambda cursor: cursor.execute('''
+            UPDATE sell_timers SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'pending'
+        ''', (timer_id,)).rowcount == 1, 'cancel_sell_timer')
+
+    def deselect_provider(self, server_id: int, provider_id: int) -> None:
+        """Deselect a single provider for a given server (set selected=0 for that provider only)."""
+        self._write(lambda cursor: cursor.execute('UPDATE providers SET selected = 0 WHERE id = ? AND server_id = ?', (provider_id, server_id)),
+                    'deselect_provider')
+        self.publish('provider.deselected', server_id=server_id, provider_id=provider_id)
 
     def get_provider_with_url_by_exchange_and_server_provider_id_and_url(self, exchange_id: str, server_provider_id: str, url: str) -> dict:
         """
@@ -517,6 +1217,249 @@ class FinCompassDatabase:
             row = cursor.fetchone()
             return dict(row) if row else None
 
+    def get_provider_by_id(self, provider_id: int) -> Optional[Dict[str, Any]]:
+        """Get a provider by its local id."""
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM providers WHERE id = ?', (provider_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def get_catalog_by_id(self, catalog_id: int) -> Optional[Dict[str, Any]]:
+        """Get a catalog by its local id."""
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM catalogs WHERE id = ?', (catalog_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def resolve_magic_items(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Resolve a list of {intention_id, case_id} pairs, one query per RESOLVE_CHUNK_SIZE items.
+        Returns one entry per item, in order, with 'intention' and 'case' set to None when not found.
+        """
+        resolved = []
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            # Chunks stay below SQLite's bound variable limit (999 on older builds)
+            for start in range(0, len(items), RESOLVE_CHUNK_SIZE):
+                chunk = items[start:start + RESOLVE_CHUNK_SIZE]
+                values = ', '.join('(?, ?, ?)' for _ in chunk)
+                params = [value for index, item in enumerate(chunk, start) for value in (index, item.get('intention_id'), item.get('case_id'))]
+                cursor.execute(f'''
+                    WITH items(item_index, item_intention_id, item_case_id) AS (VALUES {values})
+                    SELECT items.item_index, items.item_intention_id, items.item_case_id,
+                           c.id AS case_row_id, c.aetherone_case_id, c.name AS case_name, i.*
+                    FROM items
+                    LEFT JOIN intentions i ON i.id = items.item_intention_id
+                    LEFT JOIN cases c ON c.id = items.item_case_id
+                    ORDER BY items.item_index
+                ''', params)
+                columns = [description[0] for description in cursor.description]
+                for row in cursor.fetchall():
+                    record = dict(zip(columns, row))
+                    intention = {key: value for key, value in zip(columns[6:], row[6:])}
+                    resolved.append({
+                        'index': record['item_index'],
+                        'intention_id': record['item_intention_id'],
+                        'case_id': record['item_case_id'],
+                        'intention': intention if intention.get('id') is not None else None,
+                        'case': {
+                            'id': record['case_row_id'],
+                            'aetherone_case_id': record['aetherone_case_id'],
+                            'name': record['case_name'],
+                        } if record['case_row_id'] is not None else None,
+                    })
+        return resolved
+
+    def claim_idempotency_key(self, scope: str, key: str, request_hash: str, now: float, lease_until: float) -> Optional[Dict[str, Any]]:
+        """
+        Claim `key` for a new run, leased until `lease_until`.
+        Returns None if the key was claimed (new, or its previous entry had expired), else the existing entry.
+        """
+        def write(cursor):
+            cursor.execute('DELETE FROM idempotency_keys WHERE expires_at < ?', (now,))
+            # Single statement, so two concurrent claims can never both succeed
+            cursor.execute('''
+                INSERT INTO idempotency_keys (scope, idempotency_key, request_hash, status, created_at, expires_at)
+                VALUES (?, ?, ?, 'in_flight', ?, ?)
+                ON CONFLICT(scope, idempotency_key) DO UPDATE SET
+                    request_hash = excluded.request_hash, status = 'in_flight', status_code = NULL, response = NULL,
+                    created_at = excluded.created_at, expires_at = excluded.expires_at
+                WHERE idempotency_keys.expires_at < excluded.created_at
+            ''', (scope, key, request_hash, now, lease_until))
+            if cursor.rowcount == 1:
+                return None
+            cursor.execute('SELECT * FROM idempotency_keys WHERE scope = ? AND idempotency_key = ?', (scope, key))
+            row = cursor.fetchone()
+            return dict(zip([description[0] for description in cursor.description], row)) if row else None
+        return self._write(write, 'claim_idempotency_key')
+
+    def get_idempotency_key(self, scope: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM idempotency_keys WHERE scope = ? AND idempotency_key = ?', (scope, key))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def complete_idempotency_key(self, scope: str, key: str, status_code: int, response: str, expires_at: float) -> None:
+        """Store the response of a finished run; it is replayed for the key until `expires_at`."""
+        self._write(lambda cursor: cursor.execute('''
+            UPDATE idempotency_keys SET status = 'completed', status_code = ?, response = ?, expires_at = ?
+            WHERE scope = ? AND idempotency_key = ?
+        ''', (status_code, response, expires_at, scope, key)), 'complete_idempotency_key')
+
+    def release_idempotency_key(self, scope: str, key: str) -> None:
+        """Forget a key whose run failed, so a retry runs again."""
+        self._write(lambda cursor: cursor.execute('DELETE FROM idempotency_keys WHERE scope = ? AND idempotency_key = ?', (scope, key)),
+                    'release_idempotency_key')
+
+    def get_schedule_count_boundaries(self, max_runs: int) -> List[tuple]:
+        """
+        (intention_id, created_at, id) of the oldest schedule each intention keeps under a
+        keep-newest-`max_runs` policy; only intentions with more schedules than that are returned.
+        """
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT intention_id, created_at, id FROM (
+                    SELECT intention_id, created_at, id,
+                           ROW_NUMBER() OVER (PARTITION BY intention_id ORDER BY created_at DESC, id DESC) AS run_rank
+                    FROM intention_schedules
+                ) WHERE run_rank = ?
+                  AND intention_id IN (SELECT intention_id FROM intention_schedules GROUP BY intention_id HAVING COUNT(*) > ?)
+            ''', (max_runs, max_runs))
+            return cursor.fetchall()
+
+    def get_expired_schedules(self, before: tuple, sold_before: str, after: Optional[tuple] = None, intention_id: Optional[int] = None, limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        One page of schedules created before `before` = (created_at, id), whose sell time has passed
+        (`sold_before`, ISO) or is unset, ordered by (created_at, id) and starting after the `after` key.
+        """
+        query = '''
+            SELECT * FROM intention_schedules
+            WHERE (created_at, id) < (?, ?)
+              AND (sell_datetime IS NULL OR sell_datetime < ?)
+        '''
+        params: List[Any] = [before[0], before[1], sold_before]
+        if after is not None:
+            query += ' AND (created_at, id) > (?, ?)'
+            params.extend(after)
+        if intention_id is not None:
+            query += ' AND intention_id = ?'
+            params.append(intention_id)
+        query += ' ORDER BY created_at, id LIMIT ?'
+        params.append(limit)
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+
+    def archive_schedules(self, rollups: List[Dict[str, Any]], schedule_ids: List[int]) -> None:
+        """
+        Merge `rollups` (per intention/day/symbol deltas) into schedule_rollups and delete the rolled-up
+        schedules, in one short write transaction.
+        """
+        def write(cursor):
+            cursor.row_factory = sqlite3.Row
+            try:
+                for delta in rollups:
+                    key = (delta['intention_id'], delta['day'], delta['symbol'])
+                    cursor.execute('SELECT * FROM schedule_rollups WHERE intention_id = ? AND day = ? AND symbol = ?', key)
+                    existing = cursor.fetchone()
+                    status_counts = json.loads(existing['status_counts']) if existing else {}
+                    for status, count in delta['status_counts'].items():
+                        status_counts[status] = status_counts.get(status, 0) + count
+                    max_values = [v for v in (existing['max_energetic_value'] if existing else None, delta['max_energetic_value']) if v is not None]
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO schedule_rollups (intention_id, day, symbol, runs, total_energetic_value, max_energetic_value,
+                                                                 total_hold_minutes, status_counts, first_created_at, last_created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', key + (
+                        (existing['runs'] if existing else 0) + delta['runs'],
+                        (existing['total_energetic_value'] if existing else 0) + delta['total_energetic_value'],
+                        max(max_values) if max_values else None,
+                        (existing['total_hold_minutes'] if existing else 0) + delta['total_hold_minutes'],
+                        json.dumps(status_counts, sort_keys=True),
+                        min(filter(None, (existing['first_created_at'] if existing else None, delta['first_created_at'])), default=None),
+                        max(filter(None, (existing['last_created_at'] if existing else None, delta['last_created_at'])), default=None),
+                    ))
+                cursor.executemany('DELETE FROM schedule_targets WHERE schedule_id = ?', [(i,) for i in schedule_ids])
+                cursor.executemany('DELETE FROM sell_timers WHERE schedule_id = ?', [(i,) for i in schedule_ids])
+                cursor.executemany('DELETE FROM outbox WHERE schedule_id = ?', [(i,) for i in schedule_ids])
+                cursor.executemany('DELETE FROM intention_schedules WHERE id = ?', [(i,) for i in schedule_ids])
+            finally:
+                cursor.row_factory = None
+        self._write(write, 'archive_schedules')
+        self.publish('schedules.archived', schedule_ids=list(schedule_ids))
+
+    def get_schedule_rollups(self, intention_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            if intention_id is not None:
+                cursor.execute('SELECT * FROM schedule_rollups WHERE intention_id = ? ORDER BY day DESC, symbol', (intention_id,))
+            else:
+                cursor.execute('SELECT * FROM schedule_rollups ORDER BY day DESC, intention_id, symbol')
+            rollups = []
+            for row in cursor.fetchall():
+                rollup = dict(row)
+                rollup['status_counts'] = json.loads(rollup['status_counts'] or '{}')
+                rollups.append(rollup)
+            return rollups
+
+    def delete_expired_idempotency_keys(self, now: float) -> int:
+        return self._write(lambda cursor: cursor.execute('DELETE FROM idempotency_keys WHERE expires_at < ?', (now,)).rowcount,
+                           'delete_expired_idempotency_keys')
+
+    def get_page_stats(self) -> Dict[str, int]:
+        """Page size, page count, free pages and auto_vacuum mode of the plugin DB."""
+        with self._get_connection() as conn:
+            return {pragma: conn.execute(f'PRAGMA {pragma}').fetchone()[0]
+                    for pragma in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum')}
+
+    def enable_incremental_vacuum(self) -> None:
+        """Switch the DB to auto_vacuum=INCREMENTAL; takes effect after one full VACUUM."""
+        conn = self._get_connection()
+        try:
+            conn.isolation_level = None
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+
+    def incremental_vacuum(self, pages: int) -> int:
+        """Return up to `pages` free pages to the filesystem; returns the number released."""
+        conn = self._get_connection()
+        try:
+            conn.isolation_level = None
+            before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+            return before - conn.execute('PRAGMA freelist_count').fetchone()[0]
+        finally:
+            conn.close()
+
+    def get_symbol_index(self, aetherone_catalog_id: int) -> list:
+        """(symbol, base, quote) rows of a catalog's symbol index."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT symbol, base, quote FROM symbol_index WHERE aetherone_catalog_id = ?', (aetherone_catalog_id,))
+            return cursor.fetchall()
+
+    def replace_symbol_index(self, aetherone_catalog_id: int, exchange_id: Optional[str], rows: List[tuple]) -> None:
+        """Replace a catalog's symbol index with (symbol, base, quote) rows, in one transaction."""
+        def write(cursor):
+            cursor.execute('DELETE FROM symbol_index WHERE aetherone_catalog_id = ?', (aetherone_catalog_id,))
+            cursor.executemany('''
+                INSERT OR REPLACE INTO symbol_index (aetherone_catalog_id, symbol, base, quote, exchange_id)
+                VALUES (?, ?, ?, ?, ?)
+            ''', ((aetherone_catalog_id, symbol, base, quote, exchange_id) for symbol, base, quote in rows))
+        self._write(write, 'replace_symbol_index')
+
     def loadSettings(self) -> dict:
         """Load settings from the main AetherOnePy settings file."""
         project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..'))
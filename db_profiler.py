@@ -0,0 +1,198 @@
+"""
+Per-request SQL profiler for the plugin database.
+
+Opt-in: set FINCOMPASS_DB_PROFILE=1, then send a request with the
+`X-FinCompass-Profile` header. FinCompassDatabase._get_connection() hands out
+profiling connections for that request only; every execute/executemany and
+commit (also the one `with conn:` issues on exit) is counted and timed (fetch
+time is added to the statement that produced the rows). Writes run on the
+writer thread (db_writer.py) and are recorded per queued operation: the wait
+in the queue, the operation itself and its share of the group COMMIT. The
+response carries:
+
+    X-DB-Queries     number of statements
+    X-DB-Time        total time spent in SQLite, in milliseconds
+    X-DB-Profile-Id  ID for GET /api/debug/db-profile/<id> (per-statement breakdown)
+
+Without the header (or with profiling disabled) the only cost is one
+ContextVar lookup per connection.
+"""
+import contextvars
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+PROFILE_HEADER = 'X-FinCompass-Profile'
+MAX_STORED_PROFILES = 50
+
+_active_profile: contextvars.ContextVar = contextvars.ContextVar('fincompass_db_profile', default=None)
+_whitespace = re.compile(r'\s+')
+
+
+class QueryProfile:
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.created = time.time()
+        self.statements: List[Dict[str, Any]] = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, duration: float, rows: int = None) -> Dict[str, Any]:
+        entry = {'sql': _whitespace.sub(' ', sql).strip(), 'ms': duration * 1000, 'rows': rows}
+        with self._lock:
+            self.statements.append(entry)
+        return entry
+
+    @property
+    def query_count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def total_ms(self) -> float:
+        return sum(s['ms'] for s in self.statements)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'created': self.created,
+            'queries': self.query_count,
+            'connections': self.connections,
+            'total_ms': round(self.total_ms, 3),
+        }
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Statements in execution order plus a per-SQL aggregate; repeated statements hint at N+1 patterns."""
+        grouped: Dict[str, Dict[str, Any]] = {}
+        for s in self.statements:
+            group = grouped.setdefault(s['sql'], {'sql': s['sql'], 'count': 0, 'total_ms': 0.0})
+            group['count'] += 1
+            group['total_ms'] += s['ms']
+        by_sql = sorted(grouped.values(), key=lambda g: g['total_ms'], reverse=True)
+        for group in by_sql:
+            group['total_ms'] = round(group['total_ms'], 3)
+        return dict(
+            self.summary(),
+            statements=[dict(s, ms=round(s['ms'], 3)) for s in self.statements],
+            by_sql=by_sql,
+            repeated=[g for g in by_sql if g['count'] > 1],
+        )
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    profile: Optional[QueryProfile] = None
+    _last: Optional[Dict[str, Any]] = None
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._last = self.profile.record(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._last = self.profile.record(sql, time.perf_counter() - start, rows=self.rowcount)
+
+    def _fetch(self, fetch, *args):
+        start = time.perf_counter()
+        result = fetch(*args)
+        if self._last is not None:
+            self._last['ms'] += (time.perf_counter() - start) * 1000
+            count = len(result) if isinstance(result, list) else int(result is not None)
+            self._last['rows'] = (self._last['rows'] or 0) + count
+        return result
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+
+class ProfilingConnection(sqlite3.Connection):
+    profile: Optional[QueryProfile] = None
+
+    def cursor(self, factory=ProfilingCursor):
+        cursor = super().cursor(factory)
+        cursor.profile = self.profile
+        return cursor
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            self.profile.record('COMMIT', time.perf_counter() - start)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The C-level __exit__ commits (or rolls back) without going through commit()
+        if not self.in_transaction:
+            return super().__exit__(exc_type, exc_value, traceback)
+        start = time.perf_counter()
+        try:
+            return super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            self.profile.record('COMMIT' if exc_type is None else 'ROLLBACK', time.perf_counter() - start)
+
+
+class DBProfiler:
+    def __init__(self, enabled: bool = False, max_profiles: int = MAX_STORED_PROFILES):
+        self.enabled = enabled
+        self.max_profiles = max_profiles
+        self._profiles: 'OrderedDict[str, QueryProfile]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def current() -> Optional[QueryProfile]:
+        return _active_profile.get()
+
+    def start(self, name: str):
+        """Start profiling the current request; returns a token for stop()."""
+        profile = QueryProfile(name)
+        return _active_profile.set(profile)
+
+    def stop(self, token) -> Optional[QueryProfile]:
+        profile = _active_profile.get()
+        _active_profile.reset(token)
+        if profile is not None:
+            with self._lock:
+                self._profiles[profile.id] = profile
+                while len(self._profiles) > self.max_profiles:
+                    self._profiles.popitem(last=False)
+        return profile
+
+    def connect(self, db_path: str, profile: QueryProfile) -> sqlite3.Connection:
+        conn = sqlite3.connect(db_path, factory=ProfilingConnection)
+        conn.profile = profile
+        profile.connections += 1
+        return conn
+
+    def get(self, profile_id: str) -> Optional[QueryProfile]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def recent(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [p.summary() for p in reversed(self._profiles.values())]
+
+
+profiler = DBProfiler(enabled=os.environ.get('FINCOMPASS_DB_PROFILE', '').lower() in ('1', 'true', 'yes'))
@@ -0,0 +1,236 @@
+"""
+Single-writer queue for the plugin database.
+
+SQLite lets one connection write at a time. With the host app serving
+requests on several threads (plus the sell scheduler, outbox and sync
+daemon), FinCompassDatabase writes used to race for that lock on their own
+connections and failed with `database is locked` once the busy timeout ran
+out. Now every write is an operation, fn(cursor) -> result, queued to one
+writer thread per database file:
+
+    - the writer owns the only writing connection (WAL journal, so readers on
+      their own connections are never blocked by it and see committed data)
+    - it takes every operation queued at the moment (at most MAX_BATCH) and
+      runs them in one transaction, each under its own SAVEPOINT: an operation
+      that raises is rolled back alone, the others still commit (group commit;
+      one fsync for the whole batch)
+    - each caller gets a Future, resolved after COMMIT with the operation's
+      result or exception; FinCompassDatabase waits on it, so a write method
+      still returns once its data is durable and visible
+
+Operations must not commit or touch other connections; one that writes
+through the database again from the writer thread runs inline in the
+current transaction. A caller waits at most EXECUTE_TIMEOUT for its write.
+If the writer cannot open the database (or stops on an error), the queued
+operations fail with that error and the next write starts a new writer.
+
+FINCOMPASS_DB_WRITER=0 disables the queue (every write opens, commits and
+closes its own connection as before).
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from .db_profiler import profiler
+
+MAX_BATCH = 256
+BUSY_TIMEOUT = 30.0
+BEGIN_RETRIES = 3
+# Longest a caller waits for its write: a batch may wait out BUSY_TIMEOUT on each BEGIN attempt
+EXECUTE_TIMEOUT = BUSY_TIMEOUT * BEGIN_RETRIES + 30.0
+
+_writers: Dict[str, 'WriteQueue'] = {}
+_writers_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return os.environ.get('FINCOMPASS_DB_WRITER', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def writer_for(db_path: str) -> 'WriteQueue':
+    """The process-wide writer of a database file, started on first use."""
+    key = os.path.abspath(db_path)
+    writer = _writers.get(key)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(key)
+            if writer is None:
+                writer = _writers[key] = WriteQueue(key)
+    return writer
+
+
+class _Operation:
+    __slots__ = ('fn', 'name', 'future', 'profile', 'queued_at')
+
+    def __init__(self, fn: Callable[[sqlite3.Cursor], Any], name: str):
+        self.fn = fn
+        self.name = name
+        self.future: Future = Future()
+        # The submitting request's SQL profile (db_profiler.py), if it is being profiled
+        self.profile = profiler.current()
+        self.queued_at = time.perf_counter()
+
+
+class WriteQueue:
+    def __init__(self, db_path: str, max_batch: int = MAX_BATCH):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self._queue: 'queue.SimpleQueue[Optional[_Operation]]' = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._cursor: Optional[sqlite3.Cursor] = None
+        self.stats = {'operations': 0, 'failed': 0, 'batches': 0, 'max_batch': 0, 'commit_ms': 0.0, 'retries': 0}
+
+    def submit(self, fn: Callable[[sqlite3.Cursor], Any], name: str = 'write') -> Future:
+        """Queue fn(cursor) for the writer; the Future resolves after its batch committed."""
+        op = _Operation(fn, name)
+        # Under the lock, so an operation is never queued behind a writer that has already failed
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='fincompass-db-writer', daemon=True)
+                self._thread.start()
+            self._queue.put(op)
+        return op.future
+
+    def execute(self, fn: Callable[[sqlite3.Cursor], Any], name: str = 'write', timeout: Optional[float] = EXECUTE_TIMEOUT) -> Any:
+        """
+        Run fn(cursor) on the writer and return its result (or raise its exception) once committed.
+        Raises concurrent.futures.TimeoutError after `timeout` seconds; the write may still be committed later.
+        """
+        if threading.current_thread() is self._thread:
+            # A write issued by an operation joins the running transaction
+            return fn(self._cursor)
+        return self.submit(fn, name).result(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Let queued operations finish, then stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        # Persistent for the file: readers keep reading the last commit while a batch is written
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _run(self) -> None:
+        try:
+            conn = self._connect()
+        except Exception as e:
+            print(f"[FinCompass] DB writer cannot open {self.db_path}: {e}")
+            self._fail(e)
+            return
+        self._cursor = conn.cursor()
+        try:
+            while True:
+                op = self._queue.get()
+                if op is None:
+                    return
+                batch = [op]
+                # Whatever queued up while the last batch was committing goes into this one
+                while len(batch) < self.max_batch:
+                    try:
+                        op = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if op is None:
+                        self._write_batch(batch)
+                        return
+                    batch.append(op)
+                self._write_batch(batch)
+        except BaseException as e:
+            self._fail(e)
+            raise
+        finally:
+            self._cursor = None
+            conn.close()
+
+    def _fail(self, error: BaseException) -> None:
+        """The writer thread is stopping on `error`: fail what is queued and let the next submit start a new writer."""
+        with self._lock:
+            if self._thread is threading.current_thread():
+                self._thread = None
+            while True:
+                try:
+                    op = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if op is not None and not op.future.done():
+                    op.future.set_exception(error)
+                    self.stats['failed'] += 1
+
+    def _begin(self) -> None:
+        for attempt in range(BEGIN_RETRIES):
+            try:
+                self._cursor.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError:
+                # Another process (or a maintenance connection) held the lock past the busy timeout
+                if attempt == BEGIN_RETRIES - 1:
+                    raise
+                self.stats['retries'] += 1
+                time.sleep(0.05 * (attempt + 1))
+
+    def _write_batch(self, batch: List[_Operation]) -> None:
+        cursor = self._cursor
+        results = []
+        try:
+            self._begin()
+        except Exception as e:
+            for op in batch:
+                op.future.set_exception(e)
+            self.stats['failed'] += len(batch)
+            return
+        try:
+            for op in batch:
+                started = time.perf_counter()
+                if op.profile is not None:
+                    op.profile.record(f'WRITE QUEUE {op.name}', started - op.queued_at)
+                cursor.execute('SAVEPOINT op')
+                try:
+                    result = op.fn(cursor)
+                except BaseException as e:
+                    cursor.execute('ROLLBACK TO op')
+                    cursor.execute('RELEASE op')
+                    results.append((False, e))
+                else:
+                    cursor.execute('RELEASE op')
+                    results.append((True, result))
+                if op.profile is not None:
+                    op.profile.record(f'WRITE {op.name}', time.perf_counter() - started)
+            started = time.perf_counter()
+            cursor.execute('COMMIT')
+            commit = time.perf_counter() - started
+            self.stats['commit_ms'] += commit * 1000
+            for op in batch:
+                if op.profile is not None:
+                    op.profile.record(f'COMMIT (group of {len(batch)})', commit / len(batch))
+        except Exception as e:
+            if cursor.connection.in_transaction:
+                cursor.execute('ROLLBACK')
+            for op in batch:
+                op.future.set_exception(e)
+            self.stats['failed'] += len(batch)
+            return
+        self.stats['batches'] += 1
+        self.stats['operations'] += len(batch)
+        self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+        for op, (ok, value) in zip(batch, results):
+            if ok:
+                op.future.set_result(value)
+            else:
+                self.stats['failed'] += 1
+                op.future.set_exception(value)
+
+    def metrics(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats['commit_ms'] = round(stats['commit_ms'], 3)
+        stats['avg_batch'] = round(stats['operations'] / stats['batches'], 2) if stats['batches'] else 0.0
+        return {'db_path': self.db_path, 'running': self._thread is not None, 'queued': self._queue.qsize(), **stats}
@@ -0,0 +1,137 @@
+"""
+Server-sent events for UI state changes.
+
+FinCompassDatabase publishes a small delta after every write the UI shows
+(selections, intentions, schedules, provider and rate syncs) to the
+process-wide `bus`; GET /fincompass/api/events streams them as SSE so the
+frontend can patch its lists instead of refetching them after each click:
+
+    id: 42
+    event: case.selected
+    data: {"case_id":3}
+
+The last EVENT_HISTORY events are kept, so a reconnecting EventSource that
+sends Last-Event-ID gets what it missed. A client that is too far behind
+(its id left the history, or it fell MAX_PENDING events behind) gets a
+`resync` event and should refetch once, as does one whose id is ahead of the
+bus (ids restart at 1 when the process restarts).
+
+Events are per process: with several server workers each one only streams
+the writes it made itself.
+"""
+import threading
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .fast_json import dumps
+
+EVENT_HISTORY = 512
+MAX_PENDING = 1000
+# Comment line sent while idle so proxies keep the connection open
+HEARTBEAT_INTERVAL = 15.0
+# EventSource reconnect delay, in milliseconds
+RETRY_MS = 3000
+
+Event = Tuple[int, str, Dict[str, Any]]
+
+
+class Subscription:
+    def __init__(self):
+        self.pending: deque = deque()
+        self.resync = False
+        self.ready = threading.Condition()
+
+    def push(self, event: Event) -> None:
+        with self.ready:
+            if len(self.pending) >= MAX_PENDING:
+                # Too slow a reader: drop its backlog and have it refetch
+                self.pending.clear()
+                self.resync = True
+            else:
+                self.pending.append(event)
+            self.ready.notify()
+
+    def take(self, timeout: float) -> Tuple[List[Event], bool]:
+        """(pending events, resync flag), waiting up to `timeout` for something to arrive."""
+        with self.ready:
+            if not self.pending and not self.resync:
+                self.ready.wait(timeout)
+            events = list(self.pending)
+            self.pending.clear()
+            resync, self.resync = self.resync, False
+            return events, resync
+
+
+class EventBus:
+    def __init__(self, history: int = EVENT_HISTORY):
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._history: deque = deque(maxlen=history)
+        self._subscribers: List[Subscription] = []
+
+    def publish(self, event: str, data: Dict[str, Any]) -> int:
+        """Record `event` and hand it to every subscriber; returns its id."""
+        with self._lock:
+            self._last_id += 1
+            entry = (self._last_id, event, data)
+            self._history.append(entry)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.push(entry)
+        return entry[0]
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscription:
+        """A new subscription, primed with the history after `last_event_id` (or a resync if it is gone)."""
+        subscription = Subscription()
+        with self._lock:
+            if last_event_id is not None and last_event_id > self._last_id:
+                # An id from before a restart: the events it is waiting for will never come
+                subscription.resync = True
+            elif last_event_id is not None and last_event_id < self._last_id:
+                missed = [entry for entry in self._history if entry[0] > last_event_id]
+                if not missed or missed[0][0] != last_event_id + 1:
+                    subscription.resync = True
+                else:
+                    subscription.pending.extend(missed)
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def stream(self, last_event_id: Optional[int] = None, heartbeat: float = HEARTBEAT_INTERVAL) -> Iterator[bytes]:
+        """SSE-formatted chunks for one client, until the client goes away."""
+        subscription = self.subscribe(last_event_id)
+        try:
+            yield f'retry: {RETRY_MS}\n\n'.encode('utf-8')
+            while True:
+                events, resync = subscription.take(heartbeat)
+                chunk = []
+                if resync:
+                    with self._lock:
+                        last_id = self._last_id
+                    chunk.append(format_event(last_id, 'resync', {'reason': 'missed events'}))
+                chunk.extend(format_event(*entry) for entry in events)
+                yield b''.join(chunk) if chunk else b': keepalive\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+
+def format_event(event_id: int, event: str, data: Dict[str, Any]) -> bytes:
+    return b'id: %d\nevent: %s\ndata: %s\n\n' % (event_id, event.encode('utf-8'), dumps(data))
+
+
+bus = EventBus()
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
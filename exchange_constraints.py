@@ -0,0 +1,154 @@
+"""
+Cached per-exchange trading constraints, checked before a schedule is posted.
+
+Schedule payloads used to be validated by the remote server only: a refused
+buy cost a round trip, and a pair whose sell was refused left a buy without
+its sell. The symbols sync (sync_daemon.sync_symbols, also behind
+api_sync_rates) now stores one exchange_constraints row per listed symbol:
+
+    active          tradable on the exchange
+    min_notional    smallest order value, in the quote currency
+    min_quantity    smallest order size, in the base currency
+    quantity_step   order size increment (step size)
+    price_step      price increment
+    quote_step      increment of order values in the quote currency
+
+They come from GET /api/v1/markets/exchange/<id> (a list of markets, flat
+fields as above or ccxt-style `limits`/`precision`, where a precision >= 1 is
+a number of decimals and one below 1 the increment itself). A server without
+that endpoint leaves only the listing: every synced symbol active, without
+limits. When the markets cannot be fetched, known limits of symbols still
+listed are kept.
+
+Before posting, start-magic applies the constraints of the target's exchange
+(apply_constraints): a symbol no longer listed or not tradable, or an amount
+below the minimum notional, fails the target locally (400) without any
+network call, and the amount is rounded down to the quote increment.
+Payloads are market orders sized by their quote amount, so quantity and
+price increments are cached but not applied. Exchanges never synced are not
+checked.
+"""
+import time
+from decimal import Decimal, InvalidOperation, ROUND_DOWN
+from typing import Any, Dict, Iterable, List, Optional
+
+from .symbol_stream import normalize_symbol
+from .tracing import tracer
+
+LIMIT_FIELDS = ('min_notional', 'min_quantity', 'quantity_step', 'price_step', 'quote_step')
+
+
+class ConstraintViolation(ValueError):
+    """A schedule payload the target exchange would refuse."""
+
+
+def _positive(value) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def _step(precision) -> Optional[float]:
+    """The increment for a ccxt precision: decimals when it is 0 or >= 1, else the increment itself."""
+    try:
+        value = float(precision)
+    except (TypeError, ValueError):
+        return None
+    if value < 0:
+        return None
+    return 10.0 ** -int(value) if value == 0 or value >= 1 else value
+
+
+def _nested(market: Dict[str, Any], *path) -> Any:
+    for key in path:
+        if not isinstance(market, dict):
+            return None
+        market = market.get(key)
+    return market
+
+
+def parse_market(market: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The constraints row (without exchange_id) of one market as returned by the server; None without a symbol."""
+    symbol = market.get('symbol')
+    if not isinstance(symbol, str) or not symbol.strip('"'):
+        return None
+    precision = market.get('precision') if isinstance(market.get('precision'), dict) else {}
+    return {
+        'symbol': normalize_symbol(symbol),
+        'active': int(market.get('active', market.get('tradable', True)) is not False),
+        'min_notional': _positive(market.get('min_notional', _nested(market, 'limits', 'cost', 'min'))),
+        'min_quantity': _positive(market.get('min_quantity', _nested(market, 'limits', 'amount', 'min'))),
+        'quantity_step': _positive(market['step_size']) if 'step_size' in market else _step(precision.get('amount')),
+        'price_step': _positive(market['price_step']) if 'price_step' in market else _step(precision.get('price')),
+        'quote_step': _positive(market['quote_step']) if 'quote_step' in market else _step(precision.get('cost')),
+    }
+
+
+def parse_markets(data: Any) -> List[Dict[str, Any]]:
+    """Constraint rows of a markets payload: a list of markets, or an object with a `markets` list."""
+    markets = data.get('markets') if isinstance(data, dict) else data
+    if not isinstance(markets, list):
+        raise ValueError('Markets payload must be a list of markets.')
+    return [row for row in (parse_market(market) for market in markets if isinstance(market, dict)) if row]
+
+
+def listing_rows(symbols: Iterable[str], markets: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """One row per listed symbol: its market's constraints, or active without limits when the server has none for it."""
+    by_symbol = {row['symbol']: row for row in markets or ()}
+    return [by_symbol.get(symbol) or dict({field: None for field in LIMIT_FIELDS}, symbol=symbol, active=1) for symbol in symbols]
+
+
+def sync_constraints(db, client, exchange_id: str, symbols: Iterable[str]) -> Dict[str, Any]:
+    """Fetch the exchange's markets and store one constraints row per listed symbol; returns counts for the sync report."""
+    markets, error = None, None
+    try:
+        resp = client.get_markets(exchange_id)
+        if resp.status_code != 404:
+            resp.raise_for_status()
+            markets = parse_markets(resp.json())
+    except Exception as e:
+        # Throttled, breaker open, upstream error or a bad payload: keep the limits already known
+        error = str(e)
+        print(f"[FinCompass] Could not fetch markets of '{exchange_id}', keeping cached constraints: {e}")
+    count = db.store_exchange_constraints(exchange_id, listing_rows(sorted(symbols), markets), time.time(), keep_limits=error is not None)
+    tracer.set(constraints=count, markets=markets is not None)
+    return {'symbols': count, 'with_limits': sum(1 for row in markets or () if any(row[field] for field in LIMIT_FIELDS)),
+            'markets': markets is not None}
+
+
+def _round_down(value: Decimal, step: float) -> Decimal:
+    step = Decimal(repr(step))
+    return (value / step).to_integral_value(ROUND_DOWN) * step
+
+
+def apply_constraints(payload: Dict[str, Any], constraint: Optional[Dict[str, Any]], exchange_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    The payload with its amount rounded to the symbol's constraints (see get_symbol_constraints); raises
+    ConstraintViolation when the exchange would refuse it. Without a constraint (exchange never synced) it is returned as is.
+    """
+    for field in ('stop_loss_percentage', 'take_profit_percentage'):
+        try:
+            percentage = float(payload.get(field) or 0)
+        except (TypeError, ValueError):
+            raise ConstraintViolation(f'{field} must be a number.')
+        if percentage < 0 or (field == 'stop_loss_percentage' and percentage >= 100):
+            raise ConstraintViolation(f'{field} must be between 0 and 100, got {percentage:g}.')
+    if constraint is None:
+        return payload
+    symbol, exchange = payload.get('symbol'), exchange_id or constraint.get('exchange_id')
+    if not constraint.get('listed', True):
+        raise ConstraintViolation(f"Symbol {symbol} is not listed on '{exchange}' (as of the last sync).")
+    if not constraint.get('active'):
+        raise ConstraintViolation(f"Symbol {symbol} is not tradable on '{exchange}'.")
+    try:
+        amount = Decimal(str(payload.get('amount') or '0'))
+    except InvalidOperation:
+        raise ConstraintViolation(f"Amount {payload.get('amount')!r} is not a number.")
+    if constraint.get('quote_step'):
+        amount = _round_down(amount, constraint['quote_step'])
+    if constraint.get('min_notional') and amount < Decimal(repr(constraint['min_notional'])):
+        raise ConstraintViolation(f"Amount {amount.normalize():f} is below the minimum order value {constraint['min_notional']:g} "
+                                  f"of {symbol} on '{exchange}'.")
+    return dict(payload, amount=f'{amount.normalize():f}') if constraint.get('quote_step') else payload
@@ -0,0 +1,236 @@
+"""
+Streaming export of start-magic history for offline analysis.
+
+Rows of intention_schedules joined with their intention (chosen symbol,
+analysis value, GV, timing score, hold, remote schedule ids, ...) are read
+with a server-side cursor in batches of ROW_GROUP_SIZE and written out batch
+by batch, so memory stays constant however much history is exported. Time
+filters (`since`/`until`, on the run's created_at) and the intention filter
+are part of the SQL query.
+
+Formats:
+
+    csv       chunked CSV with a header row
+    parquet   Parquet, one row group per batch (requires pyarrow)
+    arrow     Arrow IPC stream, one record batch per batch (requires pyarrow)
+
+Served by GET /fincompass/api/export/schedules, or from the command line:
+
+    python export.py --db fincompass.db --format parquet --since 2026-01-01 --output runs.parquet
+"""
+import argparse
+import csv
+import io
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+
+ROW_GROUP_SIZE = 10000
+
+# (column, SQL expression, arrow type name)
+EXPORT_COLUMNS = (
+    ('schedule_id', 's.id', 'int64'),
+    ('intention_id', 's.intention_id', 'int64'),
+    ('intention', 'i.intention', 'string'),
+    ('created_at', 's.created_at', 'string'),
+    ('buy_datetime', 's.buy_datetime', 'string'),
+    ('sell_datetime', 's.sell_datetime', 'string'),
+    ('status', 's.status', 'string'),
+    ('symbol', 's.symbol', 'string'),
+    ('energetic_value', 's.energetic_value', 'float64'),
+    ('gv', 's.gv', 'float64'),
+    ('hold_minutes', 's.hold_minutes', 'int64'),
+    ('timing_score', 's.timing_score', 'float64'),
+    ('dynamic_sell_timing', 'i.dynamic_sell_timing', 'int64'),
+    ('min_hold_minutes', 'i.min_hold_minutes', 'int64'),
+    ('max_hold_minutes', 'i.max_hold_minutes', 'int64'),
+    ('amount', 'i.amount', 'float64'),
+    ('server_schedule_buy_id', 's.server_schedule_buy_id', 'string'),
+    ('server_schedule_sell_id', 's.server_schedule_sell_id', 'string'),
+    ('session_id', 's.session_id', 'int64'),
+    ('analysis_id', 's.analysis_id', 'int64'),
+)
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+def time_bound(value: Optional[str]) -> Optional[str]:
+    """created_at form ('YYYY-MM-DD HH:MM:SS', UTC) of an ISO date or datetime."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    # Read-only: an export never takes the write lock
+    return sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=False)
+
+
+def iter_batches(db_path: str, since: Optional[str] = None, until: Optional[str] = None, intention_id: Optional[int] = None,
+                 batch_size: int = ROW_GROUP_SIZE) -> Iterator[List[tuple]]:
+    """Export rows in EXPORT_COLUMNS order, `batch_size` at a time, oldest first."""
+    conn = _connect(db_path)
+    try:
+        existing = {row[1] for row in conn.execute('PRAGMA table_info(intention_schedules)')}
+        # Older databases may lack columns that are added on first use
+        select = ', '.join(expr if expr.startswith('i.') or expr[2:] in existing else 'NULL'
+                           for _, expr, _ in EXPORT_COLUMNS)
+        query = f'SELECT {select} FROM intention_schedules s LEFT JOIN intentions i ON i.id = s.intention_id WHERE 1 = 1'
+        params: List[Any] = []
+        if since:
+            query += ' AND s.created_at >= ?'
+            params.append(time_bound(since))
+        if until:
+            query += ' AND s.created_at < ?'
+            params.append(time_bound(until))
+        if intention_id is not None:
+            query += ' AND s.intention_id = ?'
+            params.append(intention_id)
+        query += ' ORDER BY s.created_at, s.id'
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def iter_csv(batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _, _ in EXPORT_COLUMNS])
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise RuntimeError('Parquet and Arrow exports require pyarrow (pip install pyarrow).')
+
+
+def _arrow_schema(pa):
+    return pa.schema([(name, getattr(pa, type_name)()) for name, _, type_name in EXPORT_COLUMNS])
+
+
+def _record_batch(pa, schema, rows: List[tuple]):
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands out what was written so far, for streaming a writer's output."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_parquet(batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    pa = _require_pyarrow()
+    import pyarrow.parquet as pq
+    schema = _arrow_schema(pa)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for rows in batches:
+            # One row group per batch; its bytes can leave as soon as it is written
+            writer.write_table(pa.Table.from_batches([_record_batch(pa, schema, rows)]), row_group_size=len(rows))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_arrow(batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    pa = _require_pyarrow()
+    schema = _arrow_schema(pa)
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for rows in batches:
+            writer.write_batch(_record_batch(pa, schema, rows))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_stream(db_path: str, fmt: str = 'csv', since: Optional[str] = None, until: Optional[str] = None,
+                  intention_id: Optional[int] = None, batch_size: int = ROW_GROUP_SIZE) -> Iterator[bytes]:
+    """The export as a stream of byte chunks. Raises ValueError for an unknown format or bad time bound."""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+    if fmt != 'csv':
+        _require_pyarrow()
+    # Validate the bounds before the first byte is sent
+    time_bound(since)
+    time_bound(until)
+    batches = iter_batches(db_path, since, until, intention_id, batch_size)
+    return {'csv': iter_csv, 'parquet': iter_parquet, 'arrow': iter_arrow}[fmt](batches)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Export start-magic history (schedules joined with intentions).')
+    parser.add_argument('--db', required=True, help='Plugin database (fincompass.db)')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--since', help='Only runs created at or after this ISO date/time (UTC)')
+    parser.add_argument('--until', help='Only runs created before this ISO date/time (UTC)')
+    parser.add_argument('--intention-id', type=int)
+    parser.add_argument('--batch-size', type=int, default=ROW_GROUP_SIZE, help='Rows per chunk / row group')
+    parser.add_argument('--output', help='Output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    try:
+        chunks = export_stream(args.db, args.format, args.since, args.until, args.intention_id, args.batch_size)
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+    except (RuntimeError, ValueError, OSError, sqlite3.Error) as e:
+        print(f"[FinCompass] Export failed: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+JSON responses for the large list endpoints (catalogs, cases, providers,
+analyze-complete results).
+
+Bodies are serialized with orjson when it is installed (several times faster
+than the stdlib encoder behind jsonify) and with a compact json.dumps
+otherwise. Bodies of at least FINCOMPASS_COMPRESS_MIN_BYTES (default 1400,
+about one TCP segment) are compressed with brotli or gzip, whichever the
+client prefers and is available; smaller ones are not worth the CPU.
+
+Large result lists can also be streamed as NDJSON: one JSON document per
+line, the envelope first, then one line per item. The stream is
+gzip-compressed incrementally when the client accepts it, so neither the
+body nor its compressed form is ever held in memory as a whole.
+"""
+import gzip
+import json
+import os
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from flask import current_app, request, stream_with_context
+
+from .static_assets import brotli, parse_accept_encoding
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Dynamic bodies are compressed once per response, so favour speed over ratio
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+# Items serialized per chunk of an NDJSON stream
+NDJSON_CHUNK = 500
+
+
+def _min_compress_bytes() -> int:
+    try:
+        return int(os.environ.get('FINCOMPASS_COMPRESS_MIN_BYTES', 1400))
+    except ValueError:
+        return 1400
+
+
+COMPRESS_MIN_BYTES = _min_compress_bytes()
+
+
+def _default(obj: Any) -> Any:
+    """Fallback for objects neither encoder knows (host domain objects, datetimes, ...)."""
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    if hasattr(obj, '__dict__'):
+        return vars(obj)
+    return str(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON of `obj`."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _encoding_for(accept_encoding: str, streaming: bool = False) -> Optional[str]:
+    accepted = parse_accept_encoding(accept_encoding)
+    # Streams are only gzip-compressed: zlib can flush a valid gzip stream chunk by chunk
+    for encoding in (('gzip',) if streaming else ('br', 'gzip')):
+        if encoding == 'br' and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def _compress(encoding: str, body: bytes) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def json_response(payload: Any, status: int = 200, headers: Optional[Dict[str, str]] = None):
+    """A JSON response for `payload`, compressed when it is large and the client accepts it."""
+    body = dumps(payload)
+    headers = dict(headers or {})
+    if len(body) >= COMPRESS_MIN_BYTES:
+        headers['Vary'] = 'Accept-Encoding'
+        encoding = _encoding_for(request.headers.get('Accept-Encoding', ''))
+        if encoding:
+            body = _compress(encoding, body)
+            headers['Content-Encoding'] = encoding
+    return current_app.response_class(body, status=status, mimetype='application/json', headers=headers)
+
+
+def wants_ndjson() -> bool:
+    """True if the request asks for NDJSON (?format=ndjson or Accept: application/x-ndjson)."""
+    return request.args.get('format', '').lower() == 'ndjson' or NDJSON_MIMETYPE in request.headers.get('Accept', '')
+
+
+def iter_ndjson(envelope: Dict[str, Any], items: Iterable[Any]) -> Iterator[bytes]:
+    """NDJSON lines: the envelope, then one line per item, NDJSON_CHUNK items per yielded chunk."""
+    yield dumps(envelope) + b'\n'
+    chunk = []
+    for item in items:
+        chunk.append(dumps(item))
+        if len(chunk) >= NDJSON_CHUNK:
+            yield b'\n'.join(chunk) + b'\n'
+            chunk = []
+    if chunk:
+        yield b'\n'.join(chunk) + b'\n'
+
+
+def _gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        # Sync-flush so every chunk reaches the client as soon as it is produced
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def ndjson_response(envelope: Dict[str, Any], items: Iterable[Any], status: int = 200):
+    """Stream `envelope` and `items` as NDJSON, gzip-compressed when the client accepts it."""
+    chunks = iter_ndjson(envelope, items)
+    headers = {'Vary': 'Accept-Encoding'}
+    if _encoding_for(request.headers.get('Accept-Encoding', ''), streaming=True):
+        chunks = _gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return current_app.response_class(stream_with_context(chunks), status=status, mimetype=NDJSON_MIMETYPE, headers=headers)
@@ -0,0 +1,144 @@
+"""
+Client for the remote FinCompass server API.
+
+One pooled requests.Session is kept per server URL, so repeated and concurrent
+calls (batch start-magic, schedule posting) reuse keep-alive connections
+instead of opening a new connection per request.
+
+Every call is paced by the shared rate limiter (rate_limit.py) per server
+URL and, where the call concerns one exchange, per exchange_id. A 429 answer
+slows the buckets down (honouring Retry-After) and the call is retried while
+its wait deadline allows.
+
+Every request also goes through the server's circuit breaker
+(circuit_breaker.py): while the server is failing or slow, calls fail at
+once with CircuitOpen instead of each holding a worker until its timeout.
+"""
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .circuit_breaker import breakers
+from .host import requests
+from .rate_limit import limiter, parse_retry_after
+from .tracing import tracer
+
+DEFAULT_TIMEOUT = 15
+POOL_SIZE = 32
+MAX_ATTEMPTS = 4
+
+_sessions: Dict[str, Any] = {}
+_sessions_lock = threading.Lock()
+
+
+def session_for(base_url: str):
+    """Shared, connection-pooled session for a server URL."""
+    session = _sessions.get(base_url)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(base_url)
+            if session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _sessions[base_url] = session
+    return session
+
+
+class FinCompassClient:
+    def __init__(self, base_url: str, api_key: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT, exchange_id: Optional[str] = None,
+                 wait_timeout: Optional[float] = None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+        # Exchange the client's schedule posts are paced under
+        self.exchange_id = exchange_id
+        self.wait_timeout = limiter.wait if wait_timeout is None else wait_timeout
+        self.session = session_for(self.base_url)
+
+    @classmethod
+    def for_server(cls, server: Dict[str, Any], **kwargs) -> 'FinCompassClient':
+        """Client for a row of the servers table."""
+        return cls(server['url'], server.get('api_key'), **kwargs)
+
+    def _headers(self) -> Dict[str, str]:
+        return {'X-API-KEY': self.api_key} if self.api_key else {}
+
+    def _request(self, method: str, path: str, exchange_id: Optional[str] = None, **kwargs):
+        """
+        Send a rate-limited request; retries 429 answers while the wait deadline allows and returns the last response.
+        Raises RateLimitTimeout when no request slot is free before the deadline, CircuitOpen when the server's breaker refuses the call.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        kwargs.setdefault('timeout', self.timeout)
+        breaker = breakers.get(self.base_url)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            limiter.acquire(self.base_url, exchange_id, deadline)
+            started = breaker.acquire() if breaker else None
+            try:
+                resp = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            except Exception:
+                if breaker:
+                    breaker.release(started, failed=True)
+                raise
+            if breaker:
+                breaker.release(started, failed=resp.status_code >= 500)
+            if resp.status_code != 429:
+                limiter.succeeded(self.base_url, exchange_id)
+                return resp
+            retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+            limiter.throttled(self.base_url, exchange_id, retry_after)
+            tracer.set(throttled_attempts=attempt)
+            if attempt < MAX_ATTEMPTS:
+                # Hand a streamed connection back to the pool before retrying
+                resp.close()
+        return resp
+
+    def get_providers(self):
+        """GET the server's providers; returns the response."""
+        with tracer.span('remote.get_providers'):
+            resp = self._request('GET', '/api/v1/providers/', headers=self._headers())
+            tracer.set(status_code=resp.status_code)
+            return resp
+
+    def get_symbols(self, exchange_id: str, trading_type: str = 'spot', timeout: float = 20, stream: bool = False):
+        """GET the symbols of an exchange; returns the response (with stream, its body is not read yet, see symbol_stream.py)."""
+        with tracer.span('remote.get_symbols', exchange_id=exchange_id, stream=stream):
+            resp = self._request('GET', f"/api/v1/symbols/exchange/{exchange_id}", exchange_id, params={'trading_type': trading_type},
+                                 headers={'accept': 'application/json'}, timeout=timeout, stream=stream)
+            tracer.set(status_code=resp.status_code)
+            if not stream:
+                tracer.set(bytes=len(resp.content))
+            return resp
+
+    def get_markets(self, exchange_id: str, timeout: float = 20):
+        """GET the trading constraints (limits, precision, tradability) of an exchange's markets; returns the response."""
+        with tracer.span('remote.get_markets', exchange_id=exchange_id):
+            resp = self._request('GET', f"/api/v1/markets/exchange/{exchange_id}", exchange_id, headers={'accept': 'application/json'},
+                                 timeout=timeout)
+            tracer.set(status_code=resp.status_code, bytes=len(resp.content))
+            return resp
+
+    def get_schedule(self, schedule_id) -> Optional[Dict[str, Any]]:
+        """GET one posted schedule (with its execution, once the server has run it); None if the server does not know it."""
+        with tracer.span('remote.get_schedule', schedule_id=schedule_id):
+            resp = self._request('GET', f'/api/v1/schedules/{schedule_id}', self.exchange_id, headers=self._headers())
+            tracer.set(status_code=resp.status_code)
+            if resp.status_code == 404:
+                return None
+            resp.raise_for_status()
+            return resp.json()
+
+    def post_schedule(self, payload: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """POST one schedule; returns the created schedule (including its 'id')."""
+        headers = self._headers()
+        if idempotency_key:
+            # Lets the server drop a schedule it already created when a post is retried
+            headers['Idempotency-Key'] = idempotency_key
+        with tracer.span('remote.post_schedule', side=payload.get('side'), symbol=payload.get('symbol')):
+            resp = self._request('POST', '/api/v1/schedules/', self.exchange_id, json=payload, headers=headers)
+            resp.raise_for_status()
+            data = resp.json()
+            tracer.set(schedule_id=data.get('id'))
+            return data
@@ -0,0 +1,40 @@
+import { API_BASE } from './api';
+
+// One EventSource per page, shared by every component that listens.
+// Handlers get the parsed delta; 'resync' means events were missed and lists should be refetched once.
+const handlers = {};
+let source = null;
+
+function connect() {
+  if (source || typeof EventSource === 'undefined') return;
+  source = new EventSource(`${API_BASE}/events`);
+  Object.keys(handlers).forEach(listen);
+}
+
+function listen(type) {
+  source.addEventListener(type, (event) => {
+    const data = event.data ? JSON.parse(event.data) : {};
+    (handlers[type] || []).forEach((handler) => handler(data));
+  });
+}
+
+export function eventsSupported() {
+  return typeof EventSource !== 'undefined';
+}
+
+// Subscribe to event types ({ 'case.selected': fn, ... }); returns a function that unsubscribes.
+export function onEvents(subscriptions) {
+  connect();
+  Object.entries(subscriptions).forEach(([type, handler]) => {
+    if (!handlers[type]) {
+      handlers[type] = [];
+      if (source) listen(type);
+    }
+    handlers[type].push(handler);
+  });
+  return () => {
+    Object.entries(subscriptions).forEach(([type, handler]) => {
+      handlers[type] = (handlers[type] || []).filter((h) => h !== handler);
+    });
+  };
+}
@@ -0,0 +1,12 @@
+"""
+Lazily imported host-app (AetherOnePy) and third-party modules.
+
+These are only imported the first time one of their attributes is used, so
+registering the plugin does not pay for them (see startup.py).
+"""
+from .startup import lazy_module
+
+requests = lazy_module('requests')
+ao_domains = lazy_module('domains.aetherOneDomains')
+analyze_service = lazy_module('services.analyzeService')
+hotbits_service = lazy_module('services.hotbitsService')
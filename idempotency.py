@@ -0,0 +1,140 @@
+"""
+Idempotency-Key support for endpoints that must not run twice.
+
+A request sent with an `Idempotency-Key` header claims the key in the plugin
+DB (idempotency_keys) before the endpoint runs:
+
+    - a repeated key gets the stored response back immediately, marked with
+      `Idempotent-Replayed: true`
+    - a concurrent duplicate waits for the in-flight run and then gets its
+      response, instead of starting a second pipeline
+    - reusing a key with a different request body is rejected with 422
+
+Successful and client-error (4xx) responses are kept for IDEMPOTENCY_TTL
+seconds. Server errors release the key so a retry runs again, unless the
+endpoint marked the response with keep_response(): a run that failed after it
+had already posted something (e.g. a buy whose sell post failed) is replayed
+like a completed one, since running it again would post a second buy. An in-flight
+claim is a lease: if the process running it dies, the key becomes claimable
+once IN_FLIGHT_TIMEOUT has passed.
+"""
+import functools
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from flask import current_app, g, jsonify, make_response, request
+
+from .tracing import tracer
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+IDEMPOTENCY_TTL = 24 * 60 * 60
+# Longest a run may hold its key before it is considered abandoned
+IN_FLIGHT_TIMEOUT = 10 * 60
+# How long a duplicate waits for the in-flight run before answering 409
+WAIT_TIMEOUT = 120
+POLL_INTERVAL = 0.2
+MAX_KEY_LENGTH = 255
+
+
+def keep_response() -> None:
+    """Store the current request's response for its key even if it is a server error (the run had side effects)."""
+    g.fincompass_idempotency_keep = True
+
+
+def request_fingerprint(body: Any) -> str:
+    return hashlib.sha256(json.dumps(body, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')).hexdigest()
+
+
+class IdempotencyStore:
+    """Claims, waits on and completes idempotency keys kept in FinCompassDatabase."""
+
+    def __init__(self, db, ttl: float = IDEMPOTENCY_TTL, in_flight_timeout: float = IN_FLIGHT_TIMEOUT, wait_timeout: float = WAIT_TIMEOUT):
+        self.db = db
+        self.ttl = ttl
+        self.in_flight_timeout = in_flight_timeout
+        self.wait_timeout = wait_timeout
+        # (scope, key) -> Event set when the run in this process finishes; other processes poll the DB
+        self._running: Dict[tuple, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, scope: str, key: str, request_hash: str) -> Optional[Dict[str, Any]]:
+        """None if this caller now owns the key, else the stored entry (completed, or in flight past the wait timeout)."""
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            with self._lock:
+                now = time.time()
+                entry = self.db.claim_idempotency_key(scope, key, request_hash, now, now + self.in_flight_timeout)
+                if entry is None:
+                    self._running[(scope, key)] = threading.Event()
+                    return None
+                done = self._running.get((scope, key))
+            if entry['request_hash'] != request_hash or entry['status'] == 'completed':
+                return entry
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return entry
+            if done is not None:
+                done.wait(remaining)
+            else:
+                time.sleep(min(POLL_INTERVAL, remaining))
+
+    def complete(self, scope: str, key: str, status_code: int, body: str, keep: bool = False) -> None:
+        try:
+            if status_code < 500 or keep:
+                self.db.complete_idempotency_key(scope, key, status_code, body, time.time() + self.ttl)
+            else:
+                self.db.release_idempotency_key(scope, key)
+        finally:
+            self._finish(scope, key)
+
+    def release(self, scope: str, key: str) -> None:
+        try:
+            self.db.release_idempotency_key(scope, key)
+        finally:
+            self._finish(scope, key)
+
+    def _finish(self, scope: str, key: str) -> None:
+        with self._lock:
+            done = self._running.pop((scope, key), None)
+        if done is not None:
+            done.set()
+
+
+def idempotent(store, scope: str):
+    """
+    Decorator for a JSON endpoint: honour the Idempotency-Key header using `store`
+    (an IdempotencyStore, or a Lazy resolving to one). Requests without the header run as before.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER, '').strip()
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({'status': 'error', 'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters.'}), 400
+            request_hash = request_fingerprint(request.get_json(silent=True))
+            tracer.set(idempotency_key=key)
+            with tracer.span('idempotency.claim'):
+                entry = store.claim(scope, key, request_hash)
+            if entry is not None:
+                if entry['request_hash'] != request_hash:
+                    return jsonify({'status': 'error', 'error': f'{IDEMPOTENCY_HEADER} was already used for a different request.'}), 422
+                if entry['status'] != 'completed':
+                    return jsonify({'status': 'error', 'error': 'A request with this Idempotency-Key is still in progress.'}), 409
+                tracer.set(idempotent_replay=True)
+                return current_app.response_class(entry['response'], status=entry['status_code'], mimetype='application/json',
+                                                  headers={REPLAYED_HEADER: 'true'})
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                store.release(scope, key)
+                raise
+            store.complete(scope, key, response.status_code, response.get_data(as_text=True), g.pop('fincompass_idempotency_keep', False))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,649 @@
+"""
+Start-magic pipeline shared by /api/start-magic and /api/start-magic/batch.
+
+One run creates an AetherOnePy session and analysis for an intention/case,
+analyzes the catalog's rates, picks the highest-valued symbol, derives buy/sell
+times and posts a buy and a linked sell schedule to the FinCompass server.
+An intention with target_servers gets the same analysis result posted to
+each of those servers concurrently (async_client.py); the outcome per server is stored in
+schedule_targets. An intention with local_sell_timing only gets its buy
+posted; the sell is stored as a sell timer and posted later by the
+SellScheduler (sell_scheduler.py). With the outbox enabled, a target whose
+circuit breaker is open gets its posts queued (outbox.py) instead of failing.
+Each target's buy payload is first checked and rounded against its
+exchange's cached constraints (exchange_constraints.py); a target that fails
+them is failed locally, without a post.
+A batch resolves all of its items in one query, loads the catalog's rates and
+builds the HotbitsService once, then runs the items on a worker pool.
+
+Analysis results are streamed once, in chunks, into the host DAO while a
+top-K heap ranks them by their energetic value; only the results a response
+actually returns are kept, and only those are converted with to_dict().
+`response_detail` selects what is returned:
+
+    none   the schedules only (default)
+    top    additionally the top_k results, highest first
+    full   additionally every result of the catalog
+"""
+import asyncio
+import contextlib
+import contextvars
+import datetime
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .async_client import AsyncFinCompassClient, run_sync
+from .circuit_breaker import CircuitOpen
+from .exchange_constraints import ConstraintViolation, apply_constraints
+from .fincompass_client import FinCompassClient
+from .host import ao_domains, hotbits_service
+from .parallel_analysis import TopK, analyze_rates
+from .rate_limit import RateLimitTimeout
+from .symbol_index import filter_rates, has_universe_filters, index_for_catalog
+from .tracing import tracer
+
+DEFAULT_BATCH_WORKERS = 4
+MAX_BATCH_WORKERS = 16
+MAX_BATCH_ITEMS = 500
+RESPONSE_DETAILS = ('none', 'top', 'full')
+DEFAULT_TOP_K = 5
+MAX_TOP_K = 100
+# Results handed to insert_rates_for_analysis per call
+INSERT_CHUNK_SIZE = 1000
+
+
+class MagicError(Exception):
+    """
+    A start-magic failure with the HTTP status the endpoint should answer with.
+    buy_schedule_ids lists the buys the run had already posted (e.g. before its sell post failed); running it
+    again would post them a second time.
+    """
+
+    def __init__(self, message: str, status_code: int = 500, buy_schedule_ids: Optional[List[Any]] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.buy_schedule_ids = buy_schedule_ids or []
+
+    @property
+    def buy_schedule_id(self):
+        """The posted buy of a failed schedule pair, if any."""
+        return self.buy_schedule_ids[0] if self.buy_schedule_ids else None
+
+
+class ServerUnavailable(MagicError):
+    """A post refused by the server's circuit breaker; buy_schedule_id is set if the buy had already been posted."""
+
+    def __init__(self, message: str, retry_after: float, buy_schedule_id=None):
+        super().__init__(message, 503, [buy_schedule_id] if buy_schedule_id is not None else None)
+        self.retry_after = retry_after
+
+
+class DummyMain:
+    def emitMessage(self, *args, **kwargs):
+        pass
+
+
+class LockedHotbits:
+    """Serializes access to one HotbitsService shared by concurrent analyses."""
+
+    def __init__(self, hotbits):
+        self._hotbits = hotbits
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._hotbits, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return locked
+
+
+def create_hotbits(settings_db):
+    """HotbitsService reading from the host's hotbits folder."""
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..'))
+    return hotbits_service.HotbitsService(hotbits_service.HotbitsSource.WEBCAM, os.path.join(project_root, "hotbits"), settings_db, DummyMain())
+
+
+def resolve_target(db, provider_id: int, catalog_id: int) -> Dict[str, Any]:
+    """
+    Resolve the provider, catalog and selected server a run posts to.
+    Raises MagicError if any of them is missing or the server has no API key.
+    """
+    plugin_provider = db.get_provider_by_id(provider_id)
+    if not plugin_provider:
+        raise MagicError('Provider not found.', 404)
+    plugin_catalog = db.get_catalog_by_id(catalog_id)
+    if not plugin_catalog:
+        raise MagicError('Catalog not found.', 404)
+    selected_server = db.get_selected_server()
+    if not selected_server:
+        raise MagicError('Provider or server URL not found in database.')
+    provider = db.get_provider_by_server_and_provider_id(selected_server['id'], plugin_provider['server_provider_id'])
+    if not provider or not provider.get('server_url'):
+        raise MagicError('Provider or server URL not found in database.')
+    api_key = selected_server.get('api_key')
+    if not api_key:
+        raise MagicError('No API key set for the selected server.')
+    return {
+        'server_id': selected_server['id'],
+        'server_url': provider['server_url'],
+        'exchange_id': provider.get('exchange_id'),
+        'server_provider_id': provider['server_provider_id'],
+        'aetherone_catalog_id': plugin_catalog['aetherone_catalog_id'],
+        'client': FinCompassClient(provider['server_url'], api_key, exchange_id=provider.get('exchange_id')),
+    }
+
+
+def parse_server_ids(value: Any) -> List[int]:
+    """Distinct server ids, in order, from a list or a comma/whitespace separated string; raises MagicError (400) on non-integers."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.replace(',', ' ').split()
+    ids: List[int] = []
+    for entry in value:
+        try:
+            server_id = int(entry)
+        except (TypeError, ValueError):
+            raise MagicError(f'Invalid server id: {entry!r}.', 400)
+        if server_id not in ids:
+            ids.append(server_id)
+    return ids
+
+
+def format_server_ids(value: Any) -> Optional[str]:
+    """Stored form of target_servers ('1,3'); None stays None so updates can leave the field unchanged."""
+    if value is None:
+        return None
+    return ','.join(str(server_id) for server_id in parse_server_ids(value))
+
+
+def resolve_server_targets(db, target: Dict[str, Any], intention: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    The servers a run posts to: the intention's target_servers, each with its provider for the target's exchange,
+    or just `target` (the selected server). Servers that cannot be posted to carry an 'error' instead of a client.
+    """
+    server_ids = parse_server_ids(intention.get('target_servers'))
+    if not server_ids:
+        return [target]
+    rows = db.get_server_targets(server_ids, target.get('exchange_id'))
+    targets = []
+    for server_id in server_ids:
+        row = rows.get(server_id)
+        server_target = {'server_id': server_id, 'server_url': row['server_url'] if row else None}
+        if row is None:
+            server_target['error'] = 'Server not found.'
+        elif not row['api_key']:
+            server_target['error'] = 'No API key set for this server.'
+        elif not target.get('exchange_id'):
+            server_target['error'] = 'The selected provider has no exchange_id, so it cannot be matched on other servers.'
+        elif not row['server_provider_id']:
+            server_target['error'] = f"No provider for exchange '{target['exchange_id']}' on this server."
+        else:
+            server_target.update(server_provider_id=row['server_provider_id'], exchange_id=row['exchange_id'],
+                                 client=FinCompassClient(row['server_url'], row['api_key'], exchange_id=row['exchange_id']))
+        targets.append(server_target)
+    return targets
+
+
+def parse_response_detail(response_detail: Optional[str], top_k=None) -> Tuple[str, int]:
+    """Validate the response_detail/top_k request options; raises MagicError (400) on bad values."""
+    response_detail = (response_detail or 'none').lower()
+    if response_detail not in RESPONSE_DETAILS:
+        raise MagicError(f"response_detail must be one of: {', '.join(RESPONSE_DETAILS)}.", 400)
+    try:
+        top_k = int(top_k) if top_k is not None else DEFAULT_TOP_K
+    except (TypeError, ValueError):
+        raise MagicError('top_k must be an integer.', 400)
+    if not 1 <= top_k <= MAX_TOP_K:
+        raise MagicError(f'top_k must be between 1 and {MAX_TOP_K}.', 400)
+    return response_detail, top_k
+
+
+def parse_max_workers(max_workers) -> int:
+    """Validate the batch max_workers option (default DEFAULT_BATCH_WORKERS); raises MagicError (400) on bad values."""
+    if max_workers is None:
+        return DEFAULT_BATCH_WORKERS
+    if isinstance(max_workers, bool):
+        raise MagicError('max_workers must be an integer.', 400)
+    try:
+        max_workers = int(max_workers)
+    except (TypeError, ValueError):
+        raise MagicError('max_workers must be an integer.', 400)
+    if not 1 <= max_workers <= MAX_BATCH_WORKERS:
+        raise MagicError(f'max_workers must be between 1 and {MAX_BATCH_WORKERS}.', 400)
+    return max_workers
+
+
+def _chunks(iterable, size: int):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_analysis(case_dao, intention: Dict[str, Any], aetherone_case_id: int, aetherone_catalog_id: int, rates_list: list, hotbits,
+                 dao_lock=None, top_k: int = 1, keep_results: bool = False) -> Dict[str, Any]:
+    """
+    Create a session and analysis in AetherOnePy, analyze `rates_list` and store the results.
+    Returns {'top': the top_k enhanced rates, highest first, 'count': number of results,
+             'results': all enhanced rates (None unless keep_results), 'session_id', 'analysis_id'}.
+    """
+    lock = dao_lock or contextlib.nullcontext()
+    with tracer.span('create_session_and_analysis'):
+        with lock:
+            session = ao_domains.Session(intention['intention'], intention.get('description', ''), aetherone_case_id)
+            case_dao.insert_session(session)  # main DB, sets session.id
+            analysis = ao_domains.Analysis('', session.id)
+            analysis.catalogId = aetherone_catalog_id
+            case_dao.insert_analysis(analysis)  # main DB, sets analysis.id
+            check_gv = case_dao.get_setting('analysisAlwaysCheckGV')
+            advanced = case_dao.get_setting('analysisAdvanced')
+        tracer.set(session_id=session.id, analysis_id=analysis.id)
+    with tracer.span('analyze', rates=len(rates_list)):
+        enhanced_rates = analyze_rates(analysis.id, rates_list, hotbits, check_gv, advanced)
+    ranking = TopK(top_k)
+    with tracer.span('insert_rates_for_analysis'):
+        # One pass: every result goes to the DAO in chunks and through the top-K heap
+        for chunk in _chunks(ranking.stream(enhanced_rates), INSERT_CHUNK_SIZE):
+            with lock:
+                case_dao.insert_rates_for_analysis(chunk)  # main DB
+        tracer.set(results=len(ranking))
+    return {'top': ranking.items(), 'count': len(ranking), 'results': enhanced_rates if keep_results else None,
+            'session_id': session.id, 'analysis_id': analysis.id}
+
+
+def find_highest(ranked: list) -> Tuple[str, Dict[str, Any]]:
+    """The symbol of the first (highest-valued) result in `ranked`, and its result dict."""
+    highest = ranked[0].to_dict() if ranked else None
+    if not highest:
+        raise MagicError('No rates found in analysis.')
+    symbol = highest.get('signature') or highest.get('symbol')
+    if not symbol:
+        raise MagicError('No symbol found in highest rate.')
+    return symbol, highest
+
+
+def schedule_times(intention: Dict[str, Any], symbol: str, enhanced_rates: list, hotbits, now: Optional[datetime.datetime] = None) -> Tuple[str, str, int, Optional[float]]:
+    """
+    Buy time (now), sell time, hold minutes and timing score, using dynamic timing if the intention asks for it
+    (the timing score is None otherwise).
+    """
+    now = now or datetime.datetime.utcnow()
+    hold_minutes = intention.get('hold_minutes', 0) or 0
+    buy_time = now.isoformat(timespec='seconds') + 'Z'
+    if intention.get('dynamic_sell_timing', False):
+        from .timing_analysis import analyze_timing_for_symbol
+        min_hold = intention.get('min_hold_minutes', 30)
+        max_hold = intention.get('max_hold_minutes', 1440)  # Default 1 day
+        timing_analysis = analyze_timing_for_symbol(symbol, min_hold, max_hold, enhanced_rates, hotbits)
+        optimal_hold_minutes = timing_analysis.get('optimal_hold_minutes', hold_minutes)
+        timing_score = timing_analysis.get('timing_score')
+        tracer.event('debug', 'dynamic timing analysis', timing=lambda: timing_analysis)
+    else:
+        optimal_hold_minutes = hold_minutes
+        timing_score = None
+    sell_time = (now + datetime.timedelta(minutes=optimal_hold_minutes)).isoformat(timespec='seconds') + 'Z'
+    return buy_time, sell_time, optimal_hold_minutes, timing_score
+
+
+def build_buy_payload(intention: Dict[str, Any], server_provider_id: str, symbol: str, buy_time: str) -> Dict[str, Any]:
+    return {
+        'amount': str(intention.get('amount', '0')),
+        'is_active': True,
+        'name': f"{intention['intention'][:20].strip()} {symbol}",
+        'order_type': 'market',
+        'provider_id': server_provider_id,
+        'recurrence_type': 'none',
+        'scheduled_time': buy_time,  # use buy_time as the scheduled time
+        'sell_all': False,
+        'side': 'buy',
+        'symbol': symbol,
+        'social_key': '',  # TODO: fetch from SocialPlugin
+        'stop_loss_percentage': intention.get('stop_loss_percentage', 0),
+        'take_profit_percentage': intention.get('take_profit_percentage', 0)
+    }
+
+
+def prepare_buy_payload(intention: Dict[str, Any], server_target: Dict[str, Any], symbol: str, buy_time: str) -> Dict[str, Any]:
+    """The target's buy payload, checked and rounded against its exchange's cached constraints; raises MagicError (400)."""
+    buy_payload = build_buy_payload(intention, server_target['server_provider_id'], symbol, buy_time)
+    try:
+        return apply_constraints(buy_payload, server_target.get('constraint'), server_target.get('exchange_id'))
+    except ConstraintViolation as e:
+        raise MagicError(str(e), 400) from e
+
+
+def build_sell_payload(buy_payload: Dict[str, Any], sell_time: str, buy_schedule_id) -> Dict[str, Any]:
+    sell_payload = buy_payload.copy()
+    sell_payload['side'] = 'sell'
+    sell_payload['scheduled_time'] = sell_time
+    sell_payload['linked_buy_schedule_id'] = buy_schedule_id
+    return sell_payload
+
+
+def post_sell(client: FinCompassClient, buy_payload: Dict[str, Any], sell_time: str, buy_schedule_id, idempotency_key: Optional[str] = None) -> Tuple[Any, Dict[str, Any]]:
+    """Post the sell schedule linked to an already posted buy; returns (sell_id, sell_payload). Raises the client's errors."""
+    sell_payload = build_sell_payload(buy_payload, sell_time, buy_schedule_id)
+    tracer.event('debug', 'sell payload', payload=lambda: sell_payload)
+    sell_schedule_id = client.post_schedule(sell_payload, f'{idempotency_key}:sell' if idempotency_key else None).get('id')
+    return sell_schedule_id, sell_payload
+
+
+def post_schedule_pair(client: FinCompassClient, buy_payload: Dict[str, Any], sell_time: Optional[str], idempotency_key: Optional[str] = None) -> Tuple[Any, Any, Optional[Dict[str, Any]]]:
+    """
+    Post the buy schedule, then the sell schedule linked to it; returns (buy_id, sell_id, sell_payload).
+    Without a sell_time only the buy is posted (sell_id and sell_payload are None).
+    With an idempotency_key, the posts carry '<key>:buy' and '<key>:sell' as their Idempotency-Key.
+    """
+    buy_schedule_id = None
+    try:
+        tracer.event('debug', 'buy payload', payload=lambda: buy_payload)
+        buy_schedule_id = client.post_schedule(buy_payload, f'{idempotency_key}:buy' if idempotency_key else None).get('id')
+        sell_schedule_id, sell_payload = None, None
+        if sell_time is not None:
+            sell_schedule_id, sell_payload = post_sell(client, buy_payload, sell_time, buy_schedule_id, idempotency_key)
+    except Exception as e:
+        raise _post_error(e, buy_schedule_id) from e
+    return buy_schedule_id, sell_schedule_id, sell_payload
+
+
+async def post_schedule_pair_async(client: AsyncFinCompassClient, buy_payload: Dict[str, Any], sell_time: Optional[str],
+                                   idempotency_key: Optional[str] = None) -> Tuple[Any, Any, Optional[Dict[str, Any]]]:
+    """post_schedule_pair() on the async client."""
+    buy_schedule_id = None
+    try:
+        tracer.event('debug', 'buy payload', payload=lambda: buy_payload)
+        buy_schedule_id = (await client.post_schedule(buy_payload, f'{idempotency_key}:buy' if idempotency_key else None)).get('id')
+        sell_schedule_id, sell_payload = None, None
+        if sell_time is not None:
+            sell_payload = build_sell_payload(buy_payload, sell_time, buy_schedule_id)
+            tracer.event('debug', 'sell payload', payload=lambda: sell_payload)
+            sell_schedule_id = (await client.post_schedule(sell_payload, f'{idempotency_key}:sell' if idempotency_key else None)).get('id')
+    except Exception as e:
+        raise _post_error(e, buy_schedule_id) from e
+    return buy_schedule_id, sell_schedule_id, sell_payload
+
+
+def _post_error(e: Exception, buy_schedule_id) -> MagicError:
+    """The MagicError a failed schedule post is reported as."""
+    if isinstance(e, CircuitOpen):
+        return ServerUnavailable(f'Remote server is unavailable: {e}', e.retry_after, buy_schedule_id)
+    posted = [buy_schedule_id] if buy_schedule_id is not None else None
+    if isinstance(e, RateLimitTimeout):
+        return MagicError(f'Remote server is rate limited: {e}', 503, posted)
+    return MagicError(f'Failed to post schedule to remote server: {e}', 502, posted)
+
+
+def post_to_targets(targets: List[Dict[str, Any]], intention: Dict[str, Any], symbol: str, buy_time: str, sell_time: Optional[str],
+                    idempotency_key: Optional[str] = None, queue_unavailable: bool = False) -> List[Dict[str, Any]]:
+    """
+    Post the buy/sell pair of one analysis result to every target server, concurrently when there are several
+    (on the shared event loop, see async_client.py).
+    Without a sell_time only the buys are posted, and a target that accepted its buy has status 'holding'.
+    With queue_unavailable, a pair refused by the server's circuit breaker has status 'queued' (to go to the outbox).
+    Returns one outcome per target, in order; a failed target has status 'failed' and its error.
+    """
+    def outcome_for(server_target: Dict[str, Any]) -> Dict[str, Any]:
+        return {'server_id': server_target.get('server_id'), 'server_url': server_target.get('server_url'),
+                'exchange_id': server_target.get('exchange_id')}
+
+    def failed(outcome: Dict[str, Any], buy_payload: Dict[str, Any], e: MagicError) -> Dict[str, Any]:
+        # Locally timed sells need the buy id right away, so only complete pairs are queued
+        if isinstance(e, ServerUnavailable) and queue_unavailable and sell_time is not None:
+            return dict(outcome, status='queued', error=str(e), retry_after=e.retry_after, buy_schedule_id=e.buy_schedule_id,
+                        sell_schedule_id=None, buy_payload=buy_payload, sell_payload=None)
+        # A buy posted before its sell failed stays on the target, so it is never reported as not posted
+        return dict(outcome, status='failed', error=str(e), status_code=e.status_code, buy_schedule_id=e.buy_schedule_id)
+
+    def posted(outcome: Dict[str, Any], buy_payload: Dict[str, Any], result: Tuple[Any, Any, Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+        buy_schedule_id, sell_schedule_id, sell_payload = result
+        return dict(outcome, status='scheduled' if sell_time is not None else 'holding', buy_schedule_id=buy_schedule_id,
+                    sell_schedule_id=sell_schedule_id, buy_payload=buy_payload, sell_payload=sell_payload)
+
+    def post(server_target: Dict[str, Any]) -> Dict[str, Any]:
+        outcome = outcome_for(server_target)
+        if server_target.get('error'):
+            return dict(outcome, status='failed', error=server_target['error'], status_code=400)
+        try:
+            buy_payload = prepare_buy_payload(intention, server_target, symbol, buy_time)
+        except MagicError as e:
+            return dict(outcome, status='failed', error=str(e), status_code=e.status_code)
+        try:
+            with tracer.span('post_target', server_id=server_target.get('server_id')):
+                return posted(outcome, buy_payload, post_schedule_pair(server_target['client'], buy_payload, sell_time, idempotency_key))
+        except MagicError as e:
+            return failed(outcome, buy_payload, e)
+
+    async def post_async(server_target: Dict[str, Any]) -> Dict[str, Any]:
+        outcome = outcome_for(server_target)
+        if server_target.get('error'):
+            return dict(outcome, status='failed', error=server_target['error'], status_code=400)
+        try:
+            buy_payload = prepare_buy_payload(intention, server_target, symbol, buy_time)
+        except MagicError as e:
+            return dict(outcome, status='failed', error=str(e), status_code=e.status_code)
+        client = AsyncFinCompassClient.from_client(server_target['client'])
+        try:
+            with tracer.span('post_target', server_id=server_target.get('server_id')):
+                return posted(outcome, buy_payload, await post_schedule_pair_async(client, buy_payload, sell_time, idempotency_key))
+        except MagicError as e:
+            return failed(outcome, buy_payload, e)
+
+    async def post_all() -> List[Dict[str, Any]]:
+        # Every target has its own rate-limit bucket and breaker, so the posts only wait on their own server
+        return list(await asyncio.gather(*(post_async(server_target) for server_target in targets)))
+
+    if len(targets) == 1:
+        return [post(targets[0])]
+    return run_sync(post_all())
+
+
+def uses_local_sell_timing(intention: Dict[str, Any]) -> bool:
+    """True if the intention's sell is timed locally rather than posted with the buy."""
+    return bool(intention.get('dynamic_sell_timing') and intention.get('local_sell_timing'))
+
+
+def iso_time(timestamp: float) -> str:
+    """ISO 8601 UTC form (as used in schedule payloads) of an epoch timestamp."""
+    return datetime.datetime.utcfromtimestamp(timestamp).isoformat(timespec='seconds') + 'Z'
+
+
+def build_sell_timer(intention: Dict[str, Any], symbol: str, highest: Dict[str, Any], buy_time: str, hold_minutes: int, timing_score: Optional[float],
+                     posted: List[Dict[str, Any]], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    The sell_timers row for a run whose buys were posted without a sell: the sell is due `hold_minutes` after the buy
+    and is first re-evaluated at min_hold_minutes. `posted` are the targets that accepted their buy.
+    """
+    buy_at = datetime.datetime.fromisoformat(buy_time.rstrip('Z')).replace(tzinfo=datetime.timezone.utc).timestamp()
+    min_hold = intention.get('min_hold_minutes') or 0
+    max_hold = max(intention.get('max_hold_minutes') or 0, min_hold)
+    due_at = buy_at + hold_minutes * 60
+    targets = [{'server_id': p.get('server_id'), 'server_url': p.get('server_url'), 'exchange_id': p.get('exchange_id'),
+                'server_provider_id': p['buy_payload']['provider_id'], 'buy_schedule_id': p['buy_schedule_id'],
+                'buy_payload': p['buy_payload'], 'sell_schedule_id': None} for p in posted]
+    return {
+        'intention_id': intention['id'],
+        'symbol': symbol,
+        'energetic_value': highest.get('energetic_value', highest.get('value')),
+        'gv': highest.get('gv'),
+        'buy_at': buy_at,
+        'min_hold_minutes': min_hold,
+        'max_hold_minutes': max_hold,
+        'due_at': due_at,
+        'next_check_at': min(due_at, buy_at + min_hold * 60),
+        'timing_score': timing_score,
+        'targets': json.dumps(targets),
+        'idempotency_key': idempotency_key,
+    }
+
+
+def build_outbox_entry(outcome: Dict[str, Any], sell_time: str, hold_minutes: int, primary: bool, idempotency_key: Optional[str] = None,
+                       max_age: float = 900.0) -> Dict[str, Any]:
+    """The outbox row for a target whose posts were queued; it expires `max_age` seconds from now."""
+    now = time.time()
+    payload = {'buy_payload': outcome['buy_payload'], 'buy_schedule_id': outcome.get('buy_schedule_id'), 'sell_time': sell_time,
+               'hold_minutes': hold_minutes, 'exchange_id': outcome.get('exchange_id')}
+    return {
+        'server_id': outcome.get('server_id'),
+        'server_url': outcome['server_url'],
+        'payload': json.dumps(payload),
+        'idempotency_key': idempotency_key,
+        'is_primary': int(primary),
+        'next_attempt_at': now + max(1.0, outcome.get('retry_after') or 0),
+        'expires_at': now + max_age,
+    }
+
+
+def run_magic(db, case_dao, target: Dict[str, Any], intention: Dict[str, Any], aetherone_case_id: int, rates_list: list, hotbits,
+              dao_lock=None, response_detail: str = 'none', top_k: int = DEFAULT_TOP_K, idempotency_key: Optional[str] = None,
+              sell_scheduler=None, outbox=None) -> Dict[str, Any]:
+    """
+    One full start-magic run for an already resolved intention/case; returns the schedule details,
+    plus 'results' (top_k or all result dicts) when response_detail is 'top' or 'full'.
+    A locally timed sell is handed to `sell_scheduler` (if given; otherwise it waits in the DB for the next scheduler start).
+    With an `outbox`, posts to servers whose circuit breaker is open are queued there instead of failing.
+    """
+    if has_universe_filters(intention):
+        with tracer.span('filter_universe', rates=len(rates_list)):
+            index = index_for_catalog(db, target['aetherone_catalog_id'], rates_list)
+            rates_list = filter_rates(rates_list, intention, index)
+            tracer.set(universe=len(rates_list))
+        if not rates_list:
+            raise MagicError("No rates in the catalog match the intention's universe filters.", 400)
+    analysis = run_analysis(case_dao, intention, aetherone_case_id, target['aetherone_catalog_id'], rates_list, hotbits, dao_lock,
+                            top_k=top_k if response_detail == 'top' else 1, keep_results=response_detail == 'full')
+    ranked = analysis['top']
+    symbol, highest = find_highest(ranked)
+    tracer.set(symbol=symbol, value=highest.get('value'))
+    # The timing model only looks up the chosen symbol, which is always among the ranked results
+    buy_time, sell_time, hold_minutes, timing_score = schedule_times(intention, symbol, ranked, hotbits)
+    tracer.set(buy_time=buy_time, sell_time=sell_time, hold_minutes=hold_minutes)
+
+    local_timing = uses_local_sell_timing(intention)
+    with tracer.span('post_schedules', local_sell_timing=local_timing):
+        server_targets = resolve_server_targets(db, target, intention)
+        # Checked locally before any post, so a schedule the exchange would refuse costs no round trip
+        constraints = db.get_symbol_constraints([t.get('exchange_id') for t in server_targets], symbol)
+        server_targets = [dict(t, constraint=constraints.get(t.get('exchange_id'))) for t in server_targets]
+        posted = post_to_targets(server_targets, intention, symbol, buy_time,
+                                 None if local_timing else sell_time, idempotency_key, queue_unavailable=outbox is not None)
+        succeeded = [p for p in posted if p['status'] != 'failed']
+        tracer.set(targets=len(posted), failed=len(posted) - len(succeeded))
+    if not succeeded:
+        status_codes = {p['status_code'] for p in posted}
+        orphaned = [p['buy_schedule_id'] for p in posted if p.get('buy_schedule_id') is not None]
+        if len(posted) == 1:
+            raise MagicError(posted[0]['error'], posted[0]['status_code'], orphaned)
+        errors = '; '.join(f"server {p['server_id']}: {p['error']}" for p in posted)
+        raise MagicError(f'Failed to post schedule to every target server: {errors}', status_codes.pop() if len(status_codes) == 1 else 502,
+                         orphaned)
+    # The first server that accepted the pair is the schedule's primary one (a queued one only if none did)
+    primary = next((p for p in succeeded if p['status'] != 'queued'), succeeded[0])
+    queued = [build_outbox_entry(p, sell_time, hold_minutes, p is primary, idempotency_key, outbox.max_age)
+              for p in succeeded if p['status'] == 'queued']
+    buy_payload, sell_payload = primary['buy_payload'], primary['sell_payload']
+    buy_schedule_id, sell_schedule_id = primary['buy_schedule_id'], primary['sell_schedule_id']
+    sell_timer = None
+    if local_timing:
+        sell_timer = build_sell_timer(intention, symbol, highest, buy_time, hold_minutes, timing_score, succeeded, idempotency_key)
+
+    # --- PLUGIN DB: Save schedule locally ---
+    schedule_record = db.create_intention_schedule(
+        intention['id'],
+        buy_time,
+        # An open, locally timed position is recorded with its latest possible sell time until the sell is posted
+        iso_time(sell_timer['buy_at'] + sell_timer['max_hold_minutes'] * 60) if sell_timer else sell_time,
+        status='queued' if primary['status'] == 'queued' else ('holding' if sell_timer else 'scheduled'),
+        server_schedule_buy_id=buy_schedule_id,
+        server_schedule_sell_id=sell_schedule_id,
+        symbol=symbol,
+        energetic_value=highest.get('energetic_value', highest.get('value')),
+        gv=highest.get('gv'),
+        hold_minutes=hold_minutes,
+        timing_score=timing_score,
+        session_id=analysis['session_id'],
+        analysis_id=analysis['analysis_id'],
+        targets=posted,
+        sell_timer=sell_timer,
+        outbox=queued
+    )
+    if sell_timer and sell_scheduler is not None:
+        sell_scheduler.add(schedule_record['sell_timer_id'], sell_timer['next_check_at'])
+    outcome = {
+        'symbol': symbol,
+        'value': highest.get('value'),
+        'buy_time': buy_time,
+        'sell_time': sell_time,
+        'hold_minutes': hold_minutes,
+        'buy_schedule_id': buy_schedule_id,
+        'sell_schedule_id': sell_schedule_id,
+        'server_schedule_buy_id': schedule_record.get('server_schedule_buy_id'),
+        'server_schedule_sell_id': schedule_record.get('server_schedule_sell_id'),
+        'buy_payload': buy_payload,
+        'sell_payload': sell_payload,
+        'analyzed_rates': analysis['count'],
+        'targets': [{k: v for k, v in p.items() if k not in ('buy_payload', 'sell_payload')} for p in posted],
+        'sell_timer_id': schedule_record.get('sell_timer_id'),
+        'queued': len(queued),
+    }
+    if response_detail == 'top':
+        outcome['results'] = [highest] + [r.to_dict() for r in ranked[1:]]
+    elif response_detail == 'full':
+        outcome['results'] = [highest if r is ranked[0] else r.to_dict() for r in analysis['results']]
+    return outcome
+
+
+def run_magic_batch(db, case_dao, items: List[Dict[str, Any]], provider_id: int, catalog_id: int, max_workers: int = DEFAULT_BATCH_WORKERS,
+                    response_detail: str = 'none', top_k: int = DEFAULT_TOP_K, idempotency_key: Optional[str] = None,
+                    sell_scheduler=None, outbox=None) -> List[Dict[str, Any]]:
+    """
+    Run start-magic for many {intention_id, case_id} items against one provider catalog.
+    Returns one result per item, in order; failures are reported per item. max_workers is validated by parse_max_workers().
+    With an idempotency_key, item i posts its schedules under '<key>:<i>'.
+    """
+    target = resolve_target(db, provider_id, catalog_id)
+    resolved = db.resolve_magic_items(items)
+    with tracer.span('load_catalog_rates'):
+        rates_list = case_dao.list_rates_from_catalog(target['aetherone_catalog_id'])  # main DB, once per batch
+        tracer.set(rates=len(rates_list))
+    hotbits = LockedHotbits(create_hotbits(db))
+    # The host DAO is not documented as thread-safe; serialize its writes, analyses run in parallel
+    dao_lock = threading.Lock()
+
+    def run_item(entry: Dict[str, Any]) -> Dict[str, Any]:
+        result = {'index': entry['index'], 'intention_id': entry['intention_id'], 'case_id': entry['case_id']}
+        try:
+            with tracer.span('batch_item', index=entry['index']):
+                if not entry['intention']:
+                    raise MagicError('Intention not found.', 404)
+                if not entry['case']:
+                    raise MagicError('Case not found.', 404)
+                outcome = run_magic(db, case_dao, target, entry['intention'], entry['case']['aetherone_case_id'], rates_list, hotbits, dao_lock,
+                                    response_detail, top_k,
+                                    f"{idempotency_key}:{entry['index']}" if idempotency_key else None, sell_scheduler, outbox)
+            result.update(status='success', **outcome)
+        except MagicError as e:
+            result.update(status='error', error=str(e), status_code=e.status_code)
+            if e.buy_schedule_ids:
+                result['buy_schedule_ids'] = e.buy_schedule_ids
+        except Exception as e:
+            result.update(status='error', error=str(e), status_code=500)
+        return result
+
+    workers = max(1, min(max_workers, len(resolved) or 1))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fincompass-magic') as executor:
+        # Each task runs in a copy of the request context so tracing/profiling follow it
+        futures = [executor.submit(contextvars.copy_context().run, run_item, entry) for entry in resolved]
+        return [f.result() for f in futures]
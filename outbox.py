@@ -0,0 +1,185 @@
+"""
+Outbox for schedule posts refused by an open circuit breaker.
+
+With FINCOMPASS_OUTBOX=1, a start-magic post that a server's breaker refuses
+(circuit_breaker.py) is stored in the plugin DB (outbox) instead of failing
+the run; the schedule and its target get status 'queued'. A background
+worker delivers queued posts once the breaker lets calls through again:
+
+    - a pair that was not posted at all is posted with the buy at delivery
+      time and the sell the same hold later, so the position keeps its hold
+    - a pair whose buy was posted before the breaker opened only gets its
+      sell, at the planned time (or at once if that has passed)
+
+Posts keep the run's Idempotency-Key (or 'outbox:<id>'), so a delivery
+retried after a crash is not duplicated; the times are fixed in the entry at
+its first delivery attempt, so every retry sends the same posts under those
+keys. Entries are claimed in the DB before delivery, like sell timers. A
+trade signal goes stale, so entries whose buy was not posted within
+FINCOMPASS_OUTBOX_MAX_AGE seconds (default 900) expire and their target is
+marked failed. A sell whose buy is already on the server closes an open
+position: it never expires and is retried until it is delivered.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .circuit_breaker import OPEN, breakers
+from .fincompass_client import FinCompassClient
+from .magic import MagicError, iso_time, post_schedule_pair, post_sell
+from .tracing import tracer
+
+POLL_INTERVAL = 5.0
+BATCH_SIZE = 100
+DELIVERY_LEASE = 60.0
+MAX_ATTEMPTS = 10
+RETRY_DELAYS = (5.0, 15.0, 30.0, 60.0)
+DEFAULT_MAX_AGE = 900.0
+
+
+def enabled() -> bool:
+    return os.environ.get('FINCOMPASS_OUTBOX', '0').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class Outbox:
+    def __init__(self, db, max_age: float = DEFAULT_MAX_AGE, poll_interval: float = POLL_INTERVAL, clock: Callable[[], float] = time.time):
+        self.db = db
+        self.max_age = max_age
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._wakeup = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.stats = {'delivered': 0, 'retries': 0, 'failed': 0, 'expired': 0}
+
+    @classmethod
+    def from_env(cls, db) -> 'Outbox':
+        try:
+            max_age = float(os.environ.get('FINCOMPASS_OUTBOX_MAX_AGE', DEFAULT_MAX_AGE))
+        except ValueError:
+            max_age = DEFAULT_MAX_AGE
+        return cls(db, max_age)
+
+    def start(self) -> 'Outbox':
+        with self._wakeup:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='fincompass-outbox', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def wake(self) -> None:
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._wakeup:
+                if self._stopping:
+                    return
+                self._wakeup.wait(self.poll_interval)
+                if self._stopping:
+                    return
+            try:
+                self.drain()
+            except Exception as e:
+                print(f"[FinCompass] Outbox delivery failed: {e}")
+
+    def drain(self) -> int:
+        """Deliver the due entries of servers whose breaker lets calls through; returns how many were delivered."""
+        now = self._clock()
+        delivered = 0
+        for entry in self.db.get_due_outbox(now, BATCH_SIZE):
+            if now >= entry['expires_at'] and json.loads(entry['payload'])['buy_schedule_id'] is None:
+                self._give_up(entry, 'expired', f"Not delivered within {self.max_age:.0f}s; the trade signal is stale.")
+                continue
+            breaker = breakers.get(entry['server_url'])
+            if breaker is not None and breaker.state == OPEN:
+                # Not worth a claim; look again when the breaker half-opens
+                self.db.update_outbox(entry['id'], 'pending', next_attempt_at=now + max(1.0, breaker.retry_after()),
+                                      error=entry['error'])
+                continue
+            if not self.db.claim_outbox(entry['id'], now, now + DELIVERY_LEASE):
+                continue
+            delivered += self.deliver(entry)
+        return delivered
+
+    def deliver(self, entry: Dict[str, Any]) -> bool:
+        """Post one queued entry; on failure it is retried later or given up after MAX_ATTEMPTS."""
+        payload = json.loads(entry['payload'])
+        servers = self.db.get_server_targets([entry['server_id']], None) if entry['server_id'] is not None else {}
+        server = servers.get(entry['server_id'])
+        if not server or not server.get('api_key'):
+            self._give_up(entry, 'failed', 'No API key set for this server.')
+            return False
+        client = FinCompassClient(entry['server_url'], server['api_key'], exchange_id=payload.get('exchange_id'))
+        key = entry['idempotency_key'] or f"outbox:{entry['id']}"
+        if payload.get('first_attempt_at') is None:
+            now = self._clock()
+            if payload['buy_schedule_id'] is None:
+                payload['buy_time'] = iso_time(now)
+                payload['sell_time'] = iso_time(now + payload['hold_minutes'] * 60)
+            else:
+                payload['sell_time'] = max(payload['sell_time'], iso_time(now))
+            payload['first_attempt_at'] = now
+            # Stored before posting, so a delivery resumed after a crash sends the same times
+            self.db.update_outbox(entry['id'], 'sending', payload=json.dumps(payload), error=entry['error'])
+        buy_time, sell_time = payload.get('buy_time'), payload['sell_time']
+        try:
+            with tracer.span('outbox.deliver', entry_id=entry['id'], server_id=entry['server_id']):
+                if payload['buy_schedule_id'] is None:
+                    buy_payload = dict(payload['buy_payload'], scheduled_time=buy_time)
+                    buy_schedule_id, sell_schedule_id, _ = post_schedule_pair(client, buy_payload, sell_time, key)
+                else:
+                    buy_schedule_id = payload['buy_schedule_id']
+                    try:
+                        sell_schedule_id, _ = post_sell(client, payload['buy_payload'], sell_time, buy_schedule_id, key)
+                    except Exception as e:
+                        raise MagicError(f'Failed to post sell schedule to remote server: {e}', 502) from e
+        except MagicError as e:
+            if e.buy_schedule_id is not None and payload['buy_schedule_id'] is None:
+                # The buy went through before the sell failed; only the sell is left
+                payload['buy_schedule_id'] = e.buy_schedule_id
+            self._retry(entry, payload, str(e), getattr(e, 'retry_after', None))
+            return False
+
+        self.db.update_outbox(entry['id'], 'sent', attempts=entry['attempts'] + 1, payload=json.dumps(payload))
+        self.db.update_schedule_target(entry['schedule_id'], entry['server_id'], 'scheduled', str(sell_schedule_id),
+                                       server_schedule_buy_id=str(buy_schedule_id))
+        if entry['is_primary']:
+            self.db.update_intention_schedule(entry['schedule_id'], buy_datetime=buy_time, sell_datetime=sell_time, status='scheduled',
+                                              server_schedule_buy_id=str(buy_schedule_id), server_schedule_sell_id=str(sell_schedule_id))
+        self.stats['delivered'] += 1
+        return True
+
+    def _retry(self, entry: Dict[str, Any], payload: Dict[str, Any], error: str, retry_after: Optional[float]) -> None:
+        attempts = entry['attempts'] + 1
+        # A sell whose buy was posted closes an open position, so it is never given up
+        if attempts >= MAX_ATTEMPTS and payload['buy_schedule_id'] is None:
+            self._give_up(entry, 'failed', error)
+            return
+        delay = max(retry_after or 0.0, RETRY_DELAYS[min(attempts, len(RETRY_DELAYS)) - 1])
+        self.db.update_outbox(entry['id'], 'pending', next_attempt_at=self._clock() + delay, attempts=attempts,
+                              payload=json.dumps(payload), error=error)
+        self.stats['retries'] += 1
+
+    def _give_up(self, entry: Dict[str, Any], status: str, error: str) -> None:
+        self.db.update_outbox(entry['id'], status, error=error)
+        self.db.update_schedule_target(entry['schedule_id'], entry['server_id'], 'failed', error=error)
+        if entry['is_primary']:
+            self.db.update_intention_schedule(entry['schedule_id'], status='failed')
+        self.stats[status] += 1
+        print(f"[FinCompass] Outbox entry {entry['id']} for {entry['server_url']} {status}: {error}")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {'running': self._thread is not None, 'max_age_s': self.max_age, 'entries': self.db.count_outbox(), **self.stats}
@@ -0,0 +1,190 @@
+"""
+Sharded analysis of large catalogs over a process pool.
+
+analyze() scores every rate of a catalog serially. For big catalogs the rates
+are split into shards and analyzed in worker processes:
+
+    - each shard gets its own slice of hotbits, drawn once from the request's
+      HotbitsService before dispatch, so no one-time entropy is reused across
+      shards (a worker that runs out falls back to the OS entropy source)
+    - shard results are merged back in catalog order; every result is
+      stored for the analysis, so ranking is left to the caller (TopK)
+    - the pool is shared by all requests: a failing request cancels only its
+      own shards, and the pool is rebuilt only once it is broken
+    - workers are started with forkserver (spawn where unavailable), never by
+      forking the multi-threaded server process
+
+Configuration (environment):
+
+    FINCOMPASS_ANALYSIS_WORKERS      worker processes; 0 (default) keeps analysis serial
+    FINCOMPASS_PARALLEL_MIN_RATES    catalogs smaller than this stay serial (default 2000)
+"""
+import heapq
+import math
+import multiprocessing
+import os
+import random
+import runpy
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, List, Optional
+
+from .host import analyze_service
+from .tracing import tracer
+
+# Integers drawn per rate for a shard's hotbits slice (energetic value + GV)
+HOTBITS_PER_RATE = 2
+SHARDS_PER_WORKER = 2
+SEED_MAX = 2 ** 31 - 1
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+ANALYSIS_WORKERS = _env_int('FINCOMPASS_ANALYSIS_WORKERS', 0)
+PARALLEL_MIN_RATES = _env_int('FINCOMPASS_PARALLEL_MIN_RATES', 2000)
+
+_pool = None
+_pool_lock = threading.Lock()
+# Run in each new worker before the plugin is imported there (see worker_bootstrap.py)
+worker_setup = None
+
+
+def rate_value(rate) -> Any:
+    """
+    The analysis value results are ranked by: the energetic_value attribute that
+    to_dict() reports as 'value'. Read directly so ranking does not build a dict
+    per result; objects without the attribute fall back to to_dict().
+    """
+    try:
+        return rate.energetic_value or 0
+    except AttributeError:
+        return rate.to_dict().get('value', 0) or 0
+
+
+class TopK:
+    """Running top-K of analysis results by value; on equal values the earlier result ranks higher."""
+
+    def __init__(self, k: int):
+        self.k = max(1, k)
+        self._heap: list = []
+        self._counter = 0
+
+    def push(self, rate) -> None:
+        # counter breaks ties without comparing rate objects
+        entry = (rate_value(rate), -self._counter, rate)
+        self._counter += 1
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def stream(self, rates):
+        """Yield `rates` unchanged while ranking them, so one pass can feed a writer and the top-K."""
+        for rate in rates:
+            self.push(rate)
+            yield rate
+
+    def __len__(self) -> int:
+        return self._counter
+
+    def items(self) -> list:
+        """The top K results, highest first."""
+        return [entry[2] for entry in sorted(self._heap, reverse=True)]
+
+
+class HotbitsSlice:
+    """
+    Stand-in HotbitsService for a worker process: consumes a pre-drawn list of
+    hotbits, seeding the generator with each one like the host service does.
+    """
+
+    def __init__(self, seeds: List[int]):
+        self._seeds = seeds
+        self._fallback = random.SystemRandom()
+
+    def getInt(self, min_value: int, max_value: int) -> int:
+        if self._seeds:
+            return random.Random(self._seeds.pop()).randint(min_value, max_value)
+        return self._fallback.randint(min_value, max_value)
+
+
+def _analyze_shard(index: int, analysis_id: int, rates: list, seeds: List[int], check_gv, advanced):
+    """Worker entry point: analyze one shard; returns (index, results)."""
+    return index, analyze_service.analyze(analysis_id, rates, HotbitsSlice(seeds), check_gv, advanced)
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            plugin_dir = os.path.dirname(os.path.abspath(__file__))
+            bootstrap = {'PLUGIN_PACKAGE': __package__, 'PLUGIN_DIR': plugin_dir, 'WORKER_SETUP': worker_setup}
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context(), initializer=runpy.run_path,
+                                        initargs=(os.path.join(plugin_dir, 'worker_bootstrap.py'), bootstrap))
+        return _pool
+
+
+def _reset_pool(broken: ProcessPoolExecutor) -> None:
+    """Drop a broken pool so the next request builds a new one; a pool another request already replaced is kept."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False)
+
+
+def should_shard(rate_count: int, workers: Optional[int] = None) -> bool:
+    workers = ANALYSIS_WORKERS if workers is None else workers
+    return workers > 1 and rate_count >= PARALLEL_MIN_RATES
+
+
+def analyze_sharded(analysis_id: int, rates_list: list, hotbits, check_gv, advanced, workers: int) -> list:
+    """Analyze `rates_list` in shards over a process pool; returns all enhanced rates in catalog order."""
+    shard_count = min(len(rates_list), max(1, workers * SHARDS_PER_WORKER))
+    shard_size = math.ceil(len(rates_list) / shard_count) if rates_list else 0
+    shards = [rates_list[i:i + shard_size] for i in range(0, len(rates_list), shard_size)] if shard_size else []
+
+    with tracer.span('analyze_sharded', shards=len(shards), workers=workers):
+        # Draw every shard's hotbits from the request's service up front: one-time entropy, never shared
+        seeds = [[hotbits.getInt(0, SEED_MAX) for _ in range(len(shard) * HOTBITS_PER_RATE)] for shard in shards]
+        pool = _get_pool(workers)
+        futures = []
+        try:
+            for i, shard in enumerate(shards):
+                futures.append(pool.submit(_analyze_shard, i, analysis_id, shard, seeds[i], check_gv, advanced))
+            shard_results: List[Optional[list]] = [None] * len(shards)
+            for future in futures:
+                index, results = future.result()
+                shard_results[index] = results
+        except BrokenProcessPool:
+            _reset_pool(pool)
+            raise
+        except Exception:
+            # Only this request's shards; other requests keep the pool
+            for future in futures:
+                future.cancel()
+            raise
+
+    return [rate for results in shard_results for rate in results]
+
+
+def analyze_rates(analysis_id: int, rates_list: list, hotbits, check_gv, advanced, workers: Optional[int] = None) -> list:
+    """analyze() for a whole catalog: sharded over the process pool when configured and large enough, else serial."""
+    workers = ANALYSIS_WORKERS if workers is None else workers
+    if should_shard(len(rates_list), workers):
+        try:
+            return analyze_sharded(analysis_id, rates_list, hotbits, check_gv, advanced, workers)
+        except Exception as e:
+            print(f"[FinCompass] Sharded analysis failed, falling back to serial analysis: {e}")
+    return analyze_service.analyze(analysis_id, rates_list, hotbits, check_gv, advanced)
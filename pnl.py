@@ -0,0 +1,284 @@
+"""
+Local P&L of the posted schedules.
+
+intention_schedules only knows when a buy and sell were scheduled, not what
+they were filled at. The PnlRecorder records the fills of every posted
+schedule target (one per server a run was posted to) in the plugin DB:
+
+    - from the server: GET /api/v1/schedules/<id> of the target's buy and,
+      once posted, sell schedule; a schedule counts as filled when it carries
+      an execution price (executed_price, average_price, fill_price or price)
+      and, if it has a status, that status is executed/filled/completed
+    - offline (server unreachable, its breaker open, or the schedule not
+      executed there): from a local price file, FINCOMPASS_PNL_PRICES, priced
+      at the scheduled time like backtest.py does (CSV with `timestamp`,
+      `symbol`, `price`; the last tick at or before the time, and only once
+      the file has a tick at or after it)
+
+Fills can also be posted by hand (POST /api/pnl/fills). A fill from a
+better source replaces a recorded one (price file < by hand < server), never
+the other way round; the recorder itself only looks up missing fills.
+
+When a target has both fills, FinCompassDatabase.record_fill stores the round
+trip in pnl_trades and adds it to pnl_aggregates in the same transaction:
+running totals (trades, wins, losses, realized P&L, sum of returns,
+notional) for the total and per intention, symbol and day (UTC day of the
+sell). GET /api/pnl reads those rows by primary key, so a P&L view costs the
+same however much history there is. The quantity is the server's filled
+quantity or the intention's amount at the buy price; fees are not included.
+A round trip with neither is not recorded as a trade (its fills are kept).
+
+Configuration (environment):
+
+    FINCOMPASS_PNL                 1 enables the background recorder (off by default until the
+                                   servers' GET /api/v1/schedules/<id> is confirmed; fills can
+                                   still be posted by hand or looked up with POST /api/pnl/refresh)
+    FINCOMPASS_PNL_PRICES          local price file (CSV) for offline fills
+    FINCOMPASS_PNL_LOOKBACK_DAYS   schedules created this many days back are looked at (default 7)
+    FINCOMPASS_PNL_INTERVAL        seconds between recorder passes (default 60)
+"""
+import bisect
+import csv
+import datetime
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .fincompass_client import FinCompassClient
+from .magic import iso_time
+from .tracing import tracer
+
+POLL_INTERVAL = 60.0
+DEFAULT_LOOKBACK_DAYS = 7
+BATCH_SIZE = 100
+# A target without a fill is looked at again after this many seconds (schedule_targets.pnl_next_check_at)
+RETRY_DELAY = 300.0
+FILLED_STATUSES = ('executed', 'filled', 'completed', 'done')
+PRICE_FIELDS = ('executed_price', 'average_price', 'fill_price', 'price')
+QUANTITY_FIELDS = ('executed_quantity', 'filled_quantity', 'quantity')
+TIME_FIELDS = ('executed_at', 'filled_at')
+
+
+def enabled() -> bool:
+    return os.environ.get('FINCOMPASS_PNL', '0').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _to_epoch(value) -> Optional[float]:
+    """Epoch seconds for an ISO 8601 string (with or without 'Z', UTC if naive) or a number."""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    parsed = datetime.datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def _number(data: Dict[str, Any], fields) -> Optional[float]:
+    for field in fields:
+        try:
+            value = float(data[field])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if value > 0:
+            return value
+    return None
+
+
+def parse_fill(data: Optional[Dict[str, Any]]) -> Optional[Tuple[float, Optional[float], Optional[str]]]:
+    """(price, quantity, filled_at) of a schedule as returned by the server; None while it is not executed."""
+    if not data:
+        return None
+    status = data.get('status')
+    if isinstance(status, str) and status.lower() not in FILLED_STATUSES:
+        return None
+    price = _number(data, PRICE_FIELDS)
+    if price is None:
+        return None
+    filled_at = next((data[field] for field in TIME_FIELDS if data.get(field)), None) or data.get('scheduled_time')
+    if filled_at:
+        filled_at = iso_time(_to_epoch(filled_at))
+    return price, _number(data, QUANTITY_FIELDS), filled_at
+
+
+def summarize(row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """An aggregate row as served by /api/pnl, with average return and win rate (zeros for no trades)."""
+    row = row or {}
+    trades = row.get('trades') or 0
+    return {
+        'trades': trades,
+        'wins': row.get('wins') or 0,
+        'losses': row.get('losses') or 0,
+        'realized_pnl': row.get('realized_pnl') or 0.0,
+        'notional': row.get('notional') or 0.0,
+        'avg_return': (row.get('return_sum') or 0.0) / trades if trades else 0.0,
+        'win_rate': (row.get('wins') or 0) / trades if trades else 0.0,
+        'updated_at': row.get('updated_at'),
+    }
+
+
+class PriceFile:
+    """Per-symbol price ticks of a local CSV file (`timestamp`, `symbol`, `price`), re-read when the file changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._ticks: Dict[str, Tuple[List[float], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Tuple[List[float], List[float]]]:
+        mtime = os.path.getmtime(self.path)
+        with self._lock:
+            if mtime != self._mtime:
+                rows: Dict[str, List[Tuple[float, float]]] = {}
+                with open(self.path, newline='') as f:
+                    for row in csv.DictReader(f):
+                        rows.setdefault(row['symbol'], []).append((_to_epoch(row['timestamp']), float(row['price'])))
+                self._ticks = {}
+                for symbol, ticks in rows.items():
+                    ticks.sort()
+                    self._ticks[symbol] = ([t for t, _ in ticks], [p for _, p in ticks])
+                self._mtime = mtime
+            return self._ticks
+
+    def price_at(self, symbol: str, timestamp: float) -> Optional[float]:
+        """Last price at or before `timestamp`; None without a tick on both sides of it."""
+        ticks = self._load().get(symbol)
+        if not ticks:
+            return None
+        times, prices = ticks
+        index = bisect.bisect_right(times, timestamp)
+        if index == 0 or times[-1] < timestamp:
+            return None
+        return prices[index - 1]
+
+
+class PnlRecorder:
+    def __init__(self, db, prices: Optional[PriceFile] = None, lookback_days: float = DEFAULT_LOOKBACK_DAYS,
+                 poll_interval: float = POLL_INTERVAL, clock: Callable[[], float] = time.time):
+        self.db = db
+        self.prices = prices
+        self.lookback_days = lookback_days
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._wakeup = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.stats = {'passes': 0, 'server_fills': 0, 'price_file_fills': 0, 'trades': 0, 'unfilled': 0, 'server_errors': 0}
+
+    @classmethod
+    def from_env(cls, db) -> 'PnlRecorder':
+        path = os.environ.get('FINCOMPASS_PNL_PRICES', '').strip()
+        try:
+            lookback_days = float(os.environ.get('FINCOMPASS_PNL_LOOKBACK_DAYS', DEFAULT_LOOKBACK_DAYS))
+        except ValueError:
+            lookback_days = DEFAULT_LOOKBACK_DAYS
+        try:
+            poll_interval = max(1.0, float(os.environ.get('FINCOMPASS_PNL_INTERVAL', POLL_INTERVAL)))
+        except ValueError:
+            poll_interval = POLL_INTERVAL
+        return cls(db, PriceFile(path) if path else None, lookback_days, poll_interval)
+
+    def start(self) -> 'PnlRecorder':
+        with self._wakeup:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='fincompass-pnl', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.collect()
+            except Exception as e:
+                print(f"[FinCompass] P&L recording failed: {e}")
+            with self._wakeup:
+                if self._stopping:
+                    return
+                self._wakeup.wait(self.poll_interval)
+                if self._stopping:
+                    return
+
+    def collect(self, force: bool = False) -> Dict[str, int]:
+        """Record the fills that have come due; with force, targets waiting for a retry are looked at too."""
+        now = self._clock()
+        since = datetime.datetime.utcfromtimestamp(now - self.lookback_days * 86400).strftime('%Y-%m-%d %H:%M:%S')
+        counts = {'targets': 0, 'fills': 0, 'trades': 0}
+        unfilled = []
+        with tracer.span('pnl.collect'):
+            # Deferred targets are filtered in SQL, so a batch is never used up by targets that are still waiting
+            for target in self.db.get_unfilled_pnl_targets(iso_time(now), since, BATCH_SIZE, None if force else now):
+                counts['targets'] += 1
+                fills, trades = self.record(target, now)
+                counts['fills'] += fills
+                counts['trades'] += trades
+                if not fills:
+                    unfilled.append(target['target_id'])
+            # A target that got a fill is due again as soon as its sell is
+            self.db.defer_pnl_targets(unfilled, now + RETRY_DELAY)
+            self.stats['unfilled'] += len(unfilled)
+            tracer.set(**counts)
+        self.stats['passes'] += 1
+        return counts
+
+    def record(self, target: Dict[str, Any], now: float) -> Tuple[int, int]:
+        """Record the due, missing fills of one target; returns (fills recorded, trades closed)."""
+        fills = trades = 0
+        sides = [('buy', target['server_schedule_buy_id'], target['buy_datetime'], target['buy_source'])]
+        if target['server_schedule_sell_id'] and target['sell_datetime'] and target['sell_datetime'] <= iso_time(now):
+            sides.append(('sell', target['server_schedule_sell_id'], target['sell_datetime'], target['sell_source']))
+        for side, server_schedule_id, scheduled_at, recorded in sides:
+            if recorded is not None:
+                continue
+            source, fill = 'server', self._fill_from_server(target, server_schedule_id)
+            if fill is None:
+                source, fill = 'price_file', self._fill_from_prices(target, scheduled_at)
+            if fill is None:
+                # Without the buy there is no trade yet, so the sell can wait too
+                break
+            price, quantity, filled_at = fill
+            trade = self.db.record_fill(target, side, price, quantity, filled_at or scheduled_at, source, now)
+            self.stats[f'{source}_fills'] += 1
+            fills += 1
+            if trade:
+                self.stats['trades'] += 1
+                trades += 1
+        return fills, trades
+
+    def _fill_from_server(self, target: Dict[str, Any], server_schedule_id) -> Optional[Tuple[float, Optional[float], Optional[str]]]:
+        if not target['server_url'] or not target['api_key']:
+            return None
+        try:
+            return parse_fill(FinCompassClient(target['server_url'], target['api_key']).get_schedule(server_schedule_id))
+        except Exception as e:
+            # Unreachable, breaker open or throttled; the price file (if any) stands in
+            self.stats['server_errors'] += 1
+            tracer.event('debug', 'pnl server fill failed', target_id=target['target_id'], error=str(e))
+            return None
+
+    def _fill_from_prices(self, target: Dict[str, Any], scheduled_at: str) -> Optional[Tuple[float, Optional[float], Optional[str]]]:
+        if self.prices is None or not target['symbol']:
+            return None
+        try:
+            price = self.prices.price_at(target['symbol'], _to_epoch(scheduled_at))
+        except (OSError, KeyError, ValueError) as e:
+            print(f"[FinCompass] Price file {self.prices.path} unusable: {e}")
+            return None
+        return (price, None, scheduled_at) if price else None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {'running': self._thread is not None, 'price_file': self.prices.path if self.prices else None,
+                'lookback_days': self.lookback_days, 'waiting': self.db.count_deferred_pnl_targets(self._clock()), **self.stats}
@@ -0,0 +1,256 @@
+"""
+Token-bucket rate limiting for outbound calls to FinCompass servers.
+
+Every request made through FinCompassClient first takes a token from the
+bucket of its server URL and, for exchange-specific calls (symbol sync,
+schedule posts), from the bucket of its exchange_id. Callers wait for a
+token up to a deadline; a caller that cannot get one in time gets
+RateLimitTimeout instead of a request that would be rejected anyway.
+
+Waiting is by reservation: a caller takes its token immediately (the bucket
+may go negative) and sleeps until the token would have been refilled, so
+waiters are served in arrival order without a shared condition variable.
+
+When a server answers 429 the bucket adapts: it is blocked for the
+Retry-After delay (or THROTTLE_BACKOFF seconds without one) and its rate is
+halved, then it recovers by RECOVERY_STEP of the configured rate per
+successful call.
+
+Configuration (environment):
+
+    FINCOMPASS_SERVER_RATE_LIMIT     "<requests per second>/<burst>" per server URL (default 10/20, 0 = unlimited)
+    FINCOMPASS_EXCHANGE_RATE_LIMIT   the same per exchange_id (default 5/10)
+    FINCOMPASS_RATE_LIMITS           overrides per URL or exchange_id, e.g. "https://fc.example=20/40,binance=2/4"
+    FINCOMPASS_RATE_LIMIT_WAIT       longest a call waits for a token, in seconds (default 30)
+"""
+import asyncio
+import email.utils
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .tracing import tracer
+
+DEFAULT_SERVER_LIMIT = (10.0, 20.0)
+DEFAULT_EXCHANGE_LIMIT = (5.0, 10.0)
+DEFAULT_WAIT = 30.0
+# Block used after a 429 without a Retry-After header
+THROTTLE_BACKOFF = 1.0
+# The adapted rate never drops below this fraction of the configured rate
+MIN_RATE_FRACTION = 0.1
+RECOVERY_STEP = 0.05
+
+
+class RateLimitTimeout(Exception):
+    """No token could be had before the caller's deadline."""
+
+    def __init__(self, bucket: str, retry_after: float):
+        super().__init__(f"Rate limit for {bucket}: no request slot within the wait limit (next in {retry_after:.1f}s).")
+        self.bucket = bucket
+        self.retry_after = retry_after
+
+
+def parse_limit(value: Optional[str], default: Tuple[float, float]) -> Tuple[float, float]:
+    """(rate, burst) from "10/20" or "10" (burst = rate); the default for an empty or invalid value."""
+    if not value:
+        return default
+    try:
+        rate, _, burst = value.strip().partition('/')
+        rate = float(rate)
+        return rate, float(burst) if burst else max(rate, 1.0)
+    except ValueError:
+        return default
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header, which holds either a delay in seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    def __init__(self, name: str, rate: float, burst: float):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.current_rate = rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+        self.throttled = 0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.current_rate)
+        self.updated = now
+
+    def reserve(self, deadline: float) -> float:
+        """Take a token; returns how long to sleep before using it. Raises RateLimitTimeout past `deadline`."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(self.blocked_until - now, (1.0 - self.tokens) / self.current_rate if self.tokens < 1.0 else 0.0)
+            if now + wait > deadline:
+                self.timeouts += 1
+                raise RateLimitTimeout(self.name, wait)
+            self.tokens -= 1.0
+            self.acquired += 1
+            if wait > 0:
+                self.waited += 1
+                self.wait_seconds += wait
+                self.max_wait = max(self.max_wait, wait)
+            return wait
+
+    def throttle(self, retry_after: Optional[float]) -> None:
+        """The server answered 429: pause the bucket and halve its rate."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.throttled += 1
+            self.blocked_until = max(self.blocked_until, now + (THROTTLE_BACKOFF if retry_after is None else retry_after))
+            self.current_rate = max(self.rate * MIN_RATE_FRACTION, self.current_rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def recover(self) -> None:
+        if self.current_rate < self.rate:
+            with self._lock:
+                self._refill(time.monotonic())
+                self.current_rate = min(self.rate, self.current_rate + self.rate * RECOVERY_STEP)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'bucket': self.name,
+                'rate': self.rate,
+                'current_rate': round(self.current_rate, 3),
+                'burst': self.burst,
+                'tokens': round(min(self.burst, self.tokens + (time.monotonic() - self.updated) * self.current_rate), 3),
+                'blocked_for_s': round(max(0.0, self.blocked_until - time.monotonic()), 3),
+                'acquired': self.acquired,
+                'waited': self.waited,
+                'wait_seconds': round(self.wait_seconds, 3),
+                'max_wait_s': round(self.max_wait, 3),
+                'timeouts': self.timeouts,
+                'throttled': self.throttled,
+            }
+
+
+class RateLimiter:
+    """Token buckets per server URL and per exchange_id, created on first use."""
+
+    def __init__(self, server_limit: Tuple[float, float] = DEFAULT_SERVER_LIMIT, exchange_limit: Tuple[float, float] = DEFAULT_EXCHANGE_LIMIT,
+                 overrides: Optional[Dict[str, Tuple[float, float]]] = None, wait: float = DEFAULT_WAIT):
+        self.server_limit = server_limit
+        self.exchange_limit = exchange_limit
+        self.overrides = {key.rstrip('/'): limit for key, limit in (overrides or {}).items()}
+        self.wait = wait
+        self._buckets: Dict[Tuple[str, str], Optional[TokenBucket]] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, server_limit: Optional[Tuple[float, float]] = None, exchange_limit: Optional[Tuple[float, float]] = None,
+                  overrides: Optional[Dict[str, Tuple[float, float]]] = None, wait: Optional[float] = None) -> None:
+        """Change limits at runtime (a (0, 0) limit disables pacing); existing buckets are dropped along with their metrics."""
+        with self._lock:
+            self.server_limit = server_limit or self.server_limit
+            self.exchange_limit = exchange_limit or self.exchange_limit
+            if overrides is not None:
+                self.overrides = {key.rstrip('/'): limit for key, limit in overrides.items()}
+            if wait is not None:
+                self.wait = wait
+            self._buckets = {}
+
+    @classmethod
+    def from_env(cls) -> 'RateLimiter':
+        overrides = {}
+        for entry in os.environ.get('FINCOMPASS_RATE_LIMITS', '').split(','):
+            key, _, limit = entry.strip().rpartition('=')
+            if key:
+                overrides[key] = parse_limit(limit, DEFAULT_SERVER_LIMIT)
+        try:
+            wait = float(os.environ.get('FINCOMPASS_RATE_LIMIT_WAIT', DEFAULT_WAIT))
+        except ValueError:
+            wait = DEFAULT_WAIT
+        return cls(parse_limit(os.environ.get('FINCOMPASS_SERVER_RATE_LIMIT'), DEFAULT_SERVER_LIMIT),
+                   parse_limit(os.environ.get('FINCOMPASS_EXCHANGE_RATE_LIMIT'), DEFAULT_EXCHANGE_LIMIT), overrides, wait)
+
+    def _bucket(self, kind: str, key: str) -> Optional[TokenBucket]:
+        """The bucket for a server URL or exchange_id; None if that key is unlimited."""
+        try:
+            return self._buckets[(kind, key)]
+        except KeyError:
+            pass
+        with self._lock:
+            if (kind, key) not in self._buckets:
+                rate, burst = self.overrides.get(key, self.server_limit if kind == 'server' else self.exchange_limit)
+                self._buckets[(kind, key)] = TokenBucket(f'{kind}:{key}', rate, burst) if rate > 0 else None
+            return self._buckets[(kind, key)]
+
+    def _buckets_for(self, server_url: str, exchange_id: Optional[str]) -> List[TokenBucket]:
+        buckets = [self._bucket('server', server_url.rstrip('/'))]
+        if exchange_id:
+            buckets.append(self._bucket('exchange', exchange_id))
+        return [bucket for bucket in buckets if bucket is not None]
+
+    def acquire(self, server_url: str, exchange_id: Optional[str] = None, deadline: Optional[float] = None) -> float:
+        """
+        Wait for a token from the server's (and exchange's) bucket; returns the seconds waited.
+        `deadline` is a time.monotonic() value (default: now + the configured wait). Raises RateLimitTimeout.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.wait
+        waited = 0.0
+        for bucket in self._buckets_for(server_url, exchange_id):
+            # Time spent sleeping for earlier buckets counts against the same deadline
+            wait = bucket.reserve(deadline)
+            if wait > 0:
+                time.sleep(wait)
+                waited += wait
+        if waited:
+            tracer.set(rate_limit_wait_ms=round(waited * 1000, 1))
+        return waited
+
+    async def acquire_async(self, server_url: str, exchange_id: Optional[str] = None, deadline: Optional[float] = None) -> float:
+        """acquire() for coroutines: waits with asyncio.sleep, so the event loop keeps serving other requests."""
+        if deadline is None:
+            deadline = time.monotonic() + self.wait
+        waited = 0.0
+        for bucket in self._buckets_for(server_url, exchange_id):
+            wait = bucket.reserve(deadline)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                waited += wait
+        if waited:
+            tracer.set(rate_limit_wait_ms=round(waited * 1000, 1))
+        return waited
+
+    def throttled(self, server_url: str, exchange_id: Optional[str], retry_after: Optional[float]) -> None:
+        for bucket in self._buckets_for(server_url, exchange_id):
+            bucket.throttle(retry_after)
+        tracer.event('warning', 'throttled by server', server=lambda: server_url, exchange_id=lambda: exchange_id,
+                     retry_after=lambda: retry_after)
+
+    def succeeded(self, server_url: str, exchange_id: Optional[str] = None) -> None:
+        for bucket in self._buckets_for(server_url, exchange_id):
+            bucket.recover()
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            buckets = [bucket for bucket in self._buckets.values() if bucket is not None]
+        return [bucket.to_dict() for bucket in buckets]
+
+
+limiter = RateLimiter.from_env()
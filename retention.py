@@ -0,0 +1,182 @@
+"""
+Retention for start-magic history.
+
+Every run leaves a row in intention_schedules (plugin DB) and a session, an
+analysis and one rate row per catalog symbol in AetherOnePy. A retention pass:
+
+    1. selects schedules past the age policy, or beyond the newest N per
+       intention, whose sell time has passed (open positions are never touched)
+    2. rolls them up into schedule_rollups (per intention, day and symbol:
+       runs, value, hold and status counts) and deletes them, in chunks of
+       RETENTION_CHUNK rows; every chunk is its own short write transaction
+       with a pause in between, so writers are never blocked for long
+    3. deletes the AetherOnePy sessions/analyses of those runs, if the host DAO
+       offers delete_analysis / delete_session
+    4. drops expired idempotency keys and releases free pages with an
+       incremental VACUUM (the DB is switched to auto_vacuum=INCREMENTAL once)
+
+Configuration (environment, overridable per call):
+
+    FINCOMPASS_RETENTION_DAYS        keep schedules this many days (default 90, 0 = no age limit)
+    FINCOMPASS_RETENTION_MAX_RUNS    keep at most this many schedules per intention (default 0 = no limit)
+    FINCOMPASS_VACUUM_PAGES          pages released per pass (default 2000)
+"""
+import datetime
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .tracing import tracer
+
+RETENTION_CHUNK = 500
+CHUNK_PAUSE = 0.05
+# (host DAO method, intention_schedules column, report counter)
+HOST_DELETES = (('delete_analysis', 'analysis_id', 'host_analyses_deleted'), ('delete_session', 'session_id', 'host_sessions_deleted'))
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class RetentionPolicy:
+    def __init__(self, max_age_days: int = 90, max_runs_per_intention: int = 0, vacuum_pages: int = 2000, chunk_size: int = RETENTION_CHUNK):
+        self.max_age_days = max(0, int(max_age_days or 0))
+        self.max_runs_per_intention = max(0, int(max_runs_per_intention or 0))
+        self.vacuum_pages = max(0, int(vacuum_pages or 0))
+        self.chunk_size = max(1, int(chunk_size or RETENTION_CHUNK))
+
+    @classmethod
+    def from_env(cls, **overrides) -> 'RetentionPolicy':
+        settings = {
+            'max_age_days': _env_int('FINCOMPASS_RETENTION_DAYS', 90),
+            'max_runs_per_intention': _env_int('FINCOMPASS_RETENTION_MAX_RUNS', 0),
+            'vacuum_pages': _env_int('FINCOMPASS_VACUUM_PAGES', 2000),
+        }
+        settings.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**settings)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            'max_age_days': self.max_age_days,
+            'max_runs_per_intention': self.max_runs_per_intention,
+            'vacuum_pages': self.vacuum_pages,
+            'chunk_size': self.chunk_size,
+        }
+
+
+def rollup_schedules(schedules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per (intention, day, symbol) rollup deltas of `schedules`."""
+    rollups: Dict[Tuple[int, str, str], Dict[str, Any]] = {}
+    for schedule in schedules:
+        created_at = schedule.get('created_at') or ''
+        key = (schedule['intention_id'], created_at[:10], schedule.get('symbol') or '')
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = {
+                'intention_id': key[0], 'day': key[1], 'symbol': key[2], 'runs': 0,
+                'total_energetic_value': 0.0, 'max_energetic_value': None, 'total_hold_minutes': 0,
+                'status_counts': {}, 'first_created_at': created_at, 'last_created_at': created_at,
+            }
+        value = schedule.get('energetic_value')
+        rollup['runs'] += 1
+        if value is not None:
+            rollup['total_energetic_value'] += value
+            rollup['max_energetic_value'] = value if rollup['max_energetic_value'] is None else max(rollup['max_energetic_value'], value)
+        rollup['total_hold_minutes'] += schedule.get('hold_minutes') or 0
+        status = schedule.get('status') or 'unknown'
+        rollup['status_counts'][status] = rollup['status_counts'].get(status, 0) + 1
+        rollup['first_created_at'] = min(rollup['first_created_at'], created_at)
+        rollup['last_created_at'] = max(rollup['last_created_at'], created_at)
+    return list(rollups.values())
+
+
+def _purge_host_runs(case_dao, schedules: List[Dict[str, Any]], report: Dict[str, Any]) -> None:
+    """Delete the AetherOnePy analyses/sessions of archived runs when the host DAO supports it."""
+    if case_dao is None:
+        return
+    for method, column, counter in HOST_DELETES:
+        delete = getattr(case_dao, method, None)
+        ids = {s[column] for s in schedules if s.get(column) is not None}
+        if not ids:
+            continue
+        if delete is None:
+            report['host_unsupported'] = sorted(set(report['host_unsupported']) | {method})
+            continue
+        for host_id in ids:
+            try:
+                delete(host_id)
+                report[counter] += 1
+            except Exception as e:
+                report['host_errors'] += 1
+                tracer.event('warning', 'host delete failed', method=lambda: method, id=lambda: host_id, error=lambda: str(e))
+
+
+def _expiry_passes(db, policy: RetentionPolicy, now: datetime.datetime) -> List[Tuple[tuple, Optional[int]]]:
+    """(before key, intention_id) for every selection the policy needs: one for age, one per intention over the count limit."""
+    passes: List[Tuple[tuple, Optional[int]]] = []
+    if policy.max_age_days:
+        cutoff = (now - datetime.timedelta(days=policy.max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+        passes.append(((cutoff, 0), None))
+    if policy.max_runs_per_intention:
+        for intention_id, created_at, schedule_id in db.get_schedule_count_boundaries(policy.max_runs_per_intention):
+            passes.append(((created_at, schedule_id), intention_id))
+    return passes
+
+
+def run_retention(db, case_dao=None, policy: Optional[RetentionPolicy] = None, dry_run: bool = False,
+                  now: Optional[datetime.datetime] = None) -> Dict[str, Any]:
+    """Apply `policy` (default: from the environment) once; returns a report of what was (or, with dry_run, would be) removed."""
+    policy = policy or RetentionPolicy.from_env()
+    now = now or datetime.datetime.utcnow()
+    # Stored sell times look like 2025-01-01T12:00:00Z
+    sold_before = now.isoformat(timespec='seconds') + 'Z'
+    report: Dict[str, Any] = {
+        'policy': policy.to_dict(), 'dry_run': dry_run, 'archived': 0, 'rollup_updates': 0, 'chunks': 0,
+        'host_analyses_deleted': 0, 'host_sessions_deleted': 0, 'host_unsupported': [], 'host_errors': 0,
+        'idempotency_keys_deleted': 0, 'pages_released': 0,
+    }
+    started = time.perf_counter()
+    # Passes overlap (age and count); a dry run deletes nothing, so it counts distinct ids
+    seen = set()
+    with tracer.span('retention', dry_run=dry_run):
+        for before, intention_id in _expiry_passes(db, policy, now):
+            after = None
+            while True:
+                schedules = db.get_expired_schedules(before, sold_before, after, intention_id, policy.chunk_size)
+                if not schedules:
+                    break
+                report['chunks'] += 1
+                if dry_run:
+                    # Nothing is deleted, so page forward by key instead
+                    after = (schedules[-1]['created_at'], schedules[-1]['id'])
+                    seen.update(s['id'] for s in schedules)
+                    report['archived'] = len(seen)
+                    continue
+                rollups = rollup_schedules(schedules)
+                db.archive_schedules(rollups, [s['id'] for s in schedules])
+                report['archived'] += len(schedules)
+                report['rollup_updates'] += len(rollups)
+                _purge_host_runs(case_dao, schedules, report)
+                if len(schedules) < policy.chunk_size:
+                    break
+                # Let other writers in between chunks
+                time.sleep(CHUNK_PAUSE)
+
+        if not dry_run:
+            report['idempotency_keys_deleted'] = db.delete_expired_idempotency_keys(time.time())
+            if policy.vacuum_pages:
+                with tracer.span('incremental_vacuum'):
+                    stats = db.get_page_stats()
+                    if stats['auto_vacuum'] != 2:
+                        # One-time switch to INCREMENTAL; rewrites the file with a full VACUUM
+                        db.enable_incremental_vacuum()
+                    report['pages_released'] = db.incremental_vacuum(policy.vacuum_pages)
+        stats = db.get_page_stats()
+        report['db_bytes'] = stats['page_size'] * stats['page_count']
+        report['free_pages'] = stats['freelist_count']
+        tracer.set(archived=report['archived'], pages_released=report['pages_released'])
+    report['elapsed_s'] = round(time.perf_counter() - started, 3)
+    return report
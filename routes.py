@@ -1,13 +1,30 @@
-from flask import Blueprint, jsonify, request, current_app, send_from_directory
+from flask import Blueprint, Response, jsonify, request, current_app, g, has_app_context, stream_with_context
 import os
 from datetime import datetime
-import requests
 from .database import FinCompassDatabase
-from flasgger import Swagger, swag_from
+from .tracing import tracer
+from .db_profiler import profiler, PROFILE_HEADER
+from .startup import Lazy, startup_report
+from .static_assets import StaticManifest, asset_response
+from .idempotency import IDEMPOTENCY_HEADER, IdempotencyStore, idempotent, keep_response
+from .symbol_index import format_list, index_for_catalog, parse_max_universe_size
+from .retention import RetentionPolicy, run_retention
+from .export import FORMATS as EXPORT_FORMATS, export_stream
+from .events import bus as event_bus, parse_last_event_id
+from .fast_json import json_response, ndjson_response, wants_ndjson
+from .rate_limit import RateLimitTimeout, limiter
+from .circuit_breaker import CircuitOpen, breakers
+# Heavy and host-app modules are imported on first use, not while AetherOnePy boots
+from .host import requests
+from .magic import MagicError, MAX_BATCH_ITEMS, LockedHotbits, create_hotbits, format_server_ids, parse_max_workers, parse_response_detail, resolve_target, run_magic, run_magic_batch
+from .sell_scheduler import SellScheduler, enabled as sell_scheduler_enabled
+from .outbox import Outbox, enabled as outbox_enabled
+from .sync_daemon import SyncDaemon, SyncError, enabled as sync_daemon_enabled
+from .pnl import PnlRecorder, enabled as pnl_enabled, summarize as summarize_pnl
+import json
 import pathlib
-from domains.aetherOneDomains import Session as AOSession, Analysis as AOAnalysis
-from services.analyzeService import analyze
-from services.hotbitsService import HotbitsService, HotbitsSource
+import threading
+import time
 
 def push_schedule_to_external_api(schedule: dict) -> dict:
     """
@@ -39,25 +56,139 @@ def push_schedule_to_external_api(schedule: dict) -> dict:
         raise Exception(f"External API error: {response.status_code} {response.text}")
     return response.json()
 
-def create_blueprint(app_instance=None):
-    print("[DEBUG] Creating FinCompass blueprint...")
+def create_blueprint(app_instance=None, db_path=None):
+    with startup_report.timed('create_blueprint', 'register'):
+        return _create_blueprint(app_instance, db_path)
+
+def _create_blueprint(app_instance=None, db_path=None):
     fincompass_blueprint = Blueprint('fincompass', __name__)
     
-    # Initialize database
-    db_path = os.path.join(os.path.dirname(__file__), 'fincompass.db')
-    db = FinCompassDatabase(db_path)
+    # Database is created (and its DDL run) on first use (db_path can be overridden, e.g. by the benchmark harness)
+    if db_path is None:
+        db_path = os.path.join(os.path.dirname(__file__), 'fincompass.db')
+    db = Lazy('database', lambda: FinCompassDatabase(db_path))
+    idempotency = Lazy('idempotency store', lambda: IdempotencyStore(db.resolve()))
+    # Locally timed sells (see sell_scheduler.py); its hotbits are only created at the first re-evaluation
+    sell_scheduler = Lazy('sell scheduler', lambda: SellScheduler.from_env(
+        db.resolve(), lambda: LockedHotbits(create_hotbits(db.resolve()))).start())
+
+    @fincompass_blueprint.record_once
+    def start_sell_scheduler(state):
+        # Open positions must be timed after a restart without waiting for a request, so load them off the boot path
+        if sell_scheduler_enabled():
+            threading.Thread(target=sell_scheduler.resolve, name='fincompass-sell-scheduler-start', daemon=True).start()
+
+    # Posts queued while a server's circuit breaker was open (see outbox.py), delivered by a background worker
+    outbox = Lazy('outbox', lambda: Outbox.from_env(db.resolve()).start())
+
+    @fincompass_blueprint.record_once
+    def start_outbox(state):
+        if outbox_enabled():
+            threading.Thread(target=outbox.resolve, name='fincompass-outbox-start', daemon=True).start()
     
+    # The app the blueprint is registered on, for background work outside of requests
+    host_app = []
+
     # Get case_dao reference - use app_instance if provided, otherwise fall back to current_app
     def get_case_dao():
         if app_instance and hasattr(app_instance, 'case_dao'):
             return app_instance.case_dao
+        elif host_app and not has_app_context():
+            return host_app[0].case_dao
         else:
             return current_app.case_dao
 
+    # Providers, symbols, cases and catalogs are kept fresh in the background (see sync_daemon.py);
+    # when the daemon is disabled, handlers refresh inline with the same object
+    sync_daemon = Lazy('sync daemon', lambda: SyncDaemon.from_env(db.resolve(), get_case_dao))
+
+    @fincompass_blueprint.record_once
+    def start_sync_daemon(state):
+        host_app.append(state.app)
+        if sync_daemon_enabled():
+            threading.Thread(target=lambda: sync_daemon.resolve().start(), name='fincompass-sync-start', daemon=True).start()
+
+    # Fills of posted schedules and the running P&L aggregates (see pnl.py)
+    pnl_recorder = Lazy('pnl recorder', lambda: PnlRecorder.from_env(db.resolve()))
+
+    @fincompass_blueprint.record_once
+    def start_pnl_recorder(state):
+        if pnl_enabled():
+            threading.Thread(target=lambda: pnl_recorder.resolve().start(), name='fincompass-pnl-start', daemon=True).start()
+
     AETHERONE_API_URL = "http://localhost:7000"
 
     # --- Static frontend serving for FinCompass (like AetherOnePySocialPlugin) ---
     FRONTEND_DIST_DIR = pathlib.Path(__file__).parent / 'frontend' / 'dist'
+    # In-memory manifest of dist/ (bytes, ETags, gzip/brotli variants), built once on first asset request
+    static_manifest = Lazy('static manifest', lambda: StaticManifest(FRONTEND_DIST_DIR))
+
+    # --- Request tracing (no-op unless FINCOMPASS_TRACE_LEVEL is set) ---
+    @fincompass_blueprint.before_request
+    def start_trace():
+        g.fincompass_trace = tracer.start_request(request.endpoint or request.path, method=request.method, path=request.path)
+
+    @fincompass_blueprint.teardown_request
+    def end_trace(error=None):
+        tracer.end_request(g.pop('fincompass_trace', None), error=(str(error) if error else None))
+
+    # --- SQL profiling (only with FINCOMPASS_DB_PROFILE=1 and the X-FinCompass-Profile header) ---
+    @fincompass_blueprint.before_request
+    def start_db_profile():
+        if profiler.enabled and request.headers.get(PROFILE_HEADER):
+            g.fincompass_db_profile = profiler.start(f"{request.method} {request.path}")
+
+    @fincompass_blueprint.after_request
+    def add_db_profile_headers(response):
+        profile = profiler.current()
+        if profile is not None:
+            response.headers['X-DB-Queries'] = str(profile.query_count)
+            response.headers['X-DB-Time'] = f"{profile.total_ms:.3f}"
+            response.headers['X-DB-Profile-Id'] = profile.id
+        return response
+
+    @fincompass_blueprint.teardown_request
+    def end_db_profile(error=None):
+        token = g.pop('fincompass_db_profile', None)
+        if token is not None:
+            profiler.stop(token)
+
+    @fincompass_blueprint.route('/api/debug/startup', methods=['GET'])
+    def api_startup_report():
+        """
+        Import and initialization timings of the plugin's lazily loaded components.
+        """
+        return jsonify({"status": "success", "startup": startup_report.summary()})
+
+    @fincompass_blueprint.route('/api/debug/db-profile', methods=['GET'])
+    def api_db_profiles():
+        """
+        List recently profiled requests (newest first).
+        """
+        if not profiler.enabled:
+            return jsonify({"status": "error", "error": "SQL profiling is disabled (set FINCOMPASS_DB_PROFILE=1)"}), 404
+        return jsonify({"status": "success", "profiles": profiler.recent()})
+
+    @fincompass_blueprint.route('/api/debug/db-writer', methods=['GET'])
+    def api_db_writer():
+        """
+        Write queue metrics: queued operations, batches committed, average batch size and commit time.
+        """
+        if db.writer is None:
+            return jsonify({"status": "success", "writer": {"running": False, "enabled": False}})
+        return jsonify({"status": "success", "writer": db.writer.metrics()})
+
+    @fincompass_blueprint.route('/api/debug/db-profile/<string:profile_id>', methods=['GET'])
+    def api_db_profile(profile_id):
+        """
+        Per-statement breakdown of a profiled request.
+        """
+        if not profiler.enabled:
+            return jsonify({"status": "error", "error": "SQL profiling is disabled (set FINCOMPASS_DB_PROFILE=1)"}), 404
+        profile = profiler.get(profile_id)
+        if profile is None:
+            return jsonify({"status": "error", "error": "Profile not found"}), 404
+        return jsonify({"status": "success", "profile": profile.breakdown()})
 
     @fincompass_blueprint.route('/analyze-complete', methods=['POST'])
     def analyze_complete():
@@ -92,6 +223,11 @@ def create_blueprint(app_instance=None):
                 note:
                   type: string
                   description: Optional note for the analysis
+          - name: format
+            in: query
+            type: string
+            enum: [json, ndjson]
+            description: ndjson streams the envelope, then one line per result
         responses:
           200:
             description: Analysis completed successfully
@@ -163,13 +299,16 @@ def create_blueprint(app_instance=None):
             if not results:
                 return jsonify({"error": "Failed to run analysis"}), 500
 
-            return jsonify({
+            envelope = {
                 "status": "success",
                 "case": stored_case,
                 "session": session.__dict__,
-                "analysis": analysis.__dict__,
-                "results": results
-            })
+                "analysis": analysis.__dict__
+            }
+            if wants_ndjson() and isinstance(results, list):
+                # One line for the envelope, then one line per analyzed rate
+                return ndjson_response(dict(envelope, result_count=len(results)), results)
+            return json_response(dict(envelope, results=results))
 
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -254,6 +393,265 @@ def create_blueprint(app_instance=None):
             "schedules": []
         })
     
+    @fincompass_blueprint.route('/api/schedules/<int:schedule_id>/targets', methods=['GET'])
+    def api_get_schedule_targets(schedule_id):
+        """
+        Outcome of a schedule's buy/sell posts on each target server.
+        """
+        return jsonify({'status': 'success', 'targets': db.get_schedule_targets(schedule_id)})
+
+    @fincompass_blueprint.route('/api/schedules/rollups', methods=['GET'])
+    def api_get_schedule_rollups():
+        """
+        Summaries of schedules removed by retention, per intention, day and symbol.
+        ---
+        parameters:
+          - name: intention_id
+            in: query
+            type: integer
+        """
+        return jsonify({'status': 'success', 'rollups': db.get_schedule_rollups(request.args.get('intention_id', type=int))})
+
+    @fincompass_blueprint.route('/api/export/schedules', methods=['GET'])
+    def api_export_schedules():
+        """
+        Stream start-magic history (schedules joined with their intention) as CSV, Parquet or Arrow.
+        ---
+        parameters:
+          - name: format
+            in: query
+            type: string
+            enum: [csv, parquet, arrow]
+          - name: since
+            in: query
+            type: string
+            description: ISO date/time (UTC), inclusive
+          - name: until
+            in: query
+            type: string
+            description: ISO date/time (UTC), exclusive
+          - name: intention_id
+            in: query
+            type: integer
+        """
+        fmt = request.args.get('format', 'csv').lower()
+        try:
+            chunks = export_stream(db.db_path, fmt, request.args.get('since'), request.args.get('until'),
+                                   request.args.get('intention_id', type=int))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'error': str(e)}), 400
+        except RuntimeError as e:
+            return jsonify({'status': 'error', 'error': str(e)}), 501
+        mimetype, extension = EXPORT_FORMATS[fmt]
+        filename = f"fincompass-schedules-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{extension}"
+        return Response(stream_with_context(chunks), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+    @fincompass_blueprint.route('/api/maintenance/retention', methods=['POST'])
+    def api_run_retention():
+        """
+        Apply the retention policy once: roll up and delete old schedules in chunks, purge their
+        AetherOnePy analyses where supported and compact the plugin DB.
+        ---
+        parameters:
+          - name: body
+            in: body
+            schema:
+              type: object
+              properties:
+                max_age_days:
+                  type: integer
+                max_runs_per_intention:
+                  type: integer
+                vacuum_pages:
+                  type: integer
+                dry_run:
+                  type: boolean
+        """
+        data = request.get_json(silent=True) or {}
+        try:
+            policy = RetentionPolicy.from_env(max_age_days=data.get('max_age_days'),
+                                              max_runs_per_intention=data.get('max_runs_per_intention'),
+                                              vacuum_pages=data.get('vacuum_pages'))
+        except (TypeError, ValueError) as e:
+            return jsonify({'status': 'error', 'error': f'Invalid retention policy: {e}'}), 400
+        try:
+            case_dao = get_case_dao()
+        except Exception:
+            case_dao = None
+        try:
+            report = run_retention(db, case_dao, policy, dry_run=bool(data.get('dry_run')))
+            return jsonify({'status': 'success', **report})
+        except Exception as e:
+            return jsonify({'status': 'error', 'error': str(e)}), 500
+
+    @fincompass_blueprint.route('/api/events', methods=['GET'])
+    def api_events():
+        """
+        Server-sent events: selection changes, intention and schedule updates and sync completions, as small deltas.
+        Reconnects resume after the Last-Event-ID header (or ?last_event_id=).
+        ---
+        produces:
+          - text/event-stream
+        """
+        last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+        return Response(event_bus.stream(last_event_id), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    @fincompass_blueprint.route('/api/sell-timers', methods=['GET'])
+    def api_get_sell_timers():
+        """
+        Locally timed sells (intentions with local_sell_timing) and the scheduler's state.
+        ---
+        parameters:
+          - name: status
+            in: query
+            type: string
+            enum: [pending, posting, posted, failed, cancelled]
+          - name: limit
+            in: query
+            type: integer
+        """
+        timers = db.get_sell_timers(request.args.get('status'), min(request.args.get('limit', 100, type=int), 1000))
+        for timer in timers:
+            # Payloads stay in the DB; the listing only shows where each sell goes and its remote ids
+            timer['targets'] = [{k: v for k, v in t.items() if k != 'buy_payload'} for t in json.loads(timer['targets'])]
+        scheduler = sell_scheduler.metrics() if sell_scheduler_enabled() else {'running': False}
+        return jsonify({'status': 'success', 'scheduler': scheduler, 'timers': timers})
+
+    @fincompass_blueprint.route('/api/sell-timers/<int:timer_id>/cancel', methods=['POST'])
+    def api_cancel_sell_timer(timer_id):
+        """
+        Stop timing a pending sell; the position's buy stays and its sell is left to be placed by hand.
+        """
+        timer = db.get_sell_timer(timer_id)
+        if not timer:
+            return jsonify({'status': 'error', 'error': 'Sell timer not found.'}), 404
+        cancelled = sell_scheduler.cancel(timer_id) if sell_scheduler_enabled() else db.cancel_sell_timer(timer_id)
+        if not cancelled:
+            return jsonify({'status': 'error', 'error': f"Sell timer is {timer['status']} and can no longer be cancelled."}), 409
+        db.update_intention_schedule(timer['schedule_id'], status='sell_cancelled')
+        return jsonify({'status': 'success'})
+
+    @fincompass_blueprint.route('/api/circuit-breakers', methods=['GET'])
+    def api_get_circuit_breakers():
+        """
+        Circuit breaker state and metrics per server URL, and the outbox of queued posts.
+        """
+        return jsonify({'status': 'success', 'enabled': breakers.enabled, 'breakers': breakers.metrics(),
+                        'outbox': outbox.metrics() if outbox_enabled() else {'running': False, 'entries': db.count_outbox()}})
+
+    @fincompass_blueprint.route('/api/outbox', methods=['GET'])
+    def api_get_outbox():
+        """
+        Schedule posts queued while their server's circuit breaker was open.
+        ---
+        parameters:
+          - name: status
+            in: query
+            type: string
+            enum: [pending, sending, sent, failed, expired]
+          - name: limit
+            in: query
+            type: integer
+        """
+        entries = db.get_outbox(request.args.get('status'), min(request.args.get('limit', 100, type=int), 1000))
+        for entry in entries:
+            payload = json.loads(entry.pop('payload'))
+            entry.update(symbol=payload['buy_payload'].get('symbol'), buy_schedule_id=payload.get('buy_schedule_id'),
+                         hold_minutes=payload.get('hold_minutes'))
+        return jsonify({'status': 'success', 'entries': entries})
+
+    @fincompass_blueprint.route('/api/providers/<string:exchange_id>/constraints', methods=['GET'])
+    def api_get_exchange_constraints(exchange_id):
+        """
+        Cached trading constraints of an exchange's symbols (see exchange_constraints.py); ?symbol= returns one.
+        """
+        symbol = request.args.get('symbol')
+        if symbol:
+            constraint = db.get_symbol_constraints([exchange_id], symbol).get(exchange_id)
+            if constraint is None:
+                return jsonify({'status': 'error', 'error': f"No constraints synced for '{exchange_id}'"}), 404
+            return jsonify({'status': 'success', 'constraint': constraint})
+        limit = min(request.args.get('limit', 1000, type=int), 10000)
+        return jsonify({'status': 'success', 'constraints': db.get_exchange_constraints(exchange_id, limit, request.args.get('offset', 0, type=int))})
+
+    @fincompass_blueprint.route('/api/sync-status', methods=['GET'])
+    def api_get_sync_status():
+        """
+        Freshness of the locally synced datasets (providers, symbols, cases, catalogs) and the sync daemon's state.
+        """
+        daemon = sync_daemon.resolve()
+        return jsonify({'status': 'success', 'daemon': daemon.metrics(), 'datasets': db.get_sync_status()})
+
+    @fincompass_blueprint.route('/api/pnl', methods=['GET'])
+    def api_get_pnl():
+        """
+        Realized P&L from the running aggregates: the total and, with ?intention_id=, ?symbol= or ?day= (YYYY-MM-DD),
+        that one aggregate; ?by=intention|symbol|day adds the aggregates of that scope.
+        """
+        result = {'status': 'success', 'total': summarize_pnl(db.get_pnl_aggregate('total'))}
+        for scope in ('intention', 'symbol', 'day'):
+            key = request.args.get(f'{scope}_id' if scope == 'intention' else scope)
+            if key:
+                result[scope] = dict(summarize_pnl(db.get_pnl_aggregate(scope, key)), key=key)
+        by = request.args.get('by')
+        if by:
+            if by not in ('intention', 'symbol', 'day'):
+                return jsonify({'status': 'error', 'error': "by must be one of 'intention', 'symbol', 'day'"}), 400
+            limit = min(request.args.get('limit', 100, type=int), 1000)
+            result['breakdown'] = [dict(summarize_pnl(row), key=row['scope_key']) for row in db.get_pnl_aggregates(by, limit)]
+        return jsonify(result)
+
+    @fincompass_blueprint.route('/api/pnl/trades', methods=['GET'])
+    def api_get_pnl_trades():
+        """
+        Closed trades (buy and sell fill of one schedule target), newest first; ?intention_id= narrows them down.
+        """
+        trades = db.get_pnl_trades(request.args.get('intention_id', type=int), min(request.args.get('limit', 100, type=int), 1000))
+        return jsonify({'status': 'success', 'trades': trades})
+
+    @fincompass_blueprint.route('/api/pnl/fills', methods=['POST'])
+    def api_record_pnl_fill():
+        """
+        Record a fill by hand: {"target_id": ..., "side": "buy"|"sell", "price": ..., "quantity": ..., "filled_at": ISO 8601}.
+        It replaces a fill taken from the price file, not one reported by the server.
+        """
+        data = request.get_json(silent=True) or {}
+        if data.get('side') not in ('buy', 'sell'):
+            return jsonify({'status': 'error', 'error': "side must be 'buy' or 'sell'"}), 400
+        try:
+            price = float(data['price'])
+            quantity = float(data['quantity']) if data.get('quantity') is not None else None
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'status': 'error', 'error': 'price (and quantity, if given) must be numbers'}), 400
+        if price <= 0 or (quantity is not None and quantity <= 0):
+            return jsonify({'status': 'error', 'error': 'price and quantity must be positive'}), 400
+        target = db.get_pnl_target(data.get('target_id'))
+        if not target:
+            return jsonify({'status': 'error', 'error': 'Schedule target not found'}), 404
+        if target[f"{data['side']}_source"] == 'server':
+            return jsonify({'status': 'error', 'error': 'The server already reported this fill'}), 409
+        filled_at = data.get('filled_at') or target['buy_datetime' if data['side'] == 'buy' else 'sell_datetime']
+        trade = db.record_fill(target, data['side'], price, quantity, filled_at, 'manual', time.time())
+        return jsonify({'status': 'success', 'trade': trade})
+
+    @fincompass_blueprint.route('/api/pnl/refresh', methods=['POST'])
+    def api_refresh_pnl():
+        """
+        Look up the due, missing fills now (including targets waiting for their next retry).
+        """
+        recorder = pnl_recorder.resolve()
+        counts = recorder.collect(force=True)
+        return jsonify({'status': 'success', **counts, 'recorder': recorder.metrics()})
+
+    @fincompass_blueprint.route('/api/rate-limits', methods=['GET'])
+    def api_get_rate_limits():
+        """
+        Outbound rate limiter state and throttling metrics, one entry per server URL / exchange bucket.
+        """
+        return jsonify({'status': 'success', 'buckets': limiter.metrics()})
+
     @fincompass_blueprint.route('/api/servers', methods=['GET'])
     def api_get_servers():
         """
@@ -307,48 +705,36 @@ def create_blueprint(app_instance=None):
     @fincompass_blueprint.route('/api/providers', methods=['GET'])
     def api_get_providers():
         """
-        Proxy: Get all providers from the selected server, store them locally,
-        and return the local list.
+        Providers of the selected server from the local DB. The sync daemon keeps them fresh; a stale list is
+        served with "stale": true and refreshed in the background (inline when the daemon is disabled).
         """
         try:
             # Get selected server
             selected_server = db.get_selected_server()
             if not selected_server or not selected_server.get('url'):
                 return jsonify({"status": "error", "error": "No server selected"}), 400
-            
-            base_url = selected_server['url'].rstrip('/')
-            api_key = selected_server.get('api_key')
-            
-            if not api_key:
-                # If no API key, just return what we have locally
-                local_providers = db.get_providers_by_server(selected_server['id'])
-                return jsonify({"status": "success", "providers": local_providers})
-
-            # Compose external API URL
-            api_url = f"{base_url}/api/v1/providers/"
-            headers = { "X-API-Key": f"{api_key}" }
-
-            # Fetch from external API
-            resp = requests.get(api_url, headers=headers, timeout=15)
-            if resp.status_code != 200:
-                return jsonify({"status": "error", "error": f"Upstream error: {resp.status_code} {resp.text}"}), 502
 
-            # Store providers locally
-            external_providers = resp.json()
-            db.store_providers(selected_server['id'], external_providers)
+            stale = False
+            if selected_server.get('api_key'):
+                # Without an API key there is nothing to sync; just return what we have locally
+                daemon = sync_daemon.resolve()
+                if daemon.running:
+                    stale = not daemon.is_fresh('providers', str(selected_server['id']))
+                else:
+                    try:
+                        daemon.refresh('providers', str(selected_server['id']))
+                    except SyncError as e:
+                        return jsonify({"status": "error", "error": str(e)}), e.status_code
+                    except (requests.exceptions.RequestException, RateLimitTimeout, CircuitOpen) as e:
+                        # If the external API fails, is rate limited or its breaker is open, fall back to the locally stored list
+                        current_app.logger.warning(f"Could not connect to external provider API: {e}. Serving local data.")
+                        stale = True
 
-            # Get the (potentially updated) list from local DB and return
             local_providers = db.get_providers_by_server(selected_server['id'])
-            return jsonify({"status": "success", "providers": local_providers})
-
-        except requests.exceptions.RequestException as e:
-            # If the external API fails, fall back to local data
-            current_app.logger.warning(f"Could not connect to external provider API: {e}. Serving local data.")
-            selected_server = db.get_selected_server()
-            if selected_server:
-                local_providers = db.get_providers_by_server(selected_server['id'])
-                return jsonify({"status": "success", "providers": local_providers})
-            return jsonify({"status": "error", "error": "No server selected and external API is unavailable."}), 503
+            body = {"status": "success", "providers": local_providers}
+            if stale:
+                body['stale'] = True
+            return json_response(body)
 
         except Exception as e:
             return jsonify({"status": "error", "error": str(e)}), 500
@@ -386,19 +772,34 @@ def create_blueprint(app_instance=None):
     @fincompass_blueprint.route('/api/catalogs', methods=['GET'])
     def api_get_catalogs():
         """
-        Always use the main app's DAO to get catalogs.
+        Catalogs of the main app (synced from its DAO by the sync daemon, or inline when it is disabled).
         """
         try:
-            # Convert Catalog objects to dicts for sync_catalogs
-            core_catalogs = [c.to_dict() if hasattr(c, 'to_dict') else {'id': c.id, 'name': c.name} for c in get_case_dao().list_catalogs()]
-            db.sync_catalogs(core_catalogs)
+            daemon = sync_daemon.resolve()
+            stale = False
+            if daemon.running:
+                stale = not daemon.is_fresh('catalogs')
+            else:
+                daemon.refresh('catalogs')
             local_catalogs = db.get_catalogs()
-            return jsonify({"status": "success", "catalogs": local_catalogs})
+            body = {"status": "success", "catalogs": local_catalogs}
+            if stale:
+                body['stale'] = True
+            return json_response(body)
 
         except Exception as e:
             current_app.logger.error(f"Error in /api/catalogs: {e}")
             return jsonify({"status": "error", "error": str(e)}), 500
 
+    @fincompass_blueprint.route('/api/catalogs/<int:catalog_id>/quotes', methods=['GET'])
+    def api_get_catalog_quotes(catalog_id):
+        """Quote currencies of a synced catalog with their symbol counts, for intention universe filters."""
+        catalog = db.get_catalog_by_id(catalog_id)
+        if not catalog:
+            return jsonify({'status': 'error', 'error': 'Catalog not found.'}), 404
+        index = index_for_catalog(db, catalog['aetherone_catalog_id'])
+        return jsonify({'status': 'success', 'symbols': len(index), 'quotes': index.quotes()})
+
     @fincompass_blueprint.route('/api/catalogs/<int:catalog_id>/select', methods=['POST'])
     def api_select_catalog(catalog_id):
         """
@@ -419,6 +820,13 @@ def create_blueprint(app_instance=None):
     @fincompass_blueprint.route('/api/intentions', methods=['POST'])
     def api_create_intention():
         data = request.get_json()
+        try:
+            target_servers = format_server_ids(data.get('target_servers'))
+            max_universe_size = parse_max_universe_size(data.get('max_universe_size', 0))
+        except MagicError as e:
+            return jsonify({'status': 'error', 'error': str(e)}), e.status_code
+        except ValueError as e:
+            return jsonify({'status': 'error', 'error': str(e)}), 400
         intention = db.create_intention(
             intention=data.get('intention'),
             description=data.get('description'),
@@ -429,13 +837,26 @@ def create_blueprint(app_instance=None):
             take_profit_percentage=data.get('take_profit_percentage', 0),
             dynamic_sell_timing=data.get('dynamic_sell_timing', False),
             min_hold_minutes=data.get('min_hold_minutes', 0),
-            max_hold_minutes=data.get('max_hold_minutes', 0)
+            max_hold_minutes=data.get('max_hold_minutes', 0),
+            allowed_quotes=format_list(data.get('allowed_quotes')),
+            include_symbols=format_list(data.get('include_symbols')),
+            exclude_symbols=format_list(data.get('exclude_symbols')),
+            max_universe_size=max_universe_size,
+            target_servers=target_servers,
+            local_sell_timing=data.get('local_sell_timing', False)
         )
         return jsonify(intention), 201
 
     @fincompass_blueprint.route('/api/intentions/<int:intention_id>', methods=['PUT'])
     def api_update_intention(intention_id):
         data = request.get_json()
+        try:
+            target_servers = format_server_ids(data.get('target_servers'))
+            max_universe_size = parse_max_universe_size(data.get('max_universe_size'))
+        except MagicError as e:
+            return jsonify({'status': 'error', 'error': str(e)}), e.status_code
+        except ValueError as e:
+            return jsonify({'status': 'error', 'error': str(e)}), 400
         db.update_intention(
             intention_id=intention_id,
             intention=data.get('intention'),
@@ -447,7 +868,13 @@ def create_blueprint(app_instance=None):
             take_profit_percentage=data.get('take_profit_percentage'),
             dynamic_sell_timing=data.get('dynamic_sell_timing'),
             min_hold_minutes=data.get('min_hold_minutes'),
-            max_hold_minutes=data.get('max_hold_minutes')
+            max_hold_minutes=data.get('max_hold_minutes'),
+            allowed_quotes=format_list(data.get('allowed_quotes')),
+            include_symbols=format_list(data.get('include_symbols')),
+            exclude_symbols=format_list(data.get('exclude_symbols')),
+            max_universe_size=max_universe_size,
+            target_servers=target_servers,
+            local_sell_timing=data.get('local_sell_timing')
         )
         return jsonify({'status': 'success'})
 
@@ -464,72 +891,29 @@ def create_blueprint(app_instance=None):
         The provider's API URL is read from the local FinCompass database, joining on server_id.
         """
         try:
-            # 1. Look up provider in local DB by exchange_id and get server_url
-            selected_server = db.get_selected_server()
-            provider = db.get_provider_with_url_by_exchange_id(selected_server['id'], exchange_id)
-            if not provider or not provider.get('server_url'):
-                return jsonify({"status": "error", "error": f"Provider '{exchange_id}' not found or missing server URL in database."}), 400
-
-            # 2. Build the API URL (assume the server's URL is the base, append the endpoint as needed)
-            api_url = provider['server_url'].rstrip('/') + "/api/v1/symbols/exchange/" + exchange_id + "?trading_type=spot"
-            print(f"[DEBUG] API URL: {api_url}")
-            resp = requests.get(api_url, headers={"accept": "application/json"}, timeout=20)
-            if not resp.ok:
-                return jsonify({"status": "error", "error": f"Upstream error: {resp.status_code} {resp.text}"}), 502
-
-            # Debug: log the raw response text before parsing JSON
-            print(f"[DEBUG] API response text: {resp.text}")
+            # Full sync of the exchange's symbols (see sync_daemon.sync_symbols); the sync daemon keeps it fresh from now on
+            daemon = sync_daemon.resolve()
             try:
-                rates_data = resp.json()
-            except Exception as e:
-                current_app.logger.error(f"Error parsing JSON from {api_url}: {resp.text}")
-                return jsonify({"status": "error", "error": f"Invalid JSON from upstream: {e}"}), 502
-
-            # 3. Use main DAO to check/create catalog
-            dao = get_case_dao()
-            catalog = dao.get_catalog_by_name(exchange_id)
-            if not catalog:
-                from domains.aetherOneDomains import Catalog
-                catalog = Catalog(exchange_id, f"Rates for {exchange_id}", "FinCompass")
-                dao.insert_catalog(catalog)
-                catalog = dao.get_catalog_by_name(exchange_id)
-
-            # 4. Full sync: remove local rates not on server, then insert new ones
-            from domains.aetherOneDomains import Rate
-            
-            # FIX: Use 'symbols' key and strip quotes from each symbol
-            raw_symbols = rates_data.get('symbols', [])
-            server_symbols = {s.strip('"') for s in raw_symbols}
-            
-            current_app.logger.info(f"[SYNC] Found {len(server_symbols)} symbols from API for catalog '{exchange_id}'.")
-            
-            local_rates = dao.list_rates_from_catalog(catalog.id)
-            current_app.logger.info(f"[SYNC] Found {len(local_rates)} existing local rates for catalog '{catalog.id}'.")
-
-            # Remove local rates not present on the server
-            deleted_count = 0
-            for rate in local_rates:
-                if rate.signature not in server_symbols:
-                    dao.delete_rate(rate.id)
-                    deleted_count += 1
-            
-            # Insert new rates from the server
-            inserted_count = 0
-            # Re-fetch existing symbols after deletion
-            existing_symbols = {r.signature for r in dao.list_rates_from_catalog(catalog.id)}
-            for symbol in server_symbols:
-                if symbol not in existing_symbols:
-                    dao.insert_rate(Rate(symbol, '', catalog.id))
-                    inserted_count += 1
-            
-            current_app.logger.info(f"[SYNC] Deleted {deleted_count} stale rates and inserted {inserted_count} new rates for catalog '{exchange_id}'.")
+                result = daemon.refresh('symbols', exchange_id)
+            except (RateLimitTimeout, CircuitOpen) as e:
+                return jsonify({"status": "error", "error": str(e)}), 503, {'Retry-After': str(max(1, round(e.retry_after)))}
+            except SyncError as e:
+                if e.status_code == 400:
+                    # Nothing to sync, so no sync status to keep
+                    db.delete_sync_status('symbols', exchange_id)
+                return jsonify({"status": "error", "error": str(e)}), e.status_code
+            if daemon.running:
+                # The catalog may be new
+                daemon.request('catalogs')
 
             return jsonify({
                 "status": "success",
                 "message": f"Sync complete for {exchange_id}",
-                "inserted": inserted_count,
-                "deleted": deleted_count,
-                "total_in_catalog": len(server_symbols)
+                "inserted": result['inserted'],
+                "deleted": result['deleted'],
+                "total_in_catalog": result['total'],
+                "quotes": result['quotes'],
+                "constraints": result['constraints']
             })
 
         except Exception as e:
@@ -545,13 +929,19 @@ def create_blueprint(app_instance=None):
     # 7. get schedule id
     # 8. create a schedule to sell with schedule id
 
+    def serve_asset(path):
+        asset = static_manifest.get(path)
+        if asset is None:
+            return not_found(None)
+        return asset_response(asset, request, current_app.response_class)
+
     @fincompass_blueprint.route('/js/<path:filename>')
     def serve_js(filename):
-        return send_from_directory(FRONTEND_DIST_DIR / 'js', filename)
+        return serve_asset('js/' + filename)
 
     @fincompass_blueprint.route('/css/<path:filename>')
     def serve_css(filename):
-        return send_from_directory(FRONTEND_DIST_DIR / 'css', filename)
+        return serve_asset('css/' + filename)
 
     @fincompass_blueprint.route('/', defaults={'path': ''})
     @fincompass_blueprint.route('/<path:path>')
@@ -559,11 +949,11 @@ def create_blueprint(app_instance=None):
         """
         Serve the FinCompass frontend (index.html and static assets).
         The directory 'py/plugins/FinCompass/frontend/dist' must exist and contain index.html and assets.
+        Files are looked up in the in-memory manifest; anything else gets index.html (hash routing).
         """
-        # Serve static files if they exist
-        if path and (FRONTEND_DIST_DIR / path).exists():
-            return send_from_directory(FRONTEND_DIST_DIR, path)
-        return send_from_directory(FRONTEND_DIST_DIR, 'index.html')
+        if path and static_manifest.get(path) is not None:
+            return serve_asset(path)
+        return serve_asset('index.html')
 
     @fincompass_blueprint.route('/api/catalogs/deselect', methods=['POST'])
     def api_deselect_catalog():
@@ -579,12 +969,19 @@ def create_blueprint(app_instance=None):
 
     @fincompass_blueprint.route('/api/cases', methods=['GET'])
     def api_get_cases():
-        # Sync cases from AetherOnePy before returning
+        # Cases are synced from AetherOnePy by the sync daemon (inline when it is disabled)
         try:
-            core_cases = db.get_cases_from_aetheronepy()
-            db.sync_cases(core_cases)
+            daemon = sync_daemon.resolve()
+            stale = False
+            if daemon.running:
+                stale = not daemon.is_fresh('cases')
+            else:
+                daemon.refresh('cases')
             cases = db.get_cases()
-            return jsonify({"status": "success", "cases": cases})
+            body = {"status": "success", "cases": cases}
+            if stale:
+                body['stale'] = True
+            return json_response(body)
         except Exception as e:
             return jsonify({"status": "error", "error": str(e)})
 
@@ -599,16 +996,8 @@ def create_blueprint(app_instance=None):
         return jsonify({"status": "success"})
 
     @fincompass_blueprint.route('/api/start-magic', methods=['POST'])
+    @idempotent(idempotency, 'start-magic')
     def api_start_magic():
-        import datetime
-        import requests
-        import os
-        from domains.aetherOneDomains import Session as AOSession, Analysis as AOAnalysis
-        from services.analyzeService import analyze
-        from services.hotbitsService import HotbitsService, HotbitsSource
-        class DummyMain:
-            def emitMessage(self, *args, **kwargs):
-                pass
         try:
             data = request.get_json()
             # --- Variables from API request (frontend) ---
@@ -616,176 +1005,127 @@ def create_blueprint(app_instance=None):
             plugin_case_id = data.get('case_id')            # FinCompass plugin DB
             plugin_provider_id = data.get('provider_id')    # FinCompass plugin DB
             plugin_catalog_id = data.get('catalog_id')      # FinCompass plugin DB
-            print(f"[DEBUG] plugin_intention_id: {plugin_intention_id}, plugin_catalog_id: {plugin_catalog_id}, plugin_case_id: {plugin_case_id}, plugin_provider_id: {plugin_provider_id}")
+            tracer.set(intention_id=plugin_intention_id, case_id=plugin_case_id, provider_id=plugin_provider_id, catalog_id=plugin_catalog_id)
             if not all([plugin_intention_id, plugin_case_id, plugin_provider_id, plugin_catalog_id]):
                 return jsonify({'status': 'error', 'error': 'Missing required selection.'}), 400
+            # Optional: 'top' adds the top_k analysis results to the response, 'full' all of them
+            response_detail, top_k = parse_response_detail(data.get('response_detail'), data.get('top_k'))
 
-            # --- PLUGIN DB: Get intention (for hold_minutes) from FinCompass database ---
-            plugin_intention = next((i for i in db.get_intentions() if i['id'] == plugin_intention_id), None)
+            # --- PLUGIN DB: Get intention and case (mapped to the AetherOnePy case) in one query ---
+            entry = db.resolve_magic_items([{'intention_id': plugin_intention_id, 'case_id': plugin_case_id}])[0]
+            plugin_intention = entry['intention']
             if not plugin_intention:
                 return jsonify({'status': 'error', 'error': 'Intention not found.'}), 404
-            hold_minutes = plugin_intention.get('hold_minutes', 0) or 0
-            print(f"[DEBUG] plugin_intention: {plugin_intention}")
-
-            # --- PLUGIN DB: Get provider from FinCompass database ---
-            plugin_provider = next((p for p in db.get_providers() if p['id'] == plugin_provider_id), None)
-            if not plugin_provider:
-                return jsonify({'status': 'error', 'error': 'Provider not found.'}), 404
-            print(f"[DEBUG] plugin_provider: {plugin_provider}")
-
-            # --- PLUGIN DB: Map plugin_catalog_id to aetherone_catalog_id ---
-            plugin_catalog_row = next((c for c in db.get_catalogs() if c['id'] == plugin_catalog_id), None)
-            if not plugin_catalog_row:
-                return jsonify({'status': 'error', 'error': 'Catalog not found.'}), 404
-            aetherone_catalog_id = plugin_catalog_row['aetherone_catalog_id']  # main AetherOnePy DB
-            print(f"[DEBUG] plugin_catalog_id: {plugin_catalog_id}, aetherone_catalog_id: {aetherone_catalog_id}")
-
-            # --- MAIN AETHERONE DB: Get case ID for AetherOnePy (from plugin DB mapping) ---
-            plugin_case_row = next((c for c in db.get_cases() if c['id'] == plugin_case_id), None)
-            if not plugin_case_row:
+            tracer.event('debug', 'plugin_intention', intention=lambda: plugin_intention)
+
+            # --- PLUGIN DB: Provider, catalog (mapped to aetherone_catalog_id) and selected server ---
+            target = resolve_target(db, plugin_provider_id, plugin_catalog_id)
+            if not entry['case']:
                 return jsonify({'status': 'error', 'error': 'Case not found.'}), 404
-            aetherone_case_id = plugin_case_row['aetherone_case_id']  # main AetherOnePy DB
-            print(f"[DEBUG] plugin_case_id: {plugin_case_id}, aetherone_case_id: {aetherone_case_id}")
-
-            # --- MAIN AETHERONE DB: Create session ---
-            session_obj = AOSession(plugin_intention['intention'], plugin_intention.get('description', ''), aetherone_case_id)
-            get_case_dao().insert_session(session_obj)  # main DB
-            aetherone_session = session_obj  # Now has .id set
-            print(f"[DEBUG] aetherone_session: {aetherone_session}")
-
-            # --- MAIN AETHERONE DB: Create analysis ---
-            analysis_obj = AOAnalysis('', aetherone_session.id)
-            analysis_obj.catalogId = aetherone_catalog_id
-            get_case_dao().insert_analysis(analysis_obj)  # main DB
-            aetherone_analysis = analysis_obj  # Now has .id set
-            print(f"[DEBUG] aetherone_analysis: {aetherone_analysis}")
-
-            # --- MAIN AETHERONE DB: Run analysis (get rates, call analyze, insert results) ---
-            rates_list = get_case_dao().list_rates_from_catalog(aetherone_catalog_id)  # main DB
-            # Create HotbitsService instance locally (independent)
-            PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..'))
-            hotbits = HotbitsService(HotbitsSource.WEBCAM, os.path.join(PROJECT_ROOT, "hotbits"), db, DummyMain())
-            enhanced_rates = analyze(
-                aetherone_analysis.id,
-                rates_list,
-                hotbits,
-                get_case_dao().get_setting('analysisAlwaysCheckGV'),
-                get_case_dao().get_setting('analysisAdvanced')
-            )
-            #print(f"[DEBUG] enhanced_rates: {[r.to_dict() for r in enhanced_rates]}")
-            get_case_dao().insert_rates_for_analysis(enhanced_rates)  # main DB
-            results = [r.to_dict() for r in enhanced_rates]
-            print(f"[DEBUG] results: {results}")
-
-            # --- Find highest rate (from analysis results) ---
-            highest = max(results, key=lambda r: r.get('value', 0)) if results else None
-            print(f"[DEBUG] highest: {highest}")
-            if not highest:
-                return jsonify({'status': 'error', 'error': 'No rates found in analysis.'}), 500
-            symbol = highest.get('signature') or highest.get('symbol')
-            if not symbol:
-                return jsonify({'status': 'error', 'error': 'No symbol found in highest rate.'}), 500
-            print(f"[DEBUG] symbol: {symbol}")
-
-            # --- Calculate buy/sell times ---
-            now = datetime.datetime.utcnow()
-            buy_time = now.isoformat(timespec='seconds') + 'Z'
-            
-            # Dynamic timing logic
-            if plugin_intention.get('dynamic_sell_timing', False):
-                from .timing_analysis import analyze_timing_for_symbol
-                min_hold = plugin_intention.get('min_hold_minutes', 30)
-                max_hold = plugin_intention.get('max_hold_minutes', 1440)  # Default 1 day
-                
-                timing_analysis = analyze_timing_for_symbol(
-                    symbol, 
-                    min_hold, 
-                    max_hold, 
-                    enhanced_rates, 
-                    hotbits
-                )
-                optimal_hold_minutes = timing_analysis.get('optimal_hold_minutes', hold_minutes)
-                print(f"[DEBUG] Dynamic timing analysis: {timing_analysis}")
-            else:
-                optimal_hold_minutes = hold_minutes
-            
-            sell_time = (now + datetime.timedelta(minutes=optimal_hold_minutes)).isoformat(timespec='seconds') + 'Z'
-            print(f"[DEBUG] buy_time: {buy_time}")
-            print(f"[DEBUG] sell_time: {sell_time}")
-            print(f"[DEBUG] optimal_hold_minutes: {optimal_hold_minutes}")
-
-
-            # --- PLUGIN DB: Get selected server and provider (for remote schedule) ---
-            print(f"[DEBUG] highest: {highest}")
-            selected_server = db.get_selected_server()  # plugin DB
-            print(f"[DEBUG] selected_server: {selected_server}")
-            provider = db.get_provider_by_server_and_provider_id(
-                selected_server['id'],
-                plugin_provider['server_provider_id']
-            )  # plugin DB
-            print(f"[DEBUG] provider: {provider}")
-            if not provider or not provider.get('server_url'):
-                return jsonify({'status': 'error', 'error': 'Provider or server URL not found in database.'}), 500
-            remote_url = provider['server_url'].rstrip('/') + '/api/v1/schedules/'
-            payload = {
-                'amount': str(plugin_intention.get('amount', '0')),
-                'is_active': True,
-                'name': f"{plugin_intention['intention'][:20].strip()} {symbol}",
-                'order_type': 'market',
-                'provider_id': provider['server_provider_id'],
-                'recurrence_type': 'none',
-                'scheduled_time': buy_time,  # use buy_time as the scheduled time
-                'sell_all': False,
-                'side': 'buy',
-                'symbol': symbol,
-                'social_key': '',  # TODO: fetch from SocialPlugin
-                'stop_loss_percentage': plugin_intention.get('stop_loss_percentage', 0),
-                'take_profit_percentage': plugin_intention.get('take_profit_percentage', 0)
+            aetherone_case_id = entry['case']['aetherone_case_id']  # main AetherOnePy DB
+            tracer.set(aetherone_catalog_id=target['aetherone_catalog_id'], aetherone_case_id=aetherone_case_id)
+
+            # --- MAIN AETHERONE DB: Create session and analysis, run analysis, post and save schedules ---
+            case_dao = get_case_dao()
+            rates_list = case_dao.list_rates_from_catalog(target['aetherone_catalog_id'])  # main DB
+            hotbits = create_hotbits(db.resolve())
+            outcome = run_magic(db, case_dao, target, plugin_intention, aetherone_case_id, rates_list, hotbits,
+                                response_detail=response_detail, top_k=top_k,
+                                idempotency_key=request.headers.get(IDEMPOTENCY_HEADER) or None,
+                                sell_scheduler=sell_scheduler if sell_scheduler_enabled() else None,
+                                outbox=outbox if outbox_enabled() else None)
+            response = {
+                'status': 'success',
+                'buy_schedule_id': outcome['buy_schedule_id'],
+                'sell_schedule_id': outcome['sell_schedule_id'],
+                'server_schedule_buy_id': outcome['server_schedule_buy_id'],
+                'server_schedule_sell_id': outcome['server_schedule_sell_id'],
+                'buy_payload': outcome['buy_payload'],
+                'sell_payload': outcome['sell_payload'],
+                'targets': outcome['targets'],
+                'sell_timer_id': outcome['sell_timer_id'],
+                'queued': outcome['queued']
             }
-            api_key = selected_server.get('api_key')
-            if not api_key:
-                return jsonify({'status': 'error', 'error': 'No API key set for the selected server.'}), 500
-            headers = {'X-API-KEY': api_key}
-            print(f"[DEBUG] payload: {payload}")
-            try:
-                resp = requests.post(remote_url, json=payload, headers=headers, timeout=15)
-                resp.raise_for_status()
-                resp_data = resp.json()
-                buy_schedule_id = resp_data.get('id')
-                print(f"[DEBUG] buy_schedule_id: {buy_schedule_id}")
-
-                # Post sell schedule
-                sell_payload = payload.copy()
-                sell_payload['side'] = 'sell'
-                sell_payload['scheduled_time'] = sell_time
-                sell_payload['linked_buy_schedule_id'] = buy_schedule_id
-                print(f"[DEBUG] sell_payload: {sell_payload}")
-                sell_resp = requests.post(remote_url, json=sell_payload, headers=headers, timeout=15)
-                sell_resp.raise_for_status()
-                sell_resp_data = sell_resp.json()
-                sell_schedule_id = sell_resp_data.get('id')
-                print(f"[DEBUG] sell_schedule_id: {sell_schedule_id}")
-            except Exception as e:
-                return jsonify({'status': 'error', 'error': f'Failed to post schedule to remote server: {e}'}), 502
-
-            # --- PLUGIN DB: Save schedule locally ---
-            schedule_record = db.create_intention_schedule(
-                plugin_intention_id,
-                buy_time,
-                sell_time,
-                status='scheduled',
-                server_schedule_buy_id=buy_schedule_id,
-                server_schedule_sell_id=sell_schedule_id
-            )
+            if 'results' in outcome:
+                response['results'] = outcome['results']
+            return jsonify(response)
+        except MagicError as e:
+            if e.buy_schedule_ids:
+                # Buys were posted before the run failed: replay this error rather than post them again
+                keep_response()
+                return jsonify({'status': 'error', 'error': str(e), 'buy_schedule_ids': e.buy_schedule_ids}), e.status_code
+            return jsonify({'status': 'error', 'error': str(e)}), e.status_code
+        except Exception as e:
+            return jsonify({'status': 'error', 'error': str(e)}), 500
+
+    @fincompass_blueprint.route('/api/start-magic/batch', methods=['POST'])
+    @idempotent(idempotency, 'start-magic-batch')
+    def api_start_magic_batch():
+        """
+        Run start-magic for many intention/case pairs against one provider catalog.
+        The catalog's rates are loaded once and the runs (analysis + schedule posting) execute on a worker pool.
+        ---
+        parameters:
+          - name: body
+            in: body
+            required: true
+            schema:
+              type: object
+              properties:
+                provider_id:
+                  type: integer
+                catalog_id:
+                  type: integer
+                max_workers:
+                  type: integer
+                  description: Concurrent runs (default 4, max 16)
+                response_detail:
+                  type: string
+                  enum: [none, top, full]
+                  description: Analysis results to include per item (default none)
+                top_k:
+                  type: integer
+                  description: Results per item for response_detail 'top' (default 5, max 100)
+                items:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      intention_id:
+                        type: integer
+                      case_id:
+                        type: integer
+                  description: At most 500 items
+        responses:
+          200:
+            description: Per-item results; failed items carry 'error' and 'status_code'
+          400:
+            description: Missing provider, catalog or items, or too many items
+        """
+        try:
+            data = request.get_json() or {}
+            items = data.get('items') or []
+            provider_id = data.get('provider_id')
+            catalog_id = data.get('catalog_id')
+            if not provider_id or not catalog_id or not isinstance(items, list) or not items:
+                return jsonify({'status': 'error', 'error': 'provider_id, catalog_id and a non-empty items list are required.'}), 400
+            if len(items) > MAX_BATCH_ITEMS:
+                return jsonify({'status': 'error', 'error': f'A batch takes at most {MAX_BATCH_ITEMS} items, got {len(items)}.'}), 400
+            response_detail, top_k = parse_response_detail(data.get('response_detail'), data.get('top_k'))
+            max_workers = parse_max_workers(data.get('max_workers'))
+            tracer.set(items=len(items), provider_id=provider_id, catalog_id=catalog_id)
+            results = run_magic_batch(db, get_case_dao(), items, provider_id, catalog_id, max_workers,
+                                      response_detail, top_k, request.headers.get(IDEMPOTENCY_HEADER) or None,
+                                      sell_scheduler if sell_scheduler_enabled() else None, outbox if outbox_enabled() else None)
+            succeeded = sum(1 for r in results if r['status'] == 'success')
             return jsonify({
-                'status': 'success',
-                'buy_schedule_id': buy_schedule_id,
-                'sell_schedule_id': sell_schedule_id,
-                'server_schedule_buy_id': schedule_record.get('server_schedule_buy_id'),
-                'server_schedule_sell_id': schedule_record.get('server_schedule_sell_id'),
-                'buy_payload': payload,
-                'sell_payload': sell_payload
+                'status': 'success' if succeeded == len(results) else ('partial' if succeeded else 'error'),
+                'succeeded': succeeded,
+                'failed': len(results) - succeeded,
+                'results': results
             })
+        except MagicError as e:
+            return jsonify({'status': 'error', 'error': str(e)}), e.status_code
         except Exception as e:
             return jsonify({'status': 'error', 'error': str(e)}), 500
 
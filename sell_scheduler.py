@@ -0,0 +1,282 @@
+"""
+Locally timed sells for intentions with dynamic sell timing.
+
+By default start-magic posts the buy together with a sell at the time the
+timing model picked when the run was made. An intention with
+local_sell_timing (and dynamic_sell_timing) only gets its buy posted; the
+sell is stored as a timer in the plugin DB (sell_timers) and the timing model
+is re-evaluated at checkpoints between min_hold_minutes and
+max_hold_minutes, every time with a fresh hotbits draw. The sell is posted
+to every target server once the re-evaluated sell time has come, and at
+max_hold_minutes at the latest.
+
+One dispatcher thread keeps a heap of (next check, timer id): adding or
+moving a timer is O(log n) and only that pair is held in memory, the timer
+itself is read from the DB when it is due, so thousands of open positions
+cost little. On start the active timers are loaded from the DB, so a restart
+resumes where it stopped; timers that came due while the process was down
+fire at once.
+
+A due timer is claimed in the DB before it is handled (status 'posting' with
+a lease of POST_LEASE seconds), so processes sharing the DB never handle the
+same timer twice and a claim left behind by a crash expires. Sell posts carry
+an Idempotency-Key, so a retried post is not duplicated on the server; the
+sell time is fixed (sell_at) when the sell first comes due, so every retry
+sends the same request under that key.
+
+Configuration (environment):
+
+    FINCOMPASS_SELL_SCHEDULER      0 disables the dispatcher in this process (timers wait in the DB)
+    FINCOMPASS_SELL_CHECKPOINTS    re-evaluations between min and max hold (default 6)
+"""
+import heapq
+import json
+import os
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .fincompass_client import FinCompassClient
+from .magic import iso_time, post_sell
+from .rate_limit import RateLimitTimeout
+from .timing_analysis import analyze_timing_for_symbol
+from .tracing import tracer
+
+DEFAULT_CHECKPOINTS = 6
+# Checkpoints are never closer together than this, in seconds
+MIN_CHECKPOINT_INTERVAL = 60.0
+# How long a claimed timer is reserved for the process handling it
+POST_LEASE = 120.0
+POST_WORKERS = 4
+MAX_POST_ATTEMPTS = 5
+# Delay before retrying targets whose sell post failed, by attempt
+RETRY_DELAYS = (10.0, 30.0, 60.0, 300.0)
+# Longest the dispatcher sleeps without looking at the clock again (wall-clock jumps)
+MAX_SLEEP = 60.0
+
+
+def enabled() -> bool:
+    return os.environ.get('FINCOMPASS_SELL_SCHEDULER', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def checkpoint_interval(timer: Dict[str, Any], checkpoints: int) -> float:
+    """Seconds between re-evaluations of a timer: its hold range split into `checkpoints` steps."""
+    hold_range = (timer['max_hold_minutes'] - timer['min_hold_minutes']) * 60
+    return max(MIN_CHECKPOINT_INTERVAL, hold_range / max(1, checkpoints))
+
+
+class SellScheduler:
+    def __init__(self, db, hotbits_factory: Optional[Callable[[], Any]] = None, checkpoints: int = DEFAULT_CHECKPOINTS,
+                 clock: Callable[[], float] = time.time, post_workers: int = POST_WORKERS):
+        self.db = db
+        self.checkpoints = max(1, checkpoints)
+        self._hotbits_factory = hotbits_factory
+        self._hotbits = None
+        self._hotbits_lock = threading.Lock()
+        self._clock = clock
+        self._heap: List[Tuple[float, int]] = []
+        # timer id -> its current heap time; heap entries that no longer match are stale and skipped
+        self._scheduled: Dict[int, float] = {}
+        self._wakeup = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._executor = ThreadPoolExecutor(max_workers=post_workers, thread_name_prefix='fincompass-sell')
+        self._stats_lock = threading.Lock()
+        self.stats = {'checkpoints': 0, 'posted': 0, 'retries': 0, 'failed': 0}
+
+    @classmethod
+    def from_env(cls, db, hotbits_factory: Optional[Callable[[], Any]] = None) -> 'SellScheduler':
+        try:
+            checkpoints = int(os.environ.get('FINCOMPASS_SELL_CHECKPOINTS', DEFAULT_CHECKPOINTS))
+        except ValueError:
+            checkpoints = DEFAULT_CHECKPOINTS
+        return cls(db, hotbits_factory, checkpoints)
+
+    def start(self) -> 'SellScheduler':
+        """Load the active timers from the DB and start the dispatcher thread (once)."""
+        with self._wakeup:
+            if self._thread is not None:
+                return self
+            for timer_id, next_check_at in self.db.get_active_sell_timers():
+                self._push(timer_id, next_check_at)
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='fincompass-sell-scheduler', daemon=True)
+            self._thread.start()
+            pending = len(self._scheduled)
+        print(f"[FinCompass] Sell scheduler started with {pending} pending sell timer(s)")
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+        self._executor.shutdown(wait=True)
+
+    def add(self, timer_id: int, next_check_at: float) -> None:
+        """Schedule (or move) a timer; O(log n)."""
+        with self._wakeup:
+            self._push(timer_id, next_check_at)
+            if self._heap[0][1] == timer_id:
+                self._wakeup.notify()
+
+    def cancel(self, timer_id: int) -> bool:
+        """Cancel a pending timer; False if it is already being posted or done."""
+        cancelled = self.db.cancel_sell_timer(timer_id)
+        if cancelled:
+            with self._wakeup:
+                self._scheduled.pop(timer_id, None)
+        return cancelled
+
+    def _push(self, timer_id: int, at: float) -> None:
+        self._scheduled[timer_id] = at
+        heapq.heappush(self._heap, (at, timer_id))
+
+    def _pop_due(self) -> Optional[int]:
+        """Wait for the next due timer and take it off the heap; None once stopping. Call with _wakeup held."""
+        while not self._stopping:
+            while self._heap and self._scheduled.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            now = self._clock()
+            if self._heap and self._heap[0][0] <= now:
+                _, timer_id = heapq.heappop(self._heap)
+                del self._scheduled[timer_id]
+                return timer_id
+            self._wakeup.wait(min(self._heap[0][0] - now, MAX_SLEEP) if self._heap else MAX_SLEEP)
+        return None
+
+    def _run(self) -> None:
+        while True:
+            with self._wakeup:
+                timer_id = self._pop_due()
+            if timer_id is None:
+                return
+            self._executor.submit(self._handle_safely, timer_id)
+
+    def _handle_safely(self, timer_id: int) -> None:
+        try:
+            self.handle(timer_id)
+        except Exception as e:
+            # Leave the claim to expire; the timer is looked at again after POST_LEASE
+            print(f"[FinCompass] Sell timer {timer_id} failed: {e}")
+            self.add(timer_id, self._clock() + POST_LEASE)
+
+    def handle(self, timer_id: int) -> None:
+        """Handle one due timer: re-evaluate its sell time at a checkpoint, or post the sell once it is due."""
+        now = self._clock()
+        if not self.db.claim_sell_timer(timer_id, now, now + POST_LEASE):
+            # Not due, finished, cancelled or held by another process: look again when its claim runs out
+            timer = self.db.get_sell_timer(timer_id)
+            if timer and timer['status'] in ('pending', 'posting'):
+                self.add(timer_id, timer['next_check_at'])
+            return
+        timer = self.db.get_sell_timer(timer_id)
+        with tracer.span('sell_timer', timer_id=timer_id, symbol=timer['symbol']):
+            max_sell_at = timer['buy_at'] + timer['max_hold_minutes'] * 60
+            if now < timer['due_at'] and now < max_sell_at:
+                due_at, timing_score = self.reevaluate(timer)
+                self._count('checkpoints')
+                if due_at > now:
+                    next_check_at = min(due_at, now + checkpoint_interval(timer, self.checkpoints))
+                    tracer.set(due_at=due_at, next_check_at=next_check_at)
+                    self.db.update_sell_timer(timer_id, 'pending', next_check_at=next_check_at, due_at=due_at, timing_score=timing_score,
+                                              checkpoints=timer['checkpoints'] + 1)
+                    self.add(timer_id, next_check_at)
+                    return
+                timer.update(due_at=due_at, timing_score=timing_score, checkpoints=timer['checkpoints'] + 1)
+            self.post(timer, now)
+
+    def _get_hotbits(self):
+        with self._hotbits_lock:
+            if self._hotbits is None and self._hotbits_factory is not None:
+                self._hotbits = self._hotbits_factory()
+            return self._hotbits
+
+    def reevaluate(self, timer: Dict[str, Any]) -> Tuple[float, Optional[float]]:
+        """(due_at, timing_score) from the timing model with a fresh hotbits draw; the current ones if that is not possible."""
+        try:
+            hotbits = self._get_hotbits()
+            if hotbits is None:
+                return timer['due_at'], timer['timing_score']
+            rate = types.SimpleNamespace(signature=timer['symbol'], energetic_value=timer['energetic_value'] or 0,
+                                         gv=timer['gv'] if timer['gv'] is not None else 500)
+            timing = analyze_timing_for_symbol(timer['symbol'], timer['min_hold_minutes'], timer['max_hold_minutes'], [rate], hotbits)
+        except Exception as e:
+            tracer.event('warning', 'sell timing re-evaluation failed', error=lambda: str(e))
+            return timer['due_at'], timer['timing_score']
+        return timer['buy_at'] + timing['optimal_hold_minutes'] * 60, timing.get('timing_score')
+
+    def post(self, timer: Dict[str, Any], now: float) -> None:
+        """Post the sell to every target that does not have it yet; retry failures, give up after MAX_POST_ATTEMPTS."""
+        targets = json.loads(timer['targets'])
+        if timer['sell_at'] is None:
+            timer['sell_at'] = now
+            self.db.update_sell_timer(timer['id'], 'posting', sell_at=now)
+        sell_time = iso_time(timer['sell_at'])
+        servers = self.db.get_server_targets([t['server_id'] for t in targets if t.get('server_id') is not None], None)
+        errors = []
+        newly_posted = []
+        for target in targets:
+            if target.get('sell_schedule_id') is not None:
+                continue
+            server = servers.get(target.get('server_id'))
+            if not server or not server.get('api_key'):
+                errors.append((target, 'No API key set for this server.'))
+                continue
+            client = FinCompassClient(target['server_url'], server['api_key'], exchange_id=target.get('exchange_id'))
+            key = timer['idempotency_key'] or f"sell-timer:{timer['id']}:{target.get('server_id')}"
+            try:
+                with tracer.span('post_sell', server_id=target.get('server_id')):
+                    target['sell_schedule_id'], _ = post_sell(client, target['buy_payload'], sell_time, target['buy_schedule_id'], key)
+                target['sell_time'] = sell_time
+                newly_posted.append(target)
+            except RateLimitTimeout as e:
+                errors.append((target, f'Remote server is rate limited: {e}'))
+            except Exception as e:
+                errors.append((target, f'Failed to post sell schedule to remote server: {e}'))
+
+        for target in newly_posted:
+            self.db.update_schedule_target(timer['schedule_id'], target['server_id'], 'scheduled', str(target['sell_schedule_id']))
+        attempts = timer['attempts'] + 1
+        error = '; '.join(f"server {target.get('server_id')}: {message}" for target, message in errors) or None
+        if errors and attempts < MAX_POST_ATTEMPTS:
+            retry_at = now + RETRY_DELAYS[min(attempts, len(RETRY_DELAYS)) - 1]
+            self.db.update_sell_timer(timer['id'], 'pending', next_check_at=retry_at, due_at=timer['due_at'], timing_score=timer['timing_score'],
+                                      checkpoints=timer['checkpoints'], attempts=attempts, targets=json.dumps(targets), error=error)
+            self._count('retries')
+            self.add(timer['id'], retry_at)
+            print(f"[FinCompass] Sell timer {timer['id']} ({timer['symbol']}): retrying in {retry_at - now:.0f}s after: {error}")
+            return
+
+        posted = [t for t in targets if t.get('sell_schedule_id') is not None]
+        status = 'posted' if posted else 'failed'
+        self.db.update_sell_timer(timer['id'], status, due_at=timer['due_at'], timing_score=timer['timing_score'],
+                                  checkpoints=timer['checkpoints'], attempts=attempts, targets=json.dumps(targets), error=error)
+        for target, message in errors:
+            self.db.update_schedule_target(timer['schedule_id'], target['server_id'], 'failed', error=message)
+        self._count('posted' if posted else 'failed')
+        self.db.update_intention_schedule(
+            timer['schedule_id'],
+            sell_datetime=sell_time,
+            status='scheduled' if posted else 'sell_failed',
+            server_schedule_sell_id=str(posted[0]['sell_schedule_id']) if posted else None,
+            hold_minutes=int((timer['sell_at'] - timer['buy_at']) // 60),
+            timing_score=timer['timing_score'],
+        )
+
+    def _count(self, stat: str) -> None:
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._wakeup:
+            pending = len(self._scheduled)
+            next_at = min(self._scheduled.values()) if self._scheduled else None
+            running = self._thread is not None
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {'running': running, 'scheduled': pending, 'next_check_at': next_at, **stats}
@@ -0,0 +1,92 @@
+"""
+Lazy initialization helpers and startup-timing report for the FinCompass plugin.
+
+AetherOnePy imports every plugin and calls create_blueprint() while booting, so
+anything done at import or registration time delays the host. Heavy modules
+(requests and the AetherOnePy domain/service modules) and the plugin database
+(which runs its DDL on construction) are instead created on first use:
+
+    requests = lazy_module('requests')
+    db = Lazy('database', lambda: FinCompassDatabase(db_path))
+
+Every import and initialization is timed and recorded in `startup_report`,
+which is served by GET /api/debug/startup.
+"""
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+
+class StartupReport:
+    def __init__(self):
+        self._entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, component: str, kind: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(component, kind, time.perf_counter() - start)
+
+    def record(self, component: str, kind: str, duration: float) -> None:
+        with self._lock:
+            self._entries.append({
+                'component': component,
+                'kind': kind,
+                'ms': round(duration * 1000, 3),
+                'at': time.time(),
+            })
+
+    def entries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._entries)
+
+    def summary(self) -> Dict[str, Any]:
+        entries = self.entries()
+        totals: Dict[str, float] = {}
+        for entry in entries:
+            totals[entry['kind']] = round(totals.get(entry['kind'], 0.0) + entry['ms'], 3)
+        return {'entries': entries, 'total_ms_by_kind': totals}
+
+
+startup_report = StartupReport()
+
+
+class Lazy:
+    """
+    Thread-safe lazy initializer. The factory runs once, on first use, under a
+    lock; afterwards attribute access is forwarded to the created object.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], kind: str = 'init'):
+        self._name = name
+        self._factory = factory
+        self._kind = kind
+        self._value = None
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        return self._initialized
+
+    def resolve(self) -> Any:
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    with startup_report.timed(self._name, self._kind):
+                        self._value = self._factory()
+                    self._initialized = True
+        return self._value
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.resolve(), attr)
+
+
+def lazy_module(name: str) -> Lazy:
+    """A module that is imported (and timed) the first time one of its attributes is used."""
+    return Lazy(name, lambda: importlib.import_module(name), kind='import')
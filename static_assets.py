@@ -0,0 +1,198 @@
+"""
+Static asset serving for the FinCompass frontend (frontend/dist).
+
+The dist/ directory is scanned once into an in-memory manifest: file bytes,
+mimetype, a strong ETag and gzip/brotli variants. Pre-built `<file>.gz` /
+`<file>.br` siblings are used when present (see `python static_assets.py`),
+otherwise variants are compressed once while the manifest is built. Source
+maps (.map, only fetched by devtools) are never compressed, and files above
+MAX_RUNTIME_COMPRESS_SIZE only get the variants that were pre-built, so the
+first request does not pay for gzip 9 / brotli 11 of a large file.
+
+Caching:
+    - content-hashed bundles (js/app.<hash>.js, js/chunk-vendors.<hash>.js,
+      css/app.<hash>.css, ...) are served `immutable` for a year
+    - index.html is served `no-cache`, so browsers revalidate with If-None-Match
+      and get a 304 while it is unchanged
+    - other files (favicon.ico, ...) are cached for an hour
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+# Vue CLI appends an 8-character content hash to every bundle it emits
+HASHED_ASSET = re.compile(r'\.[0-9a-f]{8}\.(js|css)(\.map)?$')
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml', 'image/x-icon',
+                      'image/vnd.microsoft.icon')
+MIN_COMPRESS_SIZE = 512
+MAX_RUNTIME_COMPRESS_SIZE = 512 * 1024
+UNCOMPRESSED_SUFFIXES = ('.map',)
+# Preference order when the client accepts several encodings
+ENCODINGS = ('br', 'gzip')
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+class StaticAsset:
+    __slots__ = ('path', 'body', 'mimetype', 'etag', 'cache_control', 'variants')
+
+    def __init__(self, path: str, body: bytes, mimetype: str, cache_control: str):
+        self.path = path
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.cache_control = cache_control
+        # encoding -> compressed bytes
+        self.variants: Dict[str, bytes] = {}
+
+    def select(self, accept_encoding: str):
+        """Return (body, encoding, etag) for the best variant the client accepts."""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ENCODINGS:
+            if encoding in self.variants and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                return self.variants[encoding], encoding, f'{self.etag}-{encoding}'
+        return self.body, None, self.etag
+
+    def matches(self, if_none_match: str) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        tags = {tag.strip().removeprefix('W/').strip('"') for tag in if_none_match.split(',')}
+        return self.etag in tags or any(f'{self.etag}-{encoding}' in tags for encoding in self.variants)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    accepted = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def _cache_control(path: str) -> str:
+    if HASHED_ASSET.search(path):
+        return IMMUTABLE_CACHE_CONTROL
+    if path == 'index.html':
+        return REVALIDATE_CACHE_CONTROL
+    return DEFAULT_CACHE_CONTROL
+
+
+def _compressible(path: str, mimetype: str, size: int) -> bool:
+    return (size >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES)
+            and not path.endswith(UNCOMPRESSED_SUFFIXES))
+
+
+def _compress(encoding: str, body: bytes) -> Optional[bytes]:
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(body, quality=11)
+    return None
+
+
+class StaticManifest:
+    def __init__(self, dist_dir: str):
+        self.dist_dir = str(dist_dir)
+        self.assets: Dict[str, StaticAsset] = {}
+        self._build()
+
+    def _build(self) -> None:
+        if not os.path.isdir(self.dist_dir):
+            print(f"[FinCompass] Frontend dist directory does not exist: {self.dist_dir}")
+            return
+        for root, _, files in os.walk(self.dist_dir):
+            for filename in files:
+                if filename.endswith(tuple(ENCODING_SUFFIXES.values())):
+                    continue
+                full_path = os.path.join(root, filename)
+                path = os.path.relpath(full_path, self.dist_dir).replace(os.sep, '/')
+                with open(full_path, 'rb') as f:
+                    body = f.read()
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                asset = StaticAsset(path, body, mimetype, _cache_control(path))
+                if _compressible(path, mimetype, len(body)):
+                    for encoding, suffix in ENCODING_SUFFIXES.items():
+                        variant = None
+                        if os.path.isfile(full_path + suffix):
+                            with open(full_path + suffix, 'rb') as f:
+                                variant = f.read()
+                        elif len(body) <= MAX_RUNTIME_COMPRESS_SIZE:
+                            variant = _compress(encoding, body)
+                        # Only keep variants that actually save bytes
+                        if variant is not None and len(variant) < len(body):
+                            asset.variants[encoding] = variant
+                self.assets[path] = asset
+
+    def get(self, path: str) -> Optional[StaticAsset]:
+        return self.assets.get(path)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'files': len(self.assets),
+            'bytes': sum(len(a.body) for a in self.assets.values()),
+            'compressed_variants': sum(len(a.variants) for a in self.assets.values()),
+        }
+
+
+def asset_response(asset: StaticAsset, request, response_class):
+    """Build the (possibly 304) response for `asset` honouring Accept-Encoding and If-None-Match."""
+    body, encoding, etag = asset.select(request.headers.get('Accept-Encoding', ''))
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': asset.cache_control,
+    }
+    if asset.variants:
+        headers['Vary'] = 'Accept-Encoding'
+    if asset.matches(request.headers.get('If-None-Match', '')):
+        return response_class(status=304, headers=headers)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return response_class(body, status=200, mimetype=asset.mimetype, headers=headers)
+
+
+def precompress(dist_dir: str) -> int:
+    """Write .gz (and .br, if brotli is installed) siblings for compressible files; returns files written."""
+    written = 0
+    for root, _, files in os.walk(dist_dir):
+        for filename in files:
+            if filename.endswith(tuple(ENCODING_SUFFIXES.values())):
+                continue
+            full_path = os.path.join(root, filename)
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            with open(full_path, 'rb') as f:
+                body = f.read()
+            if not _compressible(filename, mimetype, len(body)):
+                continue
+            for encoding, suffix in ENCODING_SUFFIXES.items():
+                variant = _compress(encoding, body)
+                if variant is not None and len(variant) < len(body):
+                    with open(full_path + suffix, 'wb') as f:
+                        f.write(variant)
+                    written += 1
+    return written
+
+
+if __name__ == '__main__':
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend', 'dist')
+    print(f"Wrote {precompress(target)} precompressed files in {target}")
@@ -0,0 +1,187 @@
+"""
+Symbol index of a synced rates catalog, used to narrow the analysis universe.
+
+api_sync_rates splits every symbol of an exchange into base and quote
+(`BTC/USDT` -> `BTC`, `USDT`) and stores the result in the plugin DB
+(symbol_index). In memory the index keeps interned strings and one sorted
+symbol list per quote, cached per AetherOnePy catalog.
+
+Intentions can restrict the universe analyzed by start-magic:
+
+    allowed_quotes      quotes to keep, e.g. "USDT,USD" (empty = all)
+    include_symbols     symbols or bases always kept, e.g. "BTC/USDT,ETH"
+    exclude_symbols     symbols or bases never kept, e.g. "FARTCOIN,YBDBD/USDT"
+    max_universe_size   keep at most this many symbols (0 = no limit)
+
+When the universe has to be cut to max_universe_size, included symbols come
+first, then symbols whose base trades against the most quotes (a rough
+liquidity proxy), then alphabetical order; quotes are taken in the order they
+are listed in allowed_quotes.
+"""
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .tracing import tracer
+
+SEPARATORS = ('/', '-', '_')
+UNIVERSE_FIELDS = ('allowed_quotes', 'include_symbols', 'exclude_symbols', 'max_universe_size')
+
+
+def split_symbol(symbol: str) -> Tuple[str, str]:
+    """('BTC', 'USDT') for 'BTC/USDT' (also 'BTC-USDT', 'BTC_USDT' and 'BTC/USDT:USDT'); quote is '' if there is none."""
+    symbol = symbol.strip().strip('"')
+    pair = symbol.split(':', 1)[0]
+    for separator in SEPARATORS:
+        if separator in pair:
+            base, _, quote = pair.partition(separator)
+            return sys.intern(base.upper()), sys.intern(quote.upper())
+    return sys.intern(pair.upper()), ''
+
+
+def parse_list(value: Any) -> List[str]:
+    """A list of upper-cased entries from a list or a comma/whitespace separated string."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.replace(',', ' ').split()
+    return [str(v).strip().upper() for v in value if str(v).strip()]
+
+
+class SymbolIndex:
+    def __init__(self, symbols: Iterable[str]):
+        self.symbols: Dict[str, Tuple[str, str]] = {}
+        # quote -> sorted symbols
+        self.by_quote: Dict[str, List[str]] = {}
+        # base -> number of quotes it trades against
+        self.base_quotes: Dict[str, int] = {}
+        for symbol in symbols:
+            symbol = sys.intern(symbol.strip().strip('"'))
+            if symbol not in self.symbols:
+                self._add(symbol, *split_symbol(symbol))
+        self._sort()
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, str, str]]) -> 'SymbolIndex':
+        """Build from stored (symbol, base, quote) rows without splitting again."""
+        index = cls(())
+        for symbol, base, quote in rows:
+            index._add(sys.intern(symbol), sys.intern(base), sys.intern(quote))
+        index._sort()
+        return index
+
+    def _add(self, symbol: str, base: str, quote: str) -> None:
+        self.symbols[symbol] = (base, quote)
+        self.by_quote.setdefault(quote, []).append(symbol)
+        self.base_quotes[base] = self.base_quotes.get(base, 0) + 1
+
+    def _sort(self) -> None:
+        for symbols in self.by_quote.values():
+            symbols.sort()
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def rows(self) -> List[Tuple[str, str, str]]:
+        return [(symbol, base, quote) for symbol, (base, quote) in self.symbols.items()]
+
+    def quotes(self) -> Dict[str, int]:
+        """quote -> symbol count, largest first."""
+        return dict(sorted(((q, len(s)) for q, s in self.by_quote.items()), key=lambda item: (-item[1], item[0])))
+
+    def _matches(self, symbol: str, entries: Set[str]) -> bool:
+        return symbol.upper() in entries or self.symbols[symbol][0] in entries
+
+    def universe(self, allowed_quotes=None, include=None, exclude=None, max_size: Optional[int] = None) -> List[str]:
+        """The symbols an intention's filters keep, in priority order (see module docstring)."""
+        quotes = parse_list(allowed_quotes)
+        include = set(parse_list(include))
+        exclude = set(parse_list(exclude))
+        candidates: List[str] = []
+        for quote in (quotes or self.by_quote.keys()):
+            candidates.extend(self.by_quote.get(quote, ()))
+        # Included symbols are kept even when their quote is not allowed
+        included = [s for s in self.symbols if include and self._matches(s, include) and not self._matches(s, exclude)]
+        included.sort()
+        seen = set(included)
+        rest = [s for s in candidates if s not in seen and not (exclude and self._matches(s, exclude))]
+        if max_size and len(included) + len(rest) > max_size:
+            quote_rank = {quote: i for i, quote in enumerate(quotes)}
+            rest.sort(key=lambda s: (-self.base_quotes[self.symbols[s][0]], quote_rank.get(self.symbols[s][1], 0), s))
+        universe = included + rest
+        return universe[:max_size] if max_size else universe
+
+
+def parse_max_universe_size(value: Any) -> Optional[int]:
+    """max_universe_size as an int (None stays None, empty is 0); raises ValueError unless it is a non-negative integer."""
+    if value is None:
+        return None
+    if value == '':
+        return 0
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise ValueError(f'max_universe_size must be a non-negative integer, got {value!r}.')
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'max_universe_size must be a non-negative integer, got {value!r}.')
+    if size < 0:
+        raise ValueError(f'max_universe_size must be a non-negative integer, got {value!r}.')
+    return size
+
+
+def format_list(value: Any) -> Optional[str]:
+    """Stored form of a filter list ('USDT,USD'); None stays None so updates can leave a field unchanged."""
+    if value is None:
+        return None
+    return ','.join(parse_list(value))
+
+
+def has_universe_filters(intention: Dict[str, Any]) -> bool:
+    return any(intention.get(field) for field in UNIVERSE_FIELDS)
+
+
+_indexes: Dict[int, SymbolIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def invalidate(catalog_id: int) -> None:
+    with _indexes_lock:
+        _indexes.pop(catalog_id, None)
+
+
+def index_for_catalog(db, catalog_id: int, rates_list: Optional[list] = None) -> SymbolIndex:
+    """
+    Cached index of an AetherOnePy catalog. Loaded from the plugin DB; rebuilt from `rates_list`
+    (and stored) when the stored index is missing or does not hold exactly the catalog's current symbols.
+    """
+    signatures = {sys.intern(rate.signature.strip().strip('"')) for rate in rates_list} if rates_list is not None else None
+    with _indexes_lock:
+        index = _indexes.get(catalog_id)
+    # Compared by content, so a catalog whose symbols changed but not their count is re-indexed too
+    if index is not None and (signatures is None or index.symbols.keys() == signatures):
+        return index
+    with tracer.span('load_symbol_index', catalog_id=catalog_id):
+        index = SymbolIndex.from_rows(db.get_symbol_index(catalog_id))
+        if signatures is not None and index.symbols.keys() != signatures:
+            index = SymbolIndex(signatures)
+            db.replace_symbol_index(catalog_id, None, index.rows())
+    with _indexes_lock:
+        _indexes[catalog_id] = index
+    return index
+
+
+def store_index(db, catalog_id: int, exchange_id: Optional[str], symbols: Iterable[str]) -> SymbolIndex:
+    """Build the index of a freshly synced catalog, persist it and make it the cached one."""
+    index = SymbolIndex(symbols)
+    db.replace_symbol_index(catalog_id, exchange_id, index.rows())
+    with _indexes_lock:
+        _indexes[catalog_id] = index
+    return index
+
+
+def filter_rates(rates_list: list, intention: Dict[str, Any], index: SymbolIndex) -> list:
+    """The rates of `rates_list` inside the intention's universe, in catalog order."""
+    # Validated on write and normalised by the schema migration, so always a non-negative int here
+    universe = set(index.universe(intention.get('allowed_quotes'), intention.get('include_symbols'),
+                                  intention.get('exclude_symbols'), intention.get('max_universe_size') or None))
+    return [rate for rate in rates_list if rate.signature in universe]
@@ -0,0 +1,193 @@
+"""
+Incremental parse of the symbols payload of a FinCompass server.
+
+GET /api/v1/symbols/exchange/<id> answers with one JSON object whose
+`symbols` array can hold tens of thousands of (quoted) symbols:
+
+    {"exchange_id": "binance", "symbols": ["\\"BTC/USDT\\"", ...]}
+
+Reading it with resp.text / resp.json() keeps the body, its decoded text and
+the parsed list in memory at once. SymbolStreamParser is fed the body chunk
+by chunk instead and yields each symbol (quotes stripped) as soon as its
+array element is complete, so api_sync_rates only keeps the resulting set;
+besides that, memory is bounded by the chunk size and the longest element.
+Values of other top-level keys are parsed and dropped.
+"""
+import codecs
+import json
+import re
+from json.decoder import scanstring
+from typing import Iterable, Iterator, List
+
+CHUNK_SIZE = 64 * 1024
+SYMBOLS_KEY = 'symbols'
+
+_WHITESPACE = ' \t\n\r'
+# What may follow a value; a number or literal is only complete once one of these is seen
+_DELIMITERS = _WHITESPACE + ',}]'
+_WHITESPACE_RUN = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+def normalize_symbol(symbol: str) -> str:
+    """A symbol as stored in the rates catalog: the server's quotes stripped."""
+    return symbol.strip('"')
+
+
+class SymbolStreamParser:
+    """Push parser for `{"...": ..., "symbols": [...]}`; feed() returns the symbols completed by a chunk, close() the rest."""
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0
+        # start -> first_key -> colon -> value -> next_key -> key ... ; inside the symbols array:
+        # first_item -> next_item -> item ... (the first_ states also accept the closing bracket)
+        self._state = 'start'
+        self._key = None
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        symbols: List[str] = []
+        self._parse(symbols, final=False)
+        return symbols
+
+    def close(self) -> List[str]:
+        """Parse what is left; raises ValueError unless the payload was a complete object."""
+        rest: List[str] = []
+        self._parse(rest, final=True)
+        if self._state != 'done' or self._buffer[self._pos:].strip(_WHITESPACE):
+            raise ValueError('Truncated or invalid symbols payload.')
+        return rest
+
+    def _skip_whitespace(self) -> bool:
+        """Move past whitespace; False when the buffer is used up."""
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return pos < len(buffer)
+
+    def _value(self, final: bool):
+        """(True, value) for the complete JSON value at the position, (False, None) when more input is needed."""
+        try:
+            value, end = _decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise ValueError(f'Invalid JSON in symbols payload at offset {self._pos}.')
+            return False, None
+        incomplete = end == len(self._buffer) or self._buffer[end] not in _DELIMITERS
+        if not final and incomplete and not isinstance(value, (str, list, dict)):
+            # A number (or literal) may go on in the next chunk: '1729300000.' decodes as 1729300000
+            return False, None
+        self._pos = end
+        return True, value
+
+    def _expect(self, chars: str) -> str:
+        char = self._buffer[self._pos]
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} in symbols payload at offset {self._pos}, got {char!r}.")
+        self._pos += 1
+        return char
+
+    def _parse(self, symbols: List[str], final: bool) -> None:
+        while self._state != 'done' and self._skip_whitespace():
+            state = self._state
+            if state == 'start':
+                self._expect('{')
+                self._state = 'first_key'
+            elif state in ('first_key', 'key', 'next_key'):
+                if self._buffer[self._pos] == '}' and state != 'next_key':
+                    if state == 'key':
+                        raise ValueError(f'Trailing comma in symbols payload at offset {self._pos}.')
+                    self._pos += 1
+                    self._state = 'done'
+                    continue
+                if state == 'next_key':
+                    if self._expect(',}') == '}':
+                        self._state = 'done'
+                    else:
+                        self._state = 'key'
+                    continue
+                complete, key = self._value(final)
+                if not complete:
+                    return
+                if not isinstance(key, str):
+                    raise ValueError(f'Invalid key in symbols payload at offset {self._pos}.')
+                self._key = key
+                self._state = 'colon'
+            elif state == 'colon':
+                self._expect(':')
+                self._state = 'value'
+            elif state == 'value':
+                if self._key == SYMBOLS_KEY and self._buffer[self._pos] == '[':
+                    self._pos += 1
+                    self._state = 'first_item'
+                    continue
+                complete, _ = self._value(final)
+                if not complete:
+                    return
+                self._state = 'next_key'
+            elif state in ('first_item', 'item', 'next_item'):
+                self._items(symbols, final)
+                if self._state != 'next_key':
+                    return
+
+    def _items(self, symbols: List[str], final: bool) -> None:
+        """Append the elements of the symbols array in the buffer; the hot loop, so it works on locals."""
+        buffer, pos, state = self._buffer, self._pos, self._state
+        size = len(buffer)
+        skip, append = _WHITESPACE_RUN.match, symbols.append
+        try:
+            while True:
+                pos = skip(buffer, pos).end()
+                if pos == size:
+                    return
+                char = buffer[pos]
+                if state == 'next_item':
+                    if char == ',':
+                        state = 'item'
+                    elif char == ']':
+                        state = 'next_key'
+                        pos += 1
+                        return
+                    else:
+                        raise ValueError(f"Expected ',' or ']' in symbols payload at offset {pos}, got {char!r}.")
+                    pos += 1
+                    continue
+                if char == ']':
+                    if state == 'item':
+                        raise ValueError(f'Trailing comma in symbols payload at offset {pos}.')
+                    state = 'next_key'
+                    pos += 1
+                    return
+                if char != '"':
+                    raise ValueError(f'Symbols must be strings, got {char!r} at offset {pos}.')
+                try:
+                    symbol, pos = scanstring(buffer, pos + 1)
+                except json.JSONDecodeError:
+                    if final:
+                        raise ValueError(f'Unterminated symbol in symbols payload at offset {pos}.')
+                    return
+                state = 'next_item'
+                append(normalize_symbol(symbol))
+        finally:
+            self._pos, self._state = pos, state
+
+
+def iter_symbols(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Symbols of a payload given as byte chunks (e.g. resp.iter_content()); raises ValueError for an invalid payload."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    parser = SymbolStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(decoder.decode(chunk))
+    yield from parser.feed(decoder.decode(b'', final=True))
+    yield from parser.close()
+
+
+def read_symbols(resp, chunk_size: int = CHUNK_SIZE) -> set:
+    """The set of symbols of a streamed symbols response, read chunk by chunk."""
+    try:
+        return set(iter_symbols(resp.iter_content(chunk_size)))
+    finally:
+        resp.close()
@@ -0,0 +1,365 @@
+"""
+Background sync of the datasets the plugin mirrors locally.
+
+Providers, exchange symbols, and AetherOnePy cases and catalogs used to be
+synced inside the requests that list them (GET /api/providers, /api/cases,
+/api/catalogs), so users waited on remote servers and host databases. The
+SyncDaemon keeps them fresh in the background instead and the handlers only
+read the plugin DB:
+
+    dataset    key          refresh                                       TTL
+    cases      ''           cases of the AetherOnePy database             60 s
+    catalogs   ''           catalogs of the host's case_dao               60 s
+    providers  server id    GET /api/v1/providers/ of every server with   900 s
+                            an API key
+    symbols    exchange_id  the exchange's symbols into its rates         3600 s
+                            catalog (exchanges synced once by sync-rates)
+
+Every refresh is recorded in sync_status (status, items, duration, error,
+last success and next due time). A dataset is refreshed again after its TTL,
+less a random jitter of up to 10% so datasets do not all come due together;
+a failed refresh is retried with backoff (at most the TTL, at least the
+server's Retry-After). Due datasets are refreshed in priority order (the
+order of the table above, then longest overdue first), by at most
+FINCOMPASS_SYNC_CONCURRENCY (default 2) at a time. A handler that finds its
+dataset stale serves the local data with "stale": true and moves the dataset
+to the front; list views are patched through the events stream once it is
+synced. A refresh a handler runs itself (sync-rates) waits for a background
+refresh of the same dataset and key, so the two never write it at once.
+
+Configuration (environment):
+
+    FINCOMPASS_SYNC_DAEMON         0 disables the daemon (handlers sync inline as before)
+    FINCOMPASS_SYNC_TTL_<DATASET>  TTL in seconds, e.g. FINCOMPASS_SYNC_TTL_SYMBOLS=1800
+    FINCOMPASS_SYNC_CONCURRENCY    refreshes running at once (default 2)
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .circuit_breaker import CircuitOpen
+from .exchange_constraints import sync_constraints
+from .fincompass_client import FinCompassClient
+from .host import ao_domains
+from .rate_limit import RateLimitTimeout
+from .symbol_index import store_index
+from .symbol_stream import read_symbols
+from .tracing import tracer
+
+# Refresh order when several datasets are due; cheap local datasets first
+PRIORITIES = ('cases', 'catalogs', 'providers', 'symbols')
+DEFAULT_TTLS = {'cases': 60.0, 'catalogs': 60.0, 'providers': 900.0, 'symbols': 3600.0}
+JITTER = 0.1
+RETRY_BASE = 15.0
+POLL_INTERVAL = 5.0
+DEFAULT_CONCURRENCY = 2
+
+
+def enabled() -> bool:
+    return os.environ.get('FINCOMPASS_SYNC_DAEMON', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+class SyncError(Exception):
+    """A refresh that failed for a reason the caller reports with `status_code`."""
+
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# --- Refreshes; each returns the number of items synced ---
+
+def sync_cases(db) -> int:
+    cases = db.get_cases_from_aetheronepy()
+    db.sync_cases(cases)
+    return len(cases)
+
+
+def sync_catalogs(db, dao) -> int:
+    catalogs = [c.to_dict() if hasattr(c, 'to_dict') else {'id': c.id, 'name': c.name} for c in dao.list_catalogs()]
+    db.sync_catalogs(catalogs)
+    return len(catalogs)
+
+
+def sync_providers(db, server: Dict[str, Any]) -> int:
+    """Store the providers of a server. Raises SyncError for an upstream error; transport errors, RateLimitTimeout and CircuitOpen pass."""
+    resp = FinCompassClient.for_server(server).get_providers()
+    if resp.status_code != 200:
+        raise SyncError(f"Upstream error: {resp.status_code} {resp.text[:500]}")
+    providers = resp.json()
+    db.store_providers(server['id'], providers)
+    return len(providers)
+
+
+def sync_symbols(db, dao, exchange_id: str) -> Dict[str, Any]:
+    """
+    Full sync of an exchange's symbols into the AetherOnePy rates catalog named after it, using the selected server's
+    provider. Raises SyncError (400 unknown provider, 502 upstream error); RateLimitTimeout and CircuitOpen pass.
+    """
+    # 1. Look up provider in local DB by exchange_id and get server_url
+    selected_server = db.get_selected_server()
+    provider = db.get_provider_with_url_by_exchange_id(selected_server['id'], exchange_id) if selected_server else None
+    if not provider or not provider.get('server_url'):
+        raise SyncError(f"Provider '{exchange_id}' not found or missing server URL in database.", 400)
+
+    # 2. Fetch the exchange's symbols (rate limited per server and per exchange), parsed as the body arrives
+    client = FinCompassClient(provider['server_url'])
+    api_url = f"{client.base_url}/api/v1/symbols/exchange/{exchange_id}"
+    with tracer.span('fetch_symbols', url=api_url):
+        resp = client.get_symbols(exchange_id, stream=True)
+    if not resp.ok:
+        with resp:
+            raise SyncError(f"Upstream error: {resp.status_code} {resp.text[:500]}")
+    try:
+        with tracer.span('read_symbols'):
+            server_symbols = read_symbols(resp)
+            tracer.set(symbols=len(server_symbols))
+    except ValueError as e:
+        raise SyncError(f"Invalid JSON from upstream: {e}") from e
+
+    # 3. Check/create the catalog in the main DB
+    catalog = dao.get_catalog_by_name(exchange_id)
+    if not catalog:
+        catalog = ao_domains.Catalog(exchange_id, f"Rates for {exchange_id}", "FinCompass")
+        dao.insert_catalog(catalog)
+        catalog = dao.get_catalog_by_name(exchange_id)
+
+    # 4. Full sync: remove local rates not on server, then insert new ones
+    local_rates = dao.list_rates_from_catalog(catalog.id)
+    deleted_count = 0
+    with tracer.span('delete_stale_rates', local=len(local_rates)):
+        for rate in local_rates:
+            if rate.signature not in server_symbols:
+                dao.delete_rate(rate.id)
+                deleted_count += 1
+        tracer.set(deleted=deleted_count)
+
+    inserted_count = 0
+    with tracer.span('insert_new_rates', server=len(server_symbols)):
+        # Re-fetch existing symbols after deletion
+        existing_symbols = {r.signature for r in dao.list_rates_from_catalog(catalog.id)}
+        for symbol in server_symbols:
+            if symbol not in existing_symbols:
+                dao.insert_rate(ao_domains.Rate(symbol, '', catalog.id))
+                inserted_count += 1
+        tracer.set(inserted=inserted_count)
+    print(f"[FinCompass] Synced {len(server_symbols)} symbols for '{exchange_id}': {deleted_count} deleted, {inserted_count} inserted")
+
+    # 5. Rebuild the catalog's symbol index (base/quote split) used by intention universe filters
+    with tracer.span('build_symbol_index'):
+        index = store_index(db, catalog.id, exchange_id, server_symbols)
+
+    # 6. Cache the exchange's trading constraints, checked before schedules are posted (see exchange_constraints.py)
+    with tracer.span('sync_constraints'):
+        constraints = sync_constraints(db, client, exchange_id, server_symbols)
+    db.publish('rates.synced', exchange_id=exchange_id, aetherone_catalog_id=catalog.id, inserted=inserted_count,
+               deleted=deleted_count, total=len(server_symbols))
+    return {'inserted': inserted_count, 'deleted': deleted_count, 'total': len(server_symbols), 'quotes': index.quotes(),
+            'constraints': constraints}
+
+
+class SyncDaemon:
+    def __init__(self, db, case_dao: Callable[[], Any], ttls: Optional[Dict[str, float]] = None, concurrency: int = DEFAULT_CONCURRENCY,
+                 poll_interval: float = POLL_INTERVAL, clock: Callable[[], float] = time.time):
+        self.db = db
+        # The host's DAO is only reachable through the app, which exists after the blueprint is registered
+        self.case_dao = case_dao
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._wakeup = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stopping = False
+        self._in_flight: Set[Tuple[str, str]] = set()
+        # (dataset, key) -> lock held while it is refreshed, so a handler's refresh and a background one never overlap
+        self._refresh_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        # Datasets a handler found stale; refreshed before anything else
+        self._requested: Set[Tuple[str, str]] = set()
+        self.stats = {'refreshed': 0, 'failed': 0}
+
+    @classmethod
+    def from_env(cls, db, case_dao: Callable[[], Any]) -> 'SyncDaemon':
+        ttls = {}
+        for dataset in DEFAULT_TTLS:
+            try:
+                ttls[dataset] = float(os.environ[f'FINCOMPASS_SYNC_TTL_{dataset.upper()}'])
+            except (KeyError, ValueError):
+                pass
+        try:
+            concurrency = int(os.environ.get('FINCOMPASS_SYNC_CONCURRENCY', DEFAULT_CONCURRENCY))
+        except ValueError:
+            concurrency = DEFAULT_CONCURRENCY
+        return cls(db, case_dao, ttls, concurrency)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> 'SyncDaemon':
+        with self._wakeup:
+            if self._thread is None:
+                self._stopping = False
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='fincompass-sync')
+                self._thread = threading.Thread(target=self._run, name='fincompass-sync-daemon', daemon=True)
+                self._thread.start()
+        print(f"[FinCompass] Sync daemon started (TTLs: {', '.join(f'{d} {self.ttls[d]:.0f}s' for d in PRIORITIES)})")
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+            thread, self._thread = self._thread, None
+            executor, self._executor = self._executor, None
+        if thread is not None:
+            thread.join(timeout)
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                wait = self.tick()
+            except Exception as e:
+                print(f"[FinCompass] Sync daemon tick failed: {e}")
+                wait = self.poll_interval
+            with self._wakeup:
+                if self._stopping:
+                    return
+                if not self._requested or len(self._in_flight) >= self.concurrency:
+                    self._wakeup.wait(wait)
+                if self._stopping:
+                    return
+
+    # --- Scheduling ---
+
+    def datasets(self) -> List[Tuple[str, str]]:
+        """Every (dataset, key) to keep fresh right now."""
+        keys = [('cases', ''), ('catalogs', '')]
+        keys += [('providers', str(server['id'])) for server in self.db.get_servers() if server.get('api_key')]
+        # Exchanges are only synced once someone synced them (sync-rates records them in sync_status)
+        keys += [('symbols', row['dataset_key']) for row in self.db.get_sync_status('symbols')]
+        return keys
+
+    def due(self, now: Optional[float] = None) -> Tuple[List[Tuple[str, str]], float]:
+        """The due datasets in refresh order, and the seconds until the next one comes due."""
+        now = self._clock() if now is None else now
+        status = {(row['dataset'], row['dataset_key']): row for row in self.db.get_sync_status()}
+        due, next_in = [], self.poll_interval
+        for key in self.datasets():
+            row = status.get(key)
+            due_at = row['next_due_at'] if row and row['next_due_at'] is not None else 0.0
+            if key in self._requested or due_at <= now:
+                due.append((key not in self._requested, PRIORITIES.index(key[0]), due_at, key))
+            else:
+                next_in = min(next_in, due_at - now)
+        due.sort()
+        return [entry[-1] for entry in due], max(0.0, next_in)
+
+    def tick(self) -> float:
+        """Start refreshes of due datasets while slots are free; returns how long to wait before the next tick."""
+        with self._wakeup:
+            requested = set(self._requested)
+        due, next_in = self.due()
+        with self._wakeup:
+            # Requested datasets that are gone (a removed server, one without an API key) are never submitted;
+            # left in _requested they would keep the loop from waiting
+            self._requested -= requested.difference(due)
+            executor = self._executor
+            for key in due:
+                if executor is None or len(self._in_flight) >= self.concurrency:
+                    break
+                if key in self._in_flight:
+                    continue
+                self._in_flight.add(key)
+                self._requested.discard(key)
+                executor.submit(self._refresh_in_background, *key)
+        return next_in
+
+    def request(self, dataset: str, key: str = '') -> None:
+        """Refresh a dataset as soon as a slot is free."""
+        with self._wakeup:
+            if (dataset, key) not in self._in_flight:
+                self._requested.add((dataset, key))
+            self._wakeup.notify()
+
+    def is_fresh(self, dataset: str, key: str = '') -> bool:
+        """Whether the local copy of a dataset is within its TTL and its last refresh succeeded; if not, it is requested."""
+        rows = [row for row in self.db.get_sync_status(dataset) if row['dataset_key'] == key]
+        fresh = bool(rows) and rows[0]['status'] == 'ok' and self._clock() - rows[0]['last_success_at'] < self.ttls[dataset]
+        if not fresh and self.running:
+            self.request(dataset, key)
+        return fresh
+
+    # --- Refreshing ---
+
+    def _refresh_in_background(self, dataset: str, key: str) -> None:
+        try:
+            self.refresh(dataset, key)
+        except Exception as e:
+            print(f"[FinCompass] Sync of {dataset} {key!r} failed: {e}")
+        finally:
+            with self._wakeup:
+                self._in_flight.discard((dataset, key))
+                self._wakeup.notify()
+
+    def refresh(self, dataset: str, key: str = '') -> Any:
+        """
+        Refresh one dataset now and record the outcome; returns the refresh's result (None for a dataset that is gone) and re-raises its error.
+        Waits for a refresh of the same dataset already running (e.g. in the background) to finish first.
+        """
+        with self._wakeup:
+            lock = self._refresh_locks.setdefault((dataset, key), threading.Lock())
+        with lock:
+            return self._refresh(dataset, key)
+
+    def _refresh(self, dataset: str, key: str) -> Any:
+        started = self._clock()
+        try:
+            with tracer.span('sync.refresh', dataset=dataset, key=key):
+                result = self._sync(dataset, key)
+        except Exception as e:
+            now = self._clock()
+            failures = 1 + next((row['failures'] for row in self.db.get_sync_status(dataset) if row['dataset_key'] == key), 0)
+            delay = min(self.ttls[dataset], RETRY_BASE * 2 ** (failures - 1))
+            if isinstance(e, (RateLimitTimeout, CircuitOpen)):
+                delay = max(delay, e.retry_after)
+            self.db.record_sync(dataset, key, False, now, now + delay, duration_ms=(now - started) * 1000, error=str(e))
+            self.stats['failed'] += 1
+            raise
+        if result is None:
+            return None
+        now = self._clock()
+        items = result['total'] if isinstance(result, dict) else result
+        next_due = now + self.ttls[dataset] * (1 - random.uniform(0, JITTER))
+        self.db.record_sync(dataset, key, True, now, next_due, duration_ms=(now - started) * 1000, items=items)
+        self.stats['refreshed'] += 1
+        return result
+
+    def _sync(self, dataset: str, key: str) -> Any:
+        if dataset == 'cases':
+            return sync_cases(self.db)
+        if dataset == 'catalogs':
+            return sync_catalogs(self.db, self.case_dao())
+        if dataset == 'providers':
+            server = next((s for s in self.db.get_servers() if str(s['id']) == key), None)
+            if server is None:
+                # The server was removed; stop tracking it
+                self.db.delete_sync_status(dataset, key)
+                return None
+            return sync_providers(self.db, server)
+        if dataset == 'symbols':
+            return sync_symbols(self.db, self.case_dao(), key)
+        raise ValueError(f'Unknown dataset: {dataset}')
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._wakeup:
+            in_flight = sorted(f'{dataset}:{key}' if key else dataset for dataset, key in self._in_flight)
+            requested = len(self._requested)
+        return {'running': self.running, 'ttls_s': self.ttls, 'concurrency': self.concurrency, 'in_flight': in_flight,
+                'requested': requested, **self.stats}
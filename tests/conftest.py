@@ -0,0 +1,38 @@
+"""
+Fixtures for the plugin tests: the benchmark harness (benchmarks/run.py) wired to
+a temporary database and the stub FinCompass server.
+"""
+import os
+import sys
+
+import pytest
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PLUGIN_DIR not in sys.path:
+    sys.path.insert(0, PLUGIN_DIR)
+
+from benchmarks.run import BenchEnv, load_plugin  # noqa: E402
+from benchmarks.stub_server import StubFinCompassServer, make_symbols  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def plugin():
+    """The plugin imported as a package, like the host app's plugin loader does."""
+    load_plugin()
+    import fincompass_plugin
+    return fincompass_plugin
+
+
+@pytest.fixture
+def stub():
+    with StubFinCompassServer() as server:
+        yield server
+
+
+@pytest.fixture
+def env(plugin, stub, tmp_path):
+    bench = BenchEnv(str(tmp_path), stub)
+    bench.set_catalog_symbols(make_symbols(20))
+    bench.sync_rates()
+    yield bench
+    bench.close()
@@ -0,0 +1,106 @@
+import importlib
+import types
+
+import pytest
+
+from benchmarks.run import PLUGIN_PACKAGE
+
+
+@pytest.fixture(scope='module')
+def circuit_breaker(plugin):
+    return importlib.import_module(f'{PLUGIN_PACKAGE}.circuit_breaker')
+
+
+@pytest.fixture
+def clock(circuit_breaker, monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(circuit_breaker, 'time', types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def call(breaker, failed=False, seconds=0.0, clock=None):
+    started = breaker.acquire()
+    if clock is not None:
+        clock.now += seconds
+    breaker.release(started, failed)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.min_calls):
+        call(breaker, failed=True)
+
+
+def test_opens_once_the_error_share_reaches_the_threshold(circuit_breaker, clock):
+    breaker = circuit_breaker.CircuitBreaker('server', min_calls=4, error_rate=0.5, open_seconds=30)
+    call(breaker, failed=True)
+    call(breaker, failed=True)
+    call(breaker)
+    # Below min_calls the breaker stays closed however many calls failed
+    assert breaker.state == circuit_breaker.CLOSED
+    call(breaker)
+    assert breaker.state == circuit_breaker.OPEN
+    with pytest.raises(circuit_breaker.CircuitOpen) as refused:
+        breaker.acquire()
+    assert refused.value.retry_after == pytest.approx(30)
+    assert breaker.rejected == 1
+
+
+def test_slow_calls_open_it_too(circuit_breaker, clock):
+    breaker = circuit_breaker.CircuitBreaker('server', min_calls=2, slow_call=5.0, slow_rate=0.5)
+    call(breaker, seconds=6.0, clock=clock)
+    call(breaker, seconds=0.1, clock=clock)
+    assert breaker.state == circuit_breaker.OPEN
+
+
+def test_outcomes_older_than_the_window_do_not_count(circuit_breaker, clock):
+    breaker = circuit_breaker.CircuitBreaker('server', min_calls=3, window=60)
+    call(breaker, failed=True)
+    call(breaker, failed=True)
+    clock.now += 61
+    call(breaker)
+    call(breaker)
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+def test_half_open_lets_one_probe_through_and_a_success_closes(circuit_breaker, clock):
+    breaker = circuit_breaker.CircuitBreaker('server', min_calls=2, open_seconds=30)
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.state == circuit_breaker.HALF_OPEN
+    probe = breaker.acquire()
+    with pytest.raises(circuit_breaker.CircuitOpen):
+        breaker.acquire()
+    breaker.release(probe, False)
+    assert breaker.state == circuit_breaker.CLOSED
+    # Closed again with a fresh window: one failure does not reopen it
+    call(breaker, failed=True)
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+def test_failed_probe_reopens_for_twice_as_long(circuit_breaker, clock):
+    breaker = circuit_breaker.CircuitBreaker('server', min_calls=2, open_seconds=30)
+    open_breaker(breaker)
+    for open_for in (60, 120, 240, circuit_breaker.MAX_OPEN, circuit_breaker.MAX_OPEN):
+        clock.now += breaker.retry_after()
+        call(breaker, failed=True)
+        assert breaker.state == circuit_breaker.OPEN
+        assert breaker.retry_after() == pytest.approx(open_for)
+
+
+def test_limits_calls_in_flight(circuit_breaker, clock):
+    breaker = circuit_breaker.CircuitBreaker('server', max_concurrent=2)
+    first, second = breaker.acquire(), breaker.acquire()
+    with pytest.raises(circuit_breaker.CircuitOpen, match='2 calls in flight'):
+        breaker.acquire()
+    breaker.release(first, False)
+    breaker.release(breaker.acquire(), False)
+    breaker.release(second, False)
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+def test_registry_hands_out_one_breaker_per_server_and_none_while_disabled(circuit_breaker):
+    registry = circuit_breaker.BreakerRegistry(min_calls=3)
+    assert registry.get('http://a/') is registry.get('http://a')
+    assert registry.get('http://a').min_calls == 3
+    registry.configure(enabled=False)
+    assert registry.get('http://a') is None
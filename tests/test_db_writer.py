@@ -0,0 +1,80 @@
+import importlib
+import sqlite3
+import threading
+
+import pytest
+
+from benchmarks.run import PLUGIN_PACKAGE
+
+
+@pytest.fixture(scope='module')
+def db_writer(plugin):
+    return importlib.import_module(f'{PLUGIN_PACKAGE}.db_writer')
+
+
+@pytest.fixture
+def writer(db_writer, tmp_path):
+    path = str(tmp_path / 'writer.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+    writer = db_writer.WriteQueue(path)
+    yield writer
+    writer.close(timeout=5)
+
+
+def insert(name):
+    return lambda cursor: cursor.execute('INSERT INTO items (name) VALUES (?)', (name,)).lastrowid
+
+
+def names(writer):
+    with sqlite3.connect(writer.db_path) as conn:
+        return [row[0] for row in conn.execute('SELECT name FROM items ORDER BY id')]
+
+
+def test_failing_operation_rolls_back_alone_in_its_batch(writer):
+    started, release = threading.Event(), threading.Event()
+
+    def blocker(cursor):
+        started.set()
+        release.wait(5)
+        return insert('blocker')(cursor)
+
+    def half_written(cursor):
+        insert('rolled back')(cursor)
+        raise ValueError('bad write')
+
+    first = writer.submit(blocker)
+    assert started.wait(5)
+    # Queued while the writer is busy, so the three run in one transaction
+    before, failing, after = writer.submit(insert('before')), writer.submit(half_written), writer.submit(insert('after'))
+    release.set()
+
+    assert first.result(5) == 1
+    assert before.result(5) == 2
+    with pytest.raises(ValueError, match='bad write'):
+        failing.result(5)
+    assert after.result(5) == 3
+    assert names(writer) == ['blocker', 'before', 'after']
+    assert writer.stats['batches'] == 2
+    assert writer.stats['max_batch'] == 3
+    assert writer.stats['failed'] == 1
+
+
+def test_execute_returns_the_result_or_raises_the_error(writer):
+    assert writer.execute(insert('one')) == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.execute(lambda cursor: cursor.execute('INSERT INTO items (id, name) VALUES (1, ?)', ('duplicate',)))
+    assert names(writer) == ['one']
+
+
+def test_queued_writes_fail_when_the_writer_cannot_connect(db_writer, tmp_path):
+    writer = db_writer.WriteQueue(str(tmp_path / 'missing' / 'writer.db'))
+    with pytest.raises(sqlite3.OperationalError):
+        writer.execute(insert('lost'), timeout=5)
+    assert writer.metrics()['running'] is False
+
+    # The next write starts a new writer, which works once the database can be opened
+    (tmp_path / 'missing').mkdir()
+    assert writer.execute(lambda cursor: cursor.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)').rowcount, timeout=5) == -1
+    assert writer.execute(insert('kept'), timeout=5) == 1
+    writer.close(timeout=5)
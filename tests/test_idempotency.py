@@ -0,0 +1,54 @@
+from benchmarks.run import URL_PREFIX
+
+
+def start_magic(env, key):
+    return env.client.post(f'{URL_PREFIX}/api/start-magic', headers={'Idempotency-Key': key}, json={
+        'intention_id': env.intention['id'],
+        'case_id': env.case['id'],
+        'provider_id': env.provider['id'],
+        'catalog_id': env.plugin_catalog['id'],
+    })
+
+
+def posted_sides(stub):
+    return [schedule['side'] for schedule in stub.schedules.values()]
+
+
+def test_retry_after_failed_sell_post_replays_the_error(env, stub):
+    stub.fail_sides.add('sell')
+    first = start_magic(env, 'run-1')
+    assert first.status_code == 502
+    buy_ids = first.get_json()['buy_schedule_ids']
+    assert buy_ids == [next(iter(stub.schedules))]
+    assert posted_sides(stub) == ['buy']
+
+    stub.fail_sides.clear()
+    retry = start_magic(env, 'run-1')
+    assert retry.status_code == 502
+    assert retry.headers.get('Idempotent-Replayed') == 'true'
+    assert retry.get_json()['buy_schedule_ids'] == buy_ids
+    # The buy is not posted a second time
+    assert posted_sides(stub) == ['buy']
+
+
+def test_retry_after_failed_buy_post_runs_again(env, stub):
+    stub.fail_sides.add('buy')
+    first = start_magic(env, 'run-2')
+    assert first.status_code == 502
+    assert 'buy_schedule_ids' not in first.get_json()
+    assert posted_sides(stub) == []
+
+    stub.fail_sides.clear()
+    retry = start_magic(env, 'run-2')
+    assert retry.status_code == 200
+    assert retry.headers.get('Idempotent-Replayed') is None
+    assert posted_sides(stub) == ['buy', 'sell']
+
+
+def test_repeated_key_replays_success(env, stub):
+    first = start_magic(env, 'run-3')
+    assert first.status_code == 200
+    retry = start_magic(env, 'run-3')
+    assert retry.headers.get('Idempotent-Replayed') == 'true'
+    assert retry.get_json()['buy_schedule_id'] == first.get_json()['buy_schedule_id']
+    assert posted_sides(stub) == ['buy', 'sell']
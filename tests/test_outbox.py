@@ -0,0 +1,73 @@
+import importlib
+import json
+
+import pytest
+
+from benchmarks.run import PLUGIN_PACKAGE
+
+
+@pytest.fixture(scope='module')
+def outbox(plugin):
+    return importlib.import_module(f'{PLUGIN_PACKAGE}.outbox')
+
+
+@pytest.fixture
+def no_breakers(plugin):
+    breakers = importlib.import_module(f'{PLUGIN_PACKAGE}.circuit_breaker').breakers
+    enabled = breakers.enabled
+    breakers.configure(enabled=False)
+    yield
+    breakers.configure(enabled=enabled)
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def queue_posts(env, buy_schedule_id, sell_time: str, max_age: float):
+    magic = importlib.import_module(f'{PLUGIN_PACKAGE}.magic')
+    buy_payload = {'provider_id': env.provider['id'], 'symbol': 'S0/USDT', 'side': 'buy', 'amount': 10}
+    outcome = {'server_id': env.server_id, 'server_url': env.stub.url, 'buy_payload': buy_payload,
+               'buy_schedule_id': buy_schedule_id, 'exchange_id': 'bench'}
+    entry = magic.build_outbox_entry(outcome, sell_time, 60, True, 'queued-1', max_age)
+    targets = [{'server_id': env.server_id, 'server_url': env.stub.url, 'status': 'queued', 'buy_schedule_id': buy_schedule_id}]
+    schedule = env.db.create_intention_schedule(env.intention['id'], None, sell_time, 'queued', targets=targets, outbox=[entry])
+    return schedule, env.db.get_outbox()[0]
+
+
+def sells(stub):
+    return [schedule for schedule in stub.schedules.values() if schedule['side'] == 'sell']
+
+
+def test_sell_of_a_posted_buy_never_expires_and_keeps_its_sell_time(env, stub, outbox, no_breakers):
+    schedule, entry = queue_posts(env, 41, '2000-01-01T00:00:00Z', max_age=1.0)
+    clock = Clock(entry['expires_at'] + 3600)
+    queue = outbox.Outbox(env.db, max_age=1.0, clock=clock)
+
+    stub.fail_sides.add('sell')
+    for _ in range(outbox.MAX_ATTEMPTS + 2):
+        assert queue.drain() == 0
+        entry = env.db.get_outbox()[0]
+        assert entry['status'] == 'pending'
+        clock.now = entry['next_attempt_at']
+    assert queue.stats['expired'] == queue.stats['failed'] == 0
+    fixed_sell_time = json.loads(entry['payload'])['sell_time']
+
+    stub.fail_sides.clear()
+    assert queue.drain() == 1
+    assert env.db.get_outbox()[0]['status'] == 'sent'
+    assert [s['scheduled_time'] for s in sells(stub)] == [fixed_sell_time]
+    assert [t['status'] for t in env.db.get_schedule_targets(schedule['id'])] == ['scheduled']
+
+
+def test_pair_without_a_posted_buy_expires(env, stub, outbox, no_breakers):
+    schedule, entry = queue_posts(env, None, '2000-01-01T00:00:00Z', max_age=1.0)
+    queue = outbox.Outbox(env.db, max_age=1.0, clock=Clock(entry['expires_at']))
+    assert queue.drain() == 0
+    assert env.db.get_outbox()[0]['status'] == 'expired'
+    assert stub.schedules == {}
+    assert [t['status'] for t in env.db.get_schedule_targets(schedule['id'])] == ['failed']
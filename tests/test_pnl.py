@@ -0,0 +1,28 @@
+def pnl_target(env, amount):
+    env.db.update_intention(env.intention['id'], amount=amount)
+    targets = [{'server_id': env.server_id, 'server_url': env.stub.url, 'status': 'scheduled', 'buy_schedule_id': '1', 'sell_schedule_id': '2'}]
+    schedule = env.db.create_intention_schedule(env.intention['id'], '2026-01-01T00:00:00Z', '2026-01-01T01:00:00Z', 'scheduled',
+                                                symbol='S0/USDT', targets=targets)
+    return env.db.get_pnl_target(env.db.get_schedule_targets(schedule['id'])[0]['id'])
+
+
+def record_round_trip(env, target, buy_quantity=None):
+    assert env.db.record_fill(target, 'buy', 100.0, buy_quantity, '2026-01-01T00:00:00Z', 'manual', 0.0) is None
+    return env.db.record_fill(target, 'sell', 110.0, None, '2026-01-01T01:00:00Z', 'manual', 0.0)
+
+
+def test_trade_is_sized_by_the_intention_amount(env):
+    trade = record_round_trip(env, pnl_target(env, 50))
+    assert trade['quantity'] == 0.5
+    assert trade['pnl'] == 5.0
+    assert env.db.get_pnl_aggregate('total')['trades'] == 1
+
+
+def test_trade_without_quantity_or_amount_is_not_recorded(env):
+    target = pnl_target(env, 0)
+    assert record_round_trip(env, target) is None
+    assert env.db.get_pnl_aggregate('total') is None
+    # A buy fill with its quantity closes the trade
+    trade = env.db.record_fill(target, 'buy', 100.0, 2.0, '2026-01-01T00:00:00Z', 'manual', 0.0)
+    assert trade['quantity'] == 2.0
+    assert env.db.get_pnl_aggregate('total')['trades'] == 1
@@ -0,0 +1,87 @@
+import importlib
+import types
+
+import pytest
+
+from benchmarks.run import PLUGIN_PACKAGE
+
+
+@pytest.fixture(scope='module')
+def rate_limit(plugin):
+    return importlib.import_module(f'{PLUGIN_PACKAGE}.rate_limit')
+
+
+@pytest.fixture
+def clock(rate_limit, monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0, slept=[])
+
+    def sleep(seconds):
+        clock.slept.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(rate_limit, 'time', types.SimpleNamespace(monotonic=lambda: clock.now, sleep=sleep, time=lambda: clock.now))
+    return clock
+
+
+def test_burst_is_free_then_tokens_are_reserved_in_arrival_order(rate_limit, clock):
+    bucket = rate_limit.TokenBucket('server:a', rate=2.0, burst=3.0)
+    far = clock.now + 60
+    assert [bucket.reserve(far) for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Each further caller waits one refill interval longer than the one before
+    assert [bucket.reserve(far) for _ in range(3)] == pytest.approx([0.5, 1.0, 1.5])
+    assert bucket.waited == 3
+    assert bucket.max_wait == pytest.approx(1.5)
+
+
+def test_refill_is_capped_at_the_burst(rate_limit, clock):
+    bucket = rate_limit.TokenBucket('server:a', rate=1.0, burst=2.0)
+    bucket.reserve(clock.now)
+    clock.now += 100
+    far = clock.now + 60
+    assert [bucket.reserve(far) for _ in range(3)] == pytest.approx([0.0, 0.0, 1.0])
+
+
+def test_reservation_past_the_deadline_times_out_without_taking_a_token(rate_limit, clock):
+    bucket = rate_limit.TokenBucket('exchange:x', rate=1.0, burst=1.0)
+    bucket.reserve(clock.now)
+    with pytest.raises(rate_limit.RateLimitTimeout) as timeout:
+        bucket.reserve(clock.now + 0.5)
+    assert timeout.value.retry_after == pytest.approx(1.0)
+    assert bucket.timeouts == 1
+    # The refused caller did not push later callers back
+    assert bucket.reserve(clock.now + 1.0) == pytest.approx(1.0)
+
+
+def test_throttle_blocks_for_retry_after_halves_the_rate_and_recovers(rate_limit, clock):
+    bucket = rate_limit.TokenBucket('server:a', rate=10.0, burst=10.0)
+    bucket.throttle(retry_after=5.0)
+    assert bucket.current_rate == pytest.approx(5.0)
+    assert bucket.reserve(clock.now + 60) == pytest.approx(5.0)
+    bucket.throttle(None)
+    bucket.throttle(None)
+    bucket.throttle(None)
+    bucket.throttle(None)
+    # Never below MIN_RATE_FRACTION of the configured rate
+    assert bucket.current_rate == pytest.approx(10.0 * rate_limit.MIN_RATE_FRACTION)
+    for _ in range(100):
+        bucket.recover()
+    assert bucket.current_rate == pytest.approx(10.0)
+
+
+def test_limiter_waits_on_the_server_and_the_exchange_bucket(rate_limit, clock):
+    limiter = rate_limit.RateLimiter(server_limit=(10.0, 1.0), exchange_limit=(1.0, 1.0), wait=30.0)
+    assert limiter.acquire('http://server/', 'x') == 0.0
+    # 0.1 s for the server's token, then the rest of the second for the exchange's
+    assert limiter.acquire('http://server', 'x') == pytest.approx(1.0)
+    assert clock.slept == pytest.approx([0.1, 0.9])
+    # The server bucket refilled during that wait, and another exchange has a bucket of its own
+    assert limiter.acquire('http://server', 'y') == 0.0
+    # A call without an exchange only waits for the server bucket
+    assert limiter.acquire('http://server') == pytest.approx(0.1)
+    assert sorted(b['bucket'] for b in limiter.metrics()) == ['exchange:x', 'exchange:y', 'server:http://server']
+
+
+def test_zero_rate_means_unlimited(rate_limit, clock):
+    limiter = rate_limit.RateLimiter(server_limit=(0.0, 0.0), exchange_limit=(0.0, 0.0))
+    assert all(limiter.acquire('http://server', 'x') == 0.0 for _ in range(100))
+    assert limiter.metrics() == []
@@ -0,0 +1,61 @@
+import importlib
+
+import pytest
+
+from benchmarks.run import PLUGIN_PACKAGE, URL_PREFIX
+
+
+@pytest.fixture(scope='module')
+def sell_scheduler(plugin):
+    return importlib.import_module(f'{PLUGIN_PACKAGE}.sell_scheduler')
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def start_local_sell_timer(env):
+    env.db.update_intention(env.intention['id'], dynamic_sell_timing=True, local_sell_timing=True,
+                            min_hold_minutes=30, max_hold_minutes=60)
+    resp = env.client.post(f'{URL_PREFIX}/api/start-magic', headers={'Idempotency-Key': 'timed-1'}, json={
+        'intention_id': env.intention['id'],
+        'case_id': env.case['id'],
+        'provider_id': env.provider['id'],
+        'catalog_id': env.plugin_catalog['id'],
+    })
+    assert resp.status_code == 200
+    return env.db.get_sell_timer(resp.get_json()['sell_timer_id'])
+
+
+def sells(stub):
+    return [schedule for schedule in stub.schedules.values() if schedule['side'] == 'sell']
+
+
+def test_retried_sell_keeps_the_sell_time_of_the_first_attempt(env, stub, sell_scheduler):
+    timer = start_local_sell_timer(env)
+    assert sells(stub) == []
+
+    clock = Clock(timer['max_hold_minutes'] * 60 + timer['buy_at'] + 1)
+    scheduler = sell_scheduler.SellScheduler(env.db, clock=clock)
+    try:
+        stub.fail_sides.add('sell')
+        scheduler.handle(timer['id'])
+        first_due = clock.now
+        retried = env.db.get_sell_timer(timer['id'])
+        assert retried['status'] == 'pending'
+        assert retried['attempts'] == 1
+        assert retried['sell_at'] == first_due
+
+        stub.fail_sides.clear()
+        clock.now = retried['next_check_at']
+        scheduler.handle(timer['id'])
+    finally:
+        scheduler.stop()
+
+    posted = env.db.get_sell_timer(timer['id'])
+    assert posted['status'] == 'posted'
+    assert [s['scheduled_time'] for s in sells(stub)] == [sell_scheduler.iso_time(first_due)]
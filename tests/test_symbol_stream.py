@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from benchmarks.run import PLUGIN_PACKAGE
+
+
+@pytest.fixture(scope='module')
+def symbol_stream(plugin):
+    import importlib
+    return importlib.import_module(f'{PLUGIN_PACKAGE}.symbol_stream')
+
+
+def parse_split(symbol_stream, payload: str, *splits: int) -> list:
+    """The symbols of `payload` fed in chunks cut at `splits`."""
+    parser = symbol_stream.SymbolStreamParser()
+    symbols, start = [], 0
+    for end in (*splits, len(payload)):
+        symbols.extend(parser.feed(payload[start:end]))
+        start = end
+    symbols.extend(parser.close())
+    return symbols
+
+
+PAYLOADS = [
+    '{"updated":1729300000.123,"symbols":["\\"BTC/USDT\\"","ETH/USD"],"count":2}',
+    '{"symbols": ["BTC/USDT", "ETH/USD"], "updated": -1.5e+3, "next": null}',
+    '{"active":true,"stale":false,"cursor":null,"symbols":["A/B"],"limit":100}',
+    '{"count":12345,"symbols":[]}',
+    '{"meta":{"rate":0.25,"ok":true},"symbols":["X/Y"],"tags":[1,2.5,false]}',
+]
+
+
+@pytest.mark.parametrize('payload', PAYLOADS)
+def test_every_chunk_boundary(symbol_stream, payload):
+    expected = [s.strip('"') for s in json.loads(payload)['symbols']]
+    for split in range(len(payload) + 1):
+        assert parse_split(symbol_stream, payload, split) == expected, f'split at {split}: {payload[:split]!r}'
+
+
+def test_number_split_after_decimal_point(symbol_stream):
+    payload = PAYLOADS[0]
+    split = payload.index('.') + 1
+    assert parse_split(symbol_stream, payload, split) == ['BTC/USDT', 'ETH/USD']
+
+
+@pytest.mark.parametrize('payload', ['{"symbols":["a",]}', '{"symbols":["a"],}', '{"a":1,}', '{"symbols":[,"a"]}',
+                                     '{"updated":1.x,"symbols":[]}', '{"symbols":["a"]', '{"ok":tru,"symbols":[]}'])
+def test_invalid_payloads(symbol_stream, payload):
+    for split in range(len(payload) + 1):
+        with pytest.raises(ValueError):
+            parse_split(symbol_stream, payload, split)
+
+
+def test_iter_symbols_splits_utf8(symbol_stream):
+    payload = '{"symbols":["Ä/USDT","B/€"]}'.encode('utf-8')
+    chunks = [payload[i:i + 1] for i in range(len(payload))]
+    assert list(symbol_stream.iter_symbols(chunks)) == ['Ä/USDT', 'B/€']
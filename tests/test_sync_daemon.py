@@ -0,0 +1,73 @@
+import importlib
+import threading
+import time
+
+import pytest
+
+from benchmarks.run import PLUGIN_PACKAGE
+
+
+@pytest.fixture(scope='module')
+def sync_daemon(plugin):
+    return importlib.import_module(f'{PLUGIN_PACKAGE}.sync_daemon')
+
+
+class FakeDb:
+    """The sync_status and dataset calls the daemon makes, without servers."""
+
+    def __init__(self):
+        self.status = {}
+        self.reads = 0
+        self._lock = threading.Lock()
+
+    def get_servers(self):
+        return []
+
+    def get_sync_status(self, dataset=None):
+        with self._lock:
+            self.reads += 1
+            return [dict(row) for row in self.status.values() if dataset in (None, row['dataset'])]
+
+    def record_sync(self, dataset, dataset_key, ok, at, next_due_at, duration_ms=None, items=None, error=None):
+        with self._lock:
+            self.status[(dataset, dataset_key)] = {'dataset': dataset, 'dataset_key': dataset_key, 'status': 'ok' if ok else 'error',
+                                                   'next_due_at': next_due_at, 'last_success_at': at, 'failures': 0}
+
+    def get_cases_from_aetheronepy(self):
+        return []
+
+    def sync_cases(self, cases):
+        pass
+
+    def sync_catalogs(self, catalogs):
+        pass
+
+
+class FakeCaseDao:
+    def list_catalogs(self):
+        return []
+
+
+def test_tick_drops_requests_for_datasets_that_are_gone(sync_daemon):
+    daemon = sync_daemon.SyncDaemon(FakeDb(), FakeCaseDao)
+    daemon.request('providers', '7')
+    daemon.tick()
+    assert daemon.metrics()['requested'] == 0
+
+
+def test_loop_waits_after_a_request_for_a_removed_server(sync_daemon):
+    db = FakeDb()
+    daemon = sync_daemon.SyncDaemon(db, FakeCaseDao, poll_interval=0.2).start()
+    try:
+        # Let the first refreshes of cases and catalogs finish
+        deadline = time.monotonic() + 5
+        while len(db.status) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        daemon.request('providers', '7')
+        reads = db.reads
+        time.sleep(0.5)
+        # A busy loop would read sync_status thousands of times; a waiting one a few times per poll interval
+        assert db.reads - reads < 20
+        assert daemon.metrics()['requested'] == 0
+    finally:
+        daemon.stop(timeout=5)
@@ -3,6 +3,11 @@ Timing analysis module for FinCompass plugin.
 Contains functions for analyzing optimal sell timing based on AetherOne analysis results.
 """
 
+# Weights of the value, GV and random factors in the timing score (tune offline with backtest.py)
+VALUE_WEIGHT = 0.4
+GV_WEIGHT = 0.4
+RANDOM_WEIGHT = 0.2
+
 def analyze_timing_for_symbol(symbol: str, min_hold_minutes: int, max_hold_minutes: int, enhanced_rates: list, hotbits_service) -> dict:
     """
     Analyze optimal sell timing for a specific symbol based on its analysis results.
@@ -49,7 +54,7 @@ def analyze_timing_for_symbol(symbol: str, min_hold_minutes: int, max_hold_minut
     random_factor = hotbits_service.getInt(0, 1000) / 1000.0
     
     # Weight the factors (you can adjust these weights)
-    timing_score = (value_factor * 0.4) + (gv_factor * 0.4) + (random_factor * 0.2)
+    timing_score = (value_factor * VALUE_WEIGHT) + (gv_factor * GV_WEIGHT) + (random_factor * RANDOM_WEIGHT)
     
     # Map timing_score (0-1) to the hold time range
     # timing_score closer to 0 = longer hold time (max_hold_minutes)
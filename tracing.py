@@ -0,0 +1,197 @@
+"""
+Structured request tracing for the FinCompass plugin.
+
+Replaces the "[DEBUG]" prints on hot paths with span trees: every traced Flask
+request gets a root span with an ID, child spans time the individual steps and
+carry small attributes. Tracing is configured through environment variables:
+
+    FINCOMPASS_TRACE_LEVEL   off (default), error, warning, info or debug
+    FINCOMPASS_TRACE_SAMPLE  fraction of requests to trace, 0.0 - 1.0 (default 1.0)
+    FINCOMPASS_TRACE_FILE    optional JSON-lines file; otherwise spans go to the
+                             'fincompass.trace' logger
+
+When tracing is off, or a request is not sampled, span() and event() return
+immediately and attribute values are never formatted. Attribute values may be
+callables so expensive payloads are only built when they will be recorded:
+
+    tracer.event('debug', 'payload built', payload=lambda: payload)
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40, 'off': 100}
+MAX_ATTRIBUTE_LENGTH = 256
+
+logger = logging.getLogger('fincompass.trace')
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('fincompass_span', default=None)
+
+
+def _small(value: Any) -> Any:
+    """Resolve lazy attribute values and keep them small enough for a log line."""
+    if callable(value):
+        value = value()
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) > MAX_ATTRIBUTE_LENGTH:
+        return text[:MAX_ATTRIBUTE_LENGTH] + f'... ({len(text)} chars)'
+    return text
+
+
+class Span:
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'name', 'start', 'duration_ms',
+                 'attributes', 'events', 'children', 'status')
+
+    def __init__(self, tracer: 'Tracer', name: str, trace_id: str, parent_id: Optional[str] = None):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.duration_ms = None
+        self.attributes: Dict[str, Any] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.children: List['Span'] = []
+        self.status = 'ok'
+
+    def set(self, **attributes) -> None:
+        for key, value in attributes.items():
+            self.attributes[key] = _small(value)
+
+    def finish(self) -> None:
+        if self.duration_ms is None:
+            self.duration_ms = round((time.time() - self.start) * 1000, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': self.duration_ms,
+            'status': self.status,
+            'attributes': self.attributes,
+            'events': self.events,
+        }
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+class Tracer:
+    def __init__(self, level: str = 'off', sample_rate: float = 1.0, sink_path: Optional[str] = None):
+        self.level = LEVELS.get(str(level).lower(), LEVELS['off'])
+        self.sample_rate = max(0.0, min(float(sample_rate), 1.0))
+        self.sink_path = sink_path
+        self._sink_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'Tracer':
+        try:
+            sample_rate = float(os.environ.get('FINCOMPASS_TRACE_SAMPLE', '1.0'))
+        except ValueError:
+            sample_rate = 1.0
+        return cls(
+            level=os.environ.get('FINCOMPASS_TRACE_LEVEL', 'off'),
+            sample_rate=sample_rate,
+            sink_path=os.environ.get('FINCOMPASS_TRACE_FILE') or None,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.level < LEVELS['off'] and self.sample_rate > 0
+
+    def is_recording(self, level: str = 'debug') -> bool:
+        """True if the current request is sampled and `level` passes the level gate."""
+        return _current_span.get() is not None and LEVELS[level] >= self.level
+
+    # Request lifecycle
+
+    def start_request(self, name: str, **attributes):
+        """Open the root span for a request; returns a token for end_request(), or None if not traced."""
+        if not self.enabled or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return None
+        root = Span(self, name, uuid.uuid4().hex)
+        root.set(**attributes)
+        return _current_span.set(root)
+
+    def end_request(self, token, **attributes) -> None:
+        if token is None:
+            return
+        root = _current_span.get()
+        _current_span.reset(token)
+        if root is None:
+            return
+        root.set(**{key: value for key, value in attributes.items() if value is not None})
+        root.finish()
+        self._emit(root)
+
+    # Spans and events
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time a step as a child of the current span. Yields None when the request is not traced."""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        child = Span(self, name, parent.trace_id, parent.span_id)
+        parent.children.append(child)
+        if attributes and LEVELS['debug'] >= self.level:
+            child.set(**attributes)
+        token = _current_span.set(child)
+        try:
+            yield child
+        except Exception as e:
+            child.status = 'error'
+            child.attributes['error'] = _small(str(e))
+            raise
+        finally:
+            child.finish()
+            _current_span.reset(token)
+
+    def set(self, **attributes) -> None:
+        """Attach attributes to the current span, if any."""
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attributes)
+
+    def event(self, level: str, message: str, **attributes) -> None:
+        """Record a timestamped event on the current span if `level` passes the level gate."""
+        span = _current_span.get()
+        if span is None or LEVELS[level] < self.level:
+            return
+        span.events.append({
+            'time': time.time(),
+            'level': level,
+            'message': message,
+            'attributes': {key: _small(value) for key, value in attributes.items()},
+        })
+
+    # Output
+
+    def _emit(self, root: Span) -> None:
+        lines = [json.dumps(span.to_dict(), default=str) for span in root.walk()]
+        if self.sink_path:
+            with self._sink_lock:
+                with open(self.sink_path, 'a') as f:
+                    f.write('\n'.join(lines) + '\n')
+        else:
+            for line in lines:
+                logger.info(line)
+
+
+tracer = Tracer.from_env()
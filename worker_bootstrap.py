@@ -0,0 +1,26 @@
+"""
+Start-up script for analysis worker processes (see parallel_analysis.py).
+
+Workers are started with forkserver or spawn, so they do not inherit the
+plugin package the host imported from its directory, and a pool initializer
+defined inside the plugin could not even be unpickled there. The pool runs
+this file with runpy.run_path() instead; it registers the package the way the
+host's plugin loader does. Globals passed in by the pool:
+
+    PLUGIN_PACKAGE   name the host imported the plugin under
+    PLUGIN_DIR       the plugin directory
+    WORKER_SETUP     optional callable run first (the benchmarks install their host stand-ins)
+"""
+import importlib.util
+import os
+import sys
+
+if WORKER_SETUP is not None:
+    WORKER_SETUP()
+
+if PLUGIN_PACKAGE not in sys.modules:
+    _spec = importlib.util.spec_from_file_location(
+        PLUGIN_PACKAGE, os.path.join(PLUGIN_DIR, '__init__.py'), submodule_search_locations=[PLUGIN_DIR])
+    _module = importlib.util.module_from_spec(_spec)
+    sys.modules[PLUGIN_PACKAGE] = _module
+    _spec.loader.exec_module(_module)